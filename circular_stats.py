@@ -0,0 +1,222 @@
+"""
+
+    Circular statistics for wind direction
+    Degrees wrap (350 and 10 are 20 apart, their mean is 0 not 180), so the direction
+    stats come from unit vectors instead of arithmetic on the degrees:
+
+    mean_dir          - vector mean direction, atan2(sum sin, sum cos)
+    resultant_length  - R = |mean unit vector|, 1 = always the same direction, 0 = no preferred one
+    circ_std          - sqrt(-2 ln R) in degrees
+    weighted_dir      - speed weighted mean direction (the mean wind vector), when speeds are given
+    sector_freq       - fraction of hours in each of the 16 compass sectors (N, NNE, ...)
+    modal_sector      - centre (degrees) of the most frequent sector
+
+    Everything is kept as sums/counts per grid cell, so files are streamed in one at a time
+    and monthly accumulators merge into seasonal ones (like wind_hist.py):
+
+    acc = DirectionAccumulator(grid_shape)
+    for file in files:
+        acc.add(wd, ws)   # (time, rlat, rlon) degrees and speeds, NaN for missing
+    stats_ds = acc.to_dataset(template)
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import numpy as np
+import xarray as xr
+
+SECTORS = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+           "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+
+
+def sector_index(wd, nsectors=len(SECTORS)):
+    """
+    Sector of each direction, sector 0 is centred on north (348.75 - 11.25 for 16)
+    """
+    width = 360 / nsectors
+    return (np.floor(((wd + width / 2) % 360) / width).astype(np.int64)) % nsectors
+
+
+def _bearing(s, c):
+    # degrees 0-360 of the vector (sin, cos), rounded so a tiny negative angle is 0 not 360
+    return np.round(np.rad2deg(np.arctan2(s, c)), 9) % 360
+
+
+class DirectionAccumulator:
+    """
+    Per grid cell sums of the direction unit vectors (plain and speed weighted)
+    and counts per compass sector
+    """
+    def __init__(self, shape, nsectors=len(SECTORS)):
+        self.shape = tuple(shape)
+        self.ncell = int(np.prod(self.shape))
+        self.nsectors = nsectors
+        self.n = np.zeros(self.ncell, dtype=np.int64)
+        self.sin_sum = np.zeros(self.ncell)
+        self.cos_sum = np.zeros(self.ncell)
+        # speed weighted sums, a missing speed counts as zero weight
+        self.u_sum = np.zeros(self.ncell)
+        self.v_sum = np.zeros(self.ncell)
+        self.sector_counts = np.zeros((self.ncell, nsectors), dtype=np.int64)
+
+    def add(self, wd, ws=None):
+        """
+        wd - directions in degrees (time, *shape), NaN for missing
+        ws - optional speeds on the same shape for the weighted direction
+        """
+        wd = np.asarray(wd, dtype=np.float64).reshape(-1, self.ncell)
+        valid = ~np.isnan(wd)
+        rad = np.deg2rad(np.where(valid, wd, 0))
+        s = np.where(valid, np.sin(rad), 0)
+        c = np.where(valid, np.cos(rad), 0)
+
+        self.n += valid.sum(axis=0)
+        self.sin_sum += s.sum(axis=0)
+        self.cos_sum += c.sum(axis=0)
+
+        if ws is not None:
+            ws = np.asarray(ws, dtype=np.float64).reshape(-1, self.ncell)
+            ws = np.where(np.isnan(ws), 0, ws)
+            self.u_sum += (ws * s).sum(axis=0)
+            self.v_sum += (ws * c).sum(axis=0)
+
+        # one bincount over cell*nsectors + sector, missing hours go to a junk slot at the end
+        junk = self.ncell * self.nsectors
+        flat = np.arange(self.ncell) * self.nsectors + sector_index(np.where(valid, wd, 0), self.nsectors)
+        flat[~valid] = junk
+        counts = np.bincount(flat.ravel(), minlength=junk + 1)[:junk]
+        self.sector_counts += counts.reshape(self.ncell, self.nsectors)
+
+    def merge(self, other):
+        """
+        Add another accumulator on the same grid into this one (in place), returns self
+        """
+        if other.shape != self.shape or other.nsectors != self.nsectors:
+            raise ValueError("Can only merge accumulators on the same grid and sectors")
+        self.n += other.n
+        self.sin_sum += other.sin_sum
+        self.cos_sum += other.cos_sum
+        self.u_sum += other.u_sum
+        self.v_sum += other.v_sum
+        self.sector_counts += other.sector_counts
+        return self
+
+    def stats(self):
+        """
+        Output: dict of arrays on the grid shape (sector_freq has a trailing sector dim)
+                directions in degrees 0-360, NaN where a cell has no data
+        """
+        empty = self.n == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            R = np.hypot(self.sin_sum, self.cos_sum) / self.n
+            circ_std = np.rad2deg(np.sqrt(-2 * np.log(np.clip(R, 1e-12, 1))))
+            freq = self.sector_counts / self.n[:, None]
+
+        out = {
+            "mean_dir": _bearing(self.sin_sum, self.cos_sum),
+            "resultant_length": R,
+            "circ_std": circ_std,
+            "weighted_dir": _bearing(self.u_sum, self.v_sum),
+            "modal_sector": self.sector_counts.argmax(axis=1) * (360 / self.nsectors),
+        }
+        for name, arr in out.items():
+            arr[empty] = np.nan
+            out[name] = arr.reshape(self.shape)
+        out["sector_freq"] = freq.reshape(self.shape + (self.nsectors,))
+        return out
+
+    def to_dataset(self, template):
+        """
+        template - DataArray on the grid (e.g. one time step of a daily file) for dims/coords
+        """
+        stats = self.stats()
+        freq = stats.pop("sector_freq")
+        ds = xr.Dataset({name: (template.dims, arr) for name, arr in stats.items()},
+                        coords=template.coords)
+        ds["sector_freq"] = (template.dims + ("sector",), freq)
+        names = SECTORS if self.nsectors == len(SECTORS) else [f"s{i:02d}" for i in range(self.nsectors)]
+        ds = ds.assign_coords(sector=names, sector_centre=("sector", np.arange(self.nsectors) * (360 / self.nsectors)))
+        return ds
+
+    def save(self, path, template, **attrs):
+        """
+        Write the partial (sums and sector counts) to netcdf, template gives the grid dims/coords
+        """
+        dims = template.dims
+        data = {name: (dims, getattr(self, name).reshape(self.shape))
+                for name in ["n", "sin_sum", "cos_sum", "u_sum", "v_sum"]}
+        data["sector_counts"] = (dims + ("sector",), self.sector_counts.reshape(self.shape + (self.nsectors,)))
+        ds = xr.Dataset(data, coords=template.coords, attrs=attrs)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        ds.to_netcdf(path)
+
+    @classmethod
+    def load(cls, path, return_template=False):
+        """
+        Read a partial written by save(), optionally with a grid template for to_dataset()
+        """
+        with xr.open_dataset(path) as ds:
+            if "sector_counts" not in ds:
+                raise ValueError(f"{path} is not a direction partial (no sector_counts), histogram "
+                                 "partials are read with wind_hist.HistogramAccumulator")
+            counts = ds["sector_counts"]
+            acc = cls(counts.shape[:-1], nsectors=counts.shape[-1])
+            acc.sector_counts = counts.values.reshape(acc.ncell, -1).astype(np.int64)
+            acc.n = ds["n"].values.reshape(-1).astype(np.int64)
+            for name in ["sin_sum", "cos_sum", "u_sum", "v_sum"]:
+                setattr(acc, name, ds[name].values.reshape(-1).astype(np.float64))
+            template = ds["n"].load()
+
+        if return_template:
+            return acc, template
+        return acc
+
+
+def direction_stats(wd, ws=None, axis=0):
+    """
+    One shot version for arrays already in memory
+    Input: wd degrees (and optional ws) numpy arrays, stats taken along axis
+    Output: dict as DirectionAccumulator.stats()
+    """
+    wd = np.moveaxis(np.asarray(wd), axis, 0)
+    acc = DirectionAccumulator(wd.shape[1:])
+    acc.add(wd, None if ws is None else np.moveaxis(np.asarray(ws), axis, 0))
+    return acc.stats()
+
+
+def accumulate_direction_files(paths, wd_name, ws_name=None, lon_min=None, lon_max=None):
+    """
+    Stream daily winddir files (sorted) into one accumulator, optionally cropped to a lon range
+    With ws_name the matching windspeed file (same name, winddir -> windspeed) is read too
+    Output: (DirectionAccumulator, template DataArray of the grid) - (None, None) if no files
+    """
+    from grid_geometry import crop
+
+    cropped = lon_min is not None or lon_max is not None
+    acc, template = None, None
+    for path in sorted(paths):
+        with xr.open_dataset(path) as ds:
+            if cropped:
+                ds = crop(ds, lon_min=lon_min, lon_max=lon_max)
+            wd = ds[wd_name]
+            if acc is None:
+                template = wd.isel(time=0, drop=True).load()
+                acc = DirectionAccumulator(template.shape)
+            wd = wd.values
+
+        ws = None
+        if ws_name is not None:
+            speed_path = os.path.join(os.path.dirname(path),
+                                      os.path.basename(path).replace("winddir", "windspeed"))
+            if os.path.exists(speed_path):
+                with xr.open_dataset(speed_path) as ds:
+                    if cropped:
+                        ds = crop(ds, lon_min=lon_min, lon_max=lon_max)
+                    ws = ds[ws_name].values
+            else:
+                print(f"No speed file for {path}, weighted direction will skip it")
+        acc.add(wd, ws)
+    return acc, template
@@ -0,0 +1,292 @@
+"""
+
+    Consolidated store of the daily cubes in two chunk layouts (HDF5 through netcdf4)
+    The 365 daily files of a variable are copied into one time axis, twice:
+
+    point - chunks of every hour x a small rlat/rlon tile, a station's whole series is
+            one chunk read (4 neighbours are usually 1-4 chunks)
+    map   - chunks of one hour x the whole grid, a field is one chunk read
+
+    build_store("./climatology/daily/", "windspeed", ws_name)   # once, after main.py
+    with ClimatologyStore("windspeed") as store:
+        store.read_points([(i, j), ...], days=[(1, 1), (1, 2)])   # picks the point copy
+        store.read(days=[(1, 1)])                                 # picks the map copy
+
+    The time axis keeps the order of the daily files: calendar day, then year, then hour
+    (01-01 for every year, then 01-02 ...) with an index of where each day starts, so a run
+    of calendar days is one contiguous range. The reader works out how many bytes each
+    layout would decompress for a request and reads from the cheaper one.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import time
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+from doy_climatology import daily_files
+from tiled_stats import _file_times, _read_tile, grid_info
+from utils import NORMAL_PERIOD, period_label
+
+STORE_DIR = "./climatology/store/"
+LAYOUTS = ("point", "map")
+POINT_TILE = (4, 4)  # rlat x rlon of a point chunk, 31 years x 365 days x 24 h x 16 cells ~ 9 MB
+
+
+def store_path(file_var, layout, period=NORMAL_PERIOD, store_dir=STORE_DIR):
+    # e.g. climatology/store/1990-2020_windspeed_point.nc
+    return os.path.join(store_dir, f"{period_label(period)}_{file_var}_{layout}.nc")
+
+
+def _create_store(path, template, var_name, times, labels, starts, counts, chunks, scale_factor,
+                  fill_value):
+    nc = netCDF4.Dataset(path, "w")
+    nc.createDimension("time", len(times))
+    nc.createDimension("day", len(labels))
+    for dim in template.dims:
+        nc.createDimension(dim, template.sizes[dim])
+
+    hours = nc.createVariable("time", "i8", ("time",))
+    hours.units = "hours since 1970-01-01 00:00:00"
+    hours[:] = times.astype("datetime64[h]").astype(np.int64)
+    nc.createVariable("day_label", str, ("day",))[:] = np.asarray(labels, dtype=object)
+    nc.createVariable("day_start", "i8", ("day",))[:] = starts
+    nc.createVariable("day_count", "i8", ("day",))[:] = counts
+    for name, coord in template.coords.items():
+        var = nc.createVariable(name, coord.dtype, coord.dims)
+        var.setncatts({k: v for k, v in coord.attrs.items() if k != "_FillValue"})
+        var[:] = coord.values
+
+    var = nc.createVariable(var_name, "i2", ("time",) + template.dims, fill_value=np.int16(fill_value),
+                            zlib=True, complevel=1, shuffle=True, chunksizes=chunks)
+    var.scale_factor = scale_factor
+    if "lat" in template.coords and "lon" in template.coords:
+        var.coordinates = "lat lon"
+    # the packed values are copied as they are
+    var.set_auto_maskandscale(False)
+    nc.variable = var_name
+    return nc, var
+
+
+def build_store(data_dir, file_var, var_name, store_dir=STORE_DIR, period=NORMAL_PERIOD,
+                memory_mb=4000, layouts=LAYOUTS):
+    """
+    Input: daily file directory, windspeed/winddir, the variable in the files
+           memory_mb - ceiling for the row band held while writing the point copy
+           layouts - which copies to build
+    Output: dict of layout -> path written
+    """
+    days = daily_files(data_dir, file_var, period)
+    if not days:
+        raise ValueError(f"No {file_var} daily files in {data_dir}")
+    paths = [p for _, p in days]
+    template, _, scale_factor, fill_value = grid_info(paths[0], var_name)
+    file_times = [_file_times(p) for p in paths]
+    counts = np.array([len(t) for t in file_times])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    times = np.concatenate(file_times)
+    labels = [f"{m:02d}-{d:02d}" for (m, d), _ in days]
+    nt = len(times)
+    ny, nx = template.shape
+    print(f"{len(paths)} days, {nt} hours, grid {template.shape}")
+
+    os.makedirs(store_dir, exist_ok=True)
+    out = {}
+    start_time = time.time()
+    if "map" in layouts:
+        path = store_path(file_var, "map", period, store_dir)
+        nc, var = _create_store(path, template, var_name, times, labels, starts, counts,
+                                (1, ny, nx), scale_factor, fill_value)
+        try:
+            # every chunk is a whole field, so one file at a time fills its chunks completely
+            for path_in, s, n in zip(paths, starts, counts):
+                var[s:s + n] = _read_tile(path_in, var_name, None, slice(0, ny), slice(0, nx))
+        finally:
+            nc.close()
+        out["map"] = path
+        print(f"Map copy done ({time.time() - start_time:.1f} s)")
+
+    if "point" in layouts:
+        path = store_path(file_var, "point", period, store_dir)
+        chunks = (nt, min(POINT_TILE[0], ny), min(POINT_TILE[1], nx))
+        nc, var = _create_store(path, template, var_name, times, labels, starts, counts,
+                                chunks, scale_factor, fill_value)
+        # bands of whole chunk rows with the full time axis, each chunk is written once
+        band = max(memory_mb * 2**20 // (nt * nx * 2) // chunks[1], 1) * chunks[1]
+        try:
+            for r0 in range(0, ny, band):
+                rows = slice(r0, min(r0 + band, ny))
+                buf = np.empty((nt, rows.stop - rows.start, nx), dtype=np.int16)
+                for path_in, s, n in zip(paths, starts, counts):
+                    buf[s:s + n] = _read_tile(path_in, var_name, None, rows, slice(0, nx))
+                var[:, rows, :] = buf
+                print(f"rows {rows.start}-{rows.stop} of {ny} done ({time.time() - start_time:.1f} s)")
+        finally:
+            nc.close()
+        out["point"] = path
+    return out
+
+
+#%%
+class ClimatologyStore:
+    """
+    Reader over the point/map copies, each request goes to the copy that reads less
+    """
+    def __init__(self, file_var="windspeed", period=NORMAL_PERIOD, store_dir=STORE_DIR,
+                 cache_mb=256):
+        self.paths = {layout: store_path(file_var, layout, period, store_dir) for layout in LAYOUTS
+                      if os.path.exists(store_path(file_var, layout, period, store_dir))}
+        if not self.paths:
+            raise FileNotFoundError(f"No {file_var} store for {period_label(period)} in {store_dir}, run build_store")
+        self.ncs = {layout: netCDF4.Dataset(path) for layout, path in self.paths.items()}
+        nc = next(iter(self.ncs.values()))
+        self.var_name = nc.variable
+        self.times = (nc["time"][:].astype(np.int64)).astype("datetime64[h]").astype("datetime64[ns]")
+        self.day_labels = list(nc["day_label"][:])
+        self.day_start = nc["day_start"][:].astype(np.int64)
+        self.day_count = nc["day_count"][:].astype(np.int64)
+        self.dims = nc[self.var_name].dimensions[1:]
+        self.lat = nc["lat"][:] if "lat" in nc.variables else None
+        self.lon = nc["lon"][:] if "lon" in nc.variables else None
+        self.shape = nc[self.var_name].shape[1:]
+        self.chunks = {layout: nc[self.var_name].chunking() for layout, nc in self.ncs.items()}
+        for ds in self.ncs.values():
+            # a few whole point chunks stay decompressed between reads
+            ds[self.var_name].set_var_chunk_cache(size=cache_mb * 2**20)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for nc in self.ncs.values():
+            nc.close()
+        self.ncs = {}
+
+    def ranges(self, days=None):
+        """
+        Contiguous (start, stop) time ranges of the calendar days, (month, day) pairs or
+        "MM-DD" labels, in the order given (None = everything)
+        """
+        if days is None:
+            return [(0, len(self.times))]
+        out = []
+        for day in days:
+            label = day if isinstance(day, str) else f"{int(day[0]):02d}-{int(day[1]):02d}"
+            if label not in self.day_labels:
+                print(f"No {label} in the store. Skipping...")
+                continue
+            k = self.day_labels.index(label)
+            s, n = int(self.day_start[k]), int(self.day_count[k])
+            if out and out[-1][1] == s:
+                out[-1] = (out[-1][0], s + n)
+            else:
+                out.append((s, s + n))
+        return out
+
+    def layout_for(self, nsteps, cells):
+        """
+        Copy that decompresses fewer bytes for nsteps hours at the cells (list of (i, j))
+        """
+        cost = {}
+        for layout, chunks in self.chunks.items():
+            ct, cy, cx = chunks
+            tiles = len({(i // cy, j // cx) for i, j in cells})
+            # chunks along time touched (whole field chunks for map), x chunk size
+            cost[layout] = tiles * -(-nsteps // ct) * ct * cy * cx
+        return min(cost, key=cost.get)
+
+    def _read(self, layout, index):
+        values = self.ncs[layout][self.var_name][index]
+        return np.ma.filled(np.ma.asarray(values, dtype=np.float32), np.nan)
+
+    def _read_cells(self, layout, start, stop, ij):
+        # cells grouped by the chunk they sit in, one block read per chunk (just the rows/cols
+        # its cells span) then picked out in memory
+        _, cy, cx = self.chunks[layout]
+        ij = np.asarray(ij, dtype=np.int64).reshape(-1, 2)
+        out = np.empty((stop - start, len(ij)), dtype=np.float32)
+        groups = {}
+        for k, (i, j) in enumerate(ij):
+            groups.setdefault((i // cy, j // cx), []).append(k)
+        for ks in groups.values():
+            i, j = ij[ks, 0], ij[ks, 1]
+            block = self._read(layout, (slice(start, stop), slice(i.min(), i.max() + 1),
+                                        slice(j.min(), j.max() + 1)))
+            out[:, ks] = block[:, i - i.min(), j - j.min()]
+        return out
+
+    def _day_coord(self, ranges):
+        day = np.empty(len(self.times), dtype=object)
+        for label, s, n in zip(self.day_labels, self.day_start, self.day_count):
+            day[s:s + n] = label
+        return np.concatenate([day[s:e] for s, e in ranges])
+
+    def read_points(self, ij, days=None, layout=None):
+        """
+        Hourly series at grid cells
+        Input: list of (i, j) grid indices, calendar days (see ranges), layout to force one
+        Output: DataArray (time, point) in data units with lat/lon and "day" (MM-DD) coords
+        """
+        ij = [(int(i), int(j)) for i, j in ij]
+        ranges = self.ranges(days)
+        nsteps = sum(e - s for s, e in ranges)
+        layout = layout or self.layout_for(nsteps, ij)
+        out = np.empty((nsteps, len(ij)), dtype=np.float32)
+        pos = 0
+        for s, e in ranges:
+            out[pos:pos + e - s] = self._read_cells(layout, s, e, ij)
+            pos += e - s
+        coords = {"time": np.concatenate([self.times[s:e] for s, e in ranges]),
+                  "day": ("time", self._day_coord(ranges))}
+        if self.lat is not None:
+            coords["lat"] = ("point", np.array([self.lat[i, j] for i, j in ij]))
+            coords["lon"] = ("point", np.array([self.lon[i, j] for i, j in ij]))
+        return xr.DataArray(out, dims=("time", "point"), coords=coords, name=self.var_name,
+                            attrs={"layout": layout})
+
+    def read(self, days=None, rows=None, cols=None, layout=None):
+        """
+        Fields over a block of the grid
+        Input: calendar days (see ranges), row/col slices of the grid (None = all), layout to force one
+        Output: DataArray (time, rlat, rlon) in data units
+        """
+        rows = rows or slice(0, self.shape[0])
+        cols = cols or slice(0, self.shape[1])
+        ranges = self.ranges(days)
+        nsteps = sum(e - s for s, e in ranges)
+        cells = [(i, j) for i in range(*rows.indices(self.shape[0]))[::POINT_TILE[0]]
+                 for j in range(*cols.indices(self.shape[1]))[::POINT_TILE[1]]]
+        layout = layout or self.layout_for(nsteps, cells)
+        values = np.concatenate([self._read(layout, (slice(s, e), rows, cols)) for s, e in ranges])
+        coords = {"time": np.concatenate([self.times[s:e] for s, e in ranges]),
+                  "day": ("time", self._day_coord(ranges))}
+        if self.lat is not None:
+            coords["lat"] = (self.dims, self.lat[rows, cols])
+            coords["lon"] = (self.dims, self.lon[rows, cols])
+        return xr.DataArray(values, dims=("time",) + self.dims, coords=coords, name=self.var_name,
+                            attrs={"layout": layout})
+
+
+#%%
+if __name__ == "__main__":
+    import json
+
+    data_dir = "./climatology/daily/"
+    period = NORMAL_PERIOD
+
+    with open("./utils/variables.json", 'r') as f:
+        casr_vars = json.load(f)
+
+    for file_var, wind_var in [("windspeed", "wind_speed"), ("winddir", "wind_direction")]:
+        out = build_store(data_dir, file_var, casr_vars["CaSR_Variables"][wind_var], period=period,
+                          memory_mb=4000)
+        print(f"Saved {file_var} store to {out}")
+# %%
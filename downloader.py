@@ -0,0 +1,236 @@
+"""
+
+    Download CaSR files (YYYYMMDD12.nc) into the temp directory
+    Replaces the copy-pasted download_data/run_parallel from get_daily_CaSR.py and get_Casr.py
+
+    - one requests.Session shared by all threads (pooled keep-alive connections)
+    - files are streamed into <name>.part and only renamed once complete,
+      so a killed run never leaves a truncated .nc that looks finished
+    - an existing .part is resumed with an HTTP Range request (If-Range on the ETag
+      so a changed file on the server restarts from zero instead of being spliced)
+    - the final size is checked against Content-Length/Content-Range
+    - bounded retries with exponential backoff
+    - run_parallel prints (and returns) a throughput report for the run
+
+    The link is just a base url, so everything can be pointed at a local
+    http.server stand-in for testing.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 4 * 1024 * 1024  # 4 MiB writes, the raw files are ~GB each
+MAX_WORKERS = 32
+RETRIES = 5
+BACKOFF = 2.0  # seconds, doubled after every failed attempt
+TIMEOUT = (10, 120)  # (connect, read) seconds
+
+# http codes worth trying again, anything else in the 4xx range is final (e.g. 404)
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class IncompleteDownload(Exception):
+    pass
+
+
+def make_session(pool_size=MAX_WORKERS):
+    """
+    One session for the whole run so connections are kept alive and reused
+    pool_size should be >= the number of download threads
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _read_etag(etag_path):
+    if os.path.exists(etag_path):
+        with open(etag_path, "r") as f:
+            return f.read().strip() or None
+    return None
+
+
+def _content_total(response, offset):
+    """
+    Total size of the remote file from the response headers (None if the server does not say)
+    """
+    if response.status_code == 206:
+        # Content-Range: bytes start-end/total
+        content_range = response.headers.get("Content-Range", "")
+        try:
+            span, total = content_range.split(" ", 1)[1].split("/")
+            start = int(span.split("-")[0])
+        except (IndexError, ValueError):
+            raise IncompleteDownload(f"Bad Content-Range header: '{content_range}'")
+        if start != offset:
+            raise IncompleteDownload(f"Server resumed at byte {start}, expected {offset}")
+        return None if total == "*" else int(total)
+
+    length = response.headers.get("Content-Length")
+    return int(length) if length is not None else None
+
+
+def _fetch(session, url, part_path, etag_path, chunk_size):
+    """
+    Single attempt: resume (or start) part_path from the server
+    Returns the number of bytes transferred
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    etag = _read_etag(etag_path)
+
+    headers = {}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        if etag is not None:
+            headers["If-Range"] = etag
+
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 416:
+            # Content-Range: bytes */total - a run killed between the last write and the rename
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total.isdigit() and int(total) == offset:
+                return 0
+            # otherwise the part file is no good for this range (e.g. larger than the remote file)
+            os.remove(part_path)
+            raise IncompleteDownload(f"Range not satisfiable for {url}, restarting")
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            mode = "ab"
+        else:
+            # full body - either a fresh start or the server ignored/refused the range
+            offset = 0
+            mode = "wb"
+
+        total = _content_total(response, offset)
+
+        new_etag = response.headers.get("ETag")
+        if mode == "ab" and etag is not None and new_etag is not None and new_etag != etag:
+            os.remove(part_path)
+            raise IncompleteDownload(f"ETag changed for {url} ({etag} -> {new_etag}), restarting")
+        if new_etag is not None:
+            with open(etag_path, "w") as f:
+                f.write(new_etag)
+
+        transferred = 0
+        with open(part_path, mode, buffering=chunk_size) as file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                file.write(chunk)
+                transferred += len(chunk)
+
+    size = os.path.getsize(part_path)
+    if total is not None and size != total:
+        raise IncompleteDownload(f"{part_path} has {size} bytes, expected {total}")
+
+    return transferred
+
+
+def download_data(link, file_name, dst_dir="./temp", session=None, chunk_size=CHUNK_SIZE,
+                  retries=RETRIES, backoff=BACKOFF):
+    """
+    Input: link - base url, file_name - e.g. 1990010112.nc
+           dst_dir - where the finished file ends up
+           session - shared requests.Session (one is made if not given)
+    Output: dict with the file name, status (skipped/downloaded/failed), bytes and seconds
+    """
+    full_file_path = os.path.join(dst_dir, file_name)
+    part_path = f"{full_file_path}.part"
+    etag_path = f"{part_path}.etag"
+    result = {"file": file_name, "status": "skipped", "bytes": 0, "seconds": 0.0}
+
+    # only complete files are ever renamed into place, so existing means done
+    if os.path.exists(full_file_path):
+        print(f"{full_file_path} already exists. Skipping...")
+        return result
+
+    if session is None:
+        session = make_session(pool_size=1)
+
+    os.makedirs(dst_dir, exist_ok=True)
+    url = f"{link}{file_name}"
+    start_time = time.perf_counter()
+
+    for attempt in range(retries + 1):
+        try:
+            if attempt == 0:
+                print(f"Starting Request for {file_name}: ")
+            result["bytes"] += _fetch(session, url, part_path, etag_path, chunk_size)
+
+            os.replace(part_path, full_file_path)  # atomic on the same filesystem
+            if os.path.exists(etag_path):
+                os.remove(etag_path)
+
+            result["status"] = "downloaded"
+            print(f"File downloaded successfully: {full_file_path}")
+            break
+
+        except (requests.exceptions.RequestException, IncompleteDownload, OSError) as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status is not None and status not in RETRY_STATUS:
+                print(f"An error occurred: {e}")
+                result["status"] = "failed"
+                break
+            if attempt == retries:
+                print(f"An error occurred: {e} (giving up after {retries + 1} attempts)")
+                result["status"] = "failed"
+                break
+
+            wait = backoff * 2**attempt
+            print(f"Attempt {attempt + 1} for {file_name} failed: {e}. Retrying in {wait:.0f} s...")
+            time.sleep(wait)
+
+    result["seconds"] = time.perf_counter() - start_time
+    return result
+
+
+def throughput_report(results, elapsed):
+    """
+    Summarize a list of download_data results
+    """
+    report = {
+        "downloaded": sum(r["status"] == "downloaded" for r in results),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "failed": [r["file"] for r in results if r["status"] == "failed"],
+        "bytes": sum(r["bytes"] for r in results),
+        "seconds": elapsed,
+    }
+    report["MB_per_s"] = report["bytes"] / 1e6 / elapsed if elapsed > 0 else 0.0
+
+    print(f"Downloaded {report['downloaded']}, skipped {report['skipped']}, "
+          f"failed {len(report['failed'])} files: {report['bytes'] / 1e6:.1f} MB "
+          f"in {elapsed:.1f} s ({report['MB_per_s']:.1f} MB/s)")
+    if report["failed"]:
+        print(f"Failed files: {report['failed']}")
+    return report
+
+
+#%%
+# parallization cause this thang is slooow
+def run_parallel(dates, link, dst_dir="./temp", max_workers=MAX_WORKERS, session=None, **kwargs):
+    """
+    Download {date}12.nc for every date (yyyymmdd strings) over one pooled session
+    Extra kwargs (chunk_size, retries, backoff) are passed on to download_data
+    Output: throughput report dict
+    """
+    if session is None:
+        session = make_session(pool_size=max_workers)
+
+    start_time = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(download_data, link, f"{date}12.nc", dst_dir, session, **kwargs)
+                   for date in dates]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    return throughput_report(results, time.perf_counter() - start_time)
@@ -0,0 +1,168 @@
+"""
+
+    Day of year climatology with a moving window
+    For each calendar day the percentiles come from every hour of the days within
+    +-half_window days of it, over all the years (31 years x 31 days for a 15 day window).
+
+    Instead of re-reading up to 31 daily files per output day, each day's hours are counted
+    into a histogram (wind_hist.py) held in a ring. Sliding the window one day adds the
+    incoming day's histogram and subtracts the outgoing one, so every file in
+    climatology/daily/ is read once (per tile, the grid is done in tiles like tiled_stats.py).
+    The window wraps around the year, late december is in the window of early january.
+
+    Output: one netcdf with (dayofyear, rlat, rlon) variables mean, p10, p25, ...
+            and a "date" (MM-DD) coordinate along dayofyear, one entry per daily file
+            (365, the daily cubes are built on a no leap calendar so feb 29 has no file)
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import re
+import time
+
+import numpy as np
+
+from tiled_stats import create_output, grid_info, hist_bins, tile_windows, _read_tile
+from utils import period_label
+from wind_hist import HistogramAccumulator
+
+DOY_PERCENTILES = (10, 25, 50, 75, 90, 95)
+
+
+def daily_files(data_dir, var_name="windspeed", period=None):
+    """
+    Daily files of var_name (windspeed/winddir) in calendar order
+    period - only the files of this normal, e.g. (1990, 2020) (None = any)
+    Output: list of ((month, day), path)
+    """
+    days = []
+    for file in os.listdir(data_dir):
+        match = re.search(r"_hrly_(\w+?)_m(\d{2})_d(\d{2})", file)
+        if not match or match.group(1) != var_name:
+            continue
+        month, day = int(match.group(2)), int(match.group(3))
+        if period is None or file.startswith(period_label(period, month)):
+            days.append(((month, day), os.path.join(data_dir, file)))
+    return sorted(days)
+
+
+def _day_hist(path, var_name, window, rows, cols, shape, scale_factor, fill_value):
+    # one day's hours over all years, counts per day fit in uint16 (31 years x 24 h)
+    acc = HistogramAccumulator(shape, nbins=1, scale_factor=scale_factor,
+                               fill_value=fill_value, dtype=np.uint16)
+    acc.add(_read_tile(path, var_name, window, rows, cols))
+    return acc
+
+
+def _doy_stats(acc, percentiles):
+    stats = acc.stats([p for p in percentiles if p != 50])
+    out = {"mean": stats["mean"]}
+    for p in percentiles:
+        out[f"p{p:d}"] = stats["median"] if p == 50 else stats[f"p{p:d}"]
+    return out
+
+
+def sliding_window(day, ndays, half_window, acc):
+    """
+    Slide a +-half_window day window over the year, wrapping around, each day built once
+    Input: day(i) -> histogram of day i (i taken mod ndays), empty accumulator for the window
+    Yields: (i, acc) with acc holding the window of day i, changed in place for the next day
+    """
+    # window of day 0 is days -N..N, ring holds them in order. The last N days
+    # (read now) and the first N (needed again at the end) are kept, no re-reads
+    ring = [day(i) for i in range(-half_window, half_window + 1)]
+    kept = {(i + ndays) % ndays: h for i, h in zip(range(-half_window, half_window), ring)}
+    for h in ring:
+        acc.merge(h)
+
+    for i in range(ndays):
+        yield i, acc
+        if i == ndays - 1:
+            break
+        # slide: drop day i-N, add day i+N+1 (the first days again once past the end)
+        acc.subtract(ring.pop(0))
+        nxt = (i + half_window + 1) % ndays
+        h = kept[nxt] if nxt in kept else day(nxt)
+        ring.append(h)
+        acc.merge(h)
+
+
+def run_doy_climatology(data_dir, output_file, var_name, half_window=15, file_var="windspeed",
+                        percentiles=DOY_PERCENTILES, memory_mb=4000, lon_min=None, lon_max=None,
+                        period=None, profile="float32"):
+    """
+    Input: daily file directory, output netcdf path, the variable in the files
+           half_window - days either side of each day in its window
+           file_var - windspeed/winddir part of the daily file names
+           memory_mb - ceiling for one tile's ring of histograms and results
+           period - (first, last) year of the normal to take the daily files of (None = any)
+           profile - writer.py encoding profile
+    Output: number of days written
+    """
+    days = daily_files(data_dir, file_var, period)
+    ndays = len(days)
+    if ndays == 0:
+        raise ValueError(f"No {file_var} daily files in {data_dir}")
+    if 2 * half_window + 1 > ndays:
+        raise ValueError("Window is longer than the days available")
+
+    template, window, scale_factor, fill_value = grid_info(days[0][1], var_name, lon_min, lon_max)
+    names = ["mean"] + [f"p{p:d}" for p in percentiles]
+
+    # ring of 2N+1 day histograms (uint16), the first/last N days kept for the wrap around,
+    # the uint32 window and its cumsum, and the results for every day (float32)
+    nbins = hist_bins(days[0][1]) + 1
+    per_cell = (3 * half_window + 2) * nbins * 2 + nbins * (4 + 8) + ndays * len(names) * 4
+    tiles = tile_windows(template.shape, memory_mb * 2**20 // per_cell)
+    print(f"{ndays} days, +-{half_window} day window, grid {template.shape} -> {len(tiles)} tiles")
+
+    lead = ("dayofyear", {"dayofyear": np.arange(1, ndays + 1),
+                          "date": np.array([f"{m:02d}-{d:02d}" for (m, d), _ in days])})
+    nc = create_output(output_file, template, names, profile, lead=lead)
+    start_time = time.time()
+    try:
+        for t, (rows, cols) in enumerate(tiles):
+            shape = (rows.stop - rows.start, cols.stop - cols.start)
+
+            def day(i):
+                return _day_hist(days[i % ndays][1], var_name, window, rows, cols, shape,
+                                 scale_factor, fill_value)
+
+            out = {name: np.empty((ndays,) + shape, dtype=np.float32) for name in names}
+            acc = HistogramAccumulator(shape, scale_factor=scale_factor, fill_value=fill_value)
+            for i, acc in sliding_window(day, ndays, half_window, acc):
+                for name, arr in _doy_stats(acc, percentiles).items():
+                    out[name][i] = arr
+
+            for name, arr in out.items():
+                nc[name][:, rows, cols] = np.ma.masked_invalid(arr)
+            print(f"tile {t + 1}/{len(tiles)} done ({time.time() - start_time:.1f} s)")
+    finally:
+        nc.close()
+    return ndays
+
+
+#%%
+if __name__ == "__main__":
+    import json
+
+    from grid_geometry import TRIM_LON_WEST, TRIM_LON_EAST
+    from utils import NORMAL_PERIOD
+
+    data_dir = "./climatology/daily/"
+    period = NORMAL_PERIOD
+    output_file = f"./climatology/{period_label(period)}_doy_windspeed_stats.nc"
+    half_window = 15  # days either side
+
+    # get the variable names
+    with open("./utils/variables.json", 'r') as f:
+        casr_vars = json.load(f)
+
+    run_doy_climatology(data_dir, output_file, casr_vars["CaSR_Variables"]["wind_speed"],
+                        half_window=half_window, memory_mb=4000,
+                        lon_min=TRIM_LON_WEST, lon_max=TRIM_LON_EAST, period=period)
+    print(f"Saved day of year stats to {output_file}")
+# %%
@@ -0,0 +1,151 @@
+"""
+
+    Threshold exceedance and run lengths per grid cell
+    How often the hourly values go over each threshold (e.g. 20/40/60 km/h) and how long
+    those spells last. Counted straight off the packed int16 cubes while they stream by
+    (tiled_stats.py feeds it the same reads as the histograms).
+
+    exceed_T    - fraction of the valid hours above T
+    runs_T      - number of runs (consecutive hours above T) per year
+    run_mean_T  - mean run length (hours)
+    run_max_T   - longest run (hours)
+
+    Runs carry over from one daily file to the next within a year (files go in calendar
+    order and each year's 24 hours follow on from the previous day's). A run is closed at
+    the end of the month, so merged seasons count a spell over a month boundary as two.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import numpy as np
+import xarray as xr
+
+from wind_hist import SCALE_FACTOR, FILL_VALUE
+
+
+def threshold_label(threshold):
+    # 20 -> "20", 12.5 -> "12p5", used in the variable names
+    return f"{threshold:g}".replace(".", "p")
+
+
+def exceedance_names(thresholds):
+    names = []
+    for t in thresholds:
+        label = threshold_label(t)
+        names += [f"exceed_{label}", f"runs_{label}", f"run_mean_{label}", f"run_max_{label}"]
+    return names
+
+
+class RunLengthAccumulator:
+    """
+    Exceedance counts and run lengths for a list of thresholds (data units)
+    The (threshold, cell) state of the open runs is kept per year
+    """
+    def __init__(self, shape, thresholds, scale_factor=SCALE_FACTOR, fill_value=FILL_VALUE):
+        self.shape = tuple(shape)
+        self.ncell = int(np.prod(self.shape))
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.scale_factor = scale_factor
+        self.fill_value = fill_value
+        # packed value v is above t when v * scale_factor > t
+        self._limits = np.floor(np.round(self.thresholds / scale_factor, 6)).astype(np.int64)[:, None]
+
+        k = len(self.thresholds)
+        self.n = np.zeros(self.ncell, dtype=np.int64)
+        self.exceed = np.zeros((k, self.ncell), dtype=np.int64)
+        self.run_count = np.zeros((k, self.ncell), dtype=np.int64)
+        self.run_max = np.zeros((k, self.ncell), dtype=np.int64)
+        self.years = set()
+        self._open = {}
+
+    def add(self, packed, years):
+        """
+        packed - raw int16 values (time, *shape) in time order, the fill value breaks a run
+        years - year of each step (windrun.file_years), runs continue within a year
+        """
+        packed = np.asarray(packed).reshape(-1, self.ncell)
+        years = np.asarray(years)
+        self.n += (packed != self.fill_value).sum(axis=0)
+
+        for row, year in zip(packed, years):
+            year = int(year)
+            run = self._open.get(year)
+            if run is None:
+                run = self._open[year] = np.zeros((len(self.thresholds), self.ncell), dtype=np.int64)
+                self.years.add(year)
+            above = (row != self.fill_value) & (row > self._limits)
+            self._close(run, ~above)
+            run += above
+            self.exceed += above
+
+    def _close(self, run, ended):
+        # runs that were going and stop here
+        ended = ended & (run > 0)
+        self.run_count += ended
+        np.maximum(self.run_max, np.where(ended, run, 0), out=self.run_max)
+        run[ended] = 0
+
+    def finish(self):
+        """
+        Close every open run (end of the month/period)
+        """
+        for run in self._open.values():
+            self._close(run, np.ones_like(run, dtype=bool))
+        self._open = {}
+
+    def merge(self, other):
+        """
+        Add another (finished) accumulator on the same grid and thresholds, returns self
+        """
+        if other.shape != self.shape or not np.array_equal(other.thresholds, self.thresholds):
+            raise ValueError("Can only merge accumulators on the same grid and thresholds")
+        self.n += other.n
+        self.exceed += other.exceed
+        self.run_count += other.run_count
+        np.maximum(self.run_max, other.run_max, out=self.run_max)
+        # merged months each cover every year once (december is a year behind in DJF),
+        # runs per year are over that many years, not the union
+        self.years = max(self.years, other.years, key=len)
+        return self
+
+    @classmethod
+    def load(cls, path, window=None):
+        """
+        Read the run length part of a tiled partial (tiled_stats._create_partial)
+        window - isel dict to read only part of the grid
+        """
+        with xr.open_dataset(path, mask_and_scale=False) as ds:
+            if window is not None:
+                ds = ds.isel(window)
+            exceed = ds["exceed"]
+            acc = cls(exceed.shape[1:], ds["threshold"].values, scale_factor=ds.attrs["scale_factor"],
+                      fill_value=ds.attrs["fill_value"])
+            acc.n = ds["n"].values.reshape(-1).astype(np.int64)
+            for name in ["exceed", "run_count", "run_max"]:
+                setattr(acc, name, ds[name].values.reshape(len(acc.thresholds), -1).astype(np.int64))
+            acc.years = set(int(y) for y in np.atleast_1d(ds.attrs.get("run_years", [])))
+        return acc
+
+    def stats(self):
+        """
+        Output: dict of arrays on the grid shape, names as exceedance_names()
+        """
+        nyears = max(len(self.years), 1)
+        empty = self.n == 0
+        out = {}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for k, t in enumerate(self.thresholds):
+                label = threshold_label(t)
+                fields = {
+                    f"exceed_{label}": self.exceed[k] / self.n,
+                    f"runs_{label}": self.run_count[k] / nyears,
+                    # exceeding hours are exactly the hours in runs
+                    f"run_mean_{label}": np.where(self.run_count[k] > 0, self.exceed[k] / self.run_count[k], 0.0),
+                    f"run_max_{label}": self.run_max[k].astype(np.float64),
+                }
+                for name, arr in fields.items():
+                    arr = np.where(empty, np.nan, arr)
+                    out[name] = arr.reshape(self.shape)
+        return out
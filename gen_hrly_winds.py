@@ -9,13 +9,36 @@
 
 """
 #%%
-import xarray as xr
-import pandas as pd
-import numpy as np
 import os
 import json
-
-def gen_hrly_files(month, day):
+import time
+
+from ingest import run_ingest, DailyCubeSink
+from utils import NORMAL_PERIOD, period_label
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def peak_memory_mb():
+    # peak resident memory of this process so far (None where resource isn't available)
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on linux
+
+
+def gen_hrly_files(month, day, files=None, workers=None, sinks=(), period=NORMAL_PERIOD, profile="int16"):
+    """
+    month, day - ints for the calendar day to build
+    files - raw file names in ./temp/ to use, defaults to every finished YYYYMMDD12.nc for that day
+    workers - decode the raw files on this many processes (None/1 = serial, same output)
+    sinks - extra ingest sinks (see ingest.py) fed from the same read of the raw files,
+            they are not finished here so they can keep collecting over many days
+    period - (first, last) year of the normal, only used for the file names
+    profile - writer.py encoding profile of the daily files
+    """
     save_dir = "./climatology/daily/"
     data_dir = "./temp/"
 
@@ -23,67 +46,46 @@ def gen_hrly_files(month, day):
     with open("./utils/variables.json", 'r') as f:
         casr_vars = json.load(f)
 
-    all_files = os.listdir(data_dir)
-
-    # loop through each day in a year to get a daily file
-    day_files = [file for file in all_files if f"{month:02d}{day:02d}12.nc" in file]
-
-    count = 0
-    for file in day_files:
-        # get the date info from the file name
-        if int(month) < 12:
-            sfilename = f"1990-2020_hrly_windspeed_m{month:02d}_d{day:02d}.h5"
-            dfilename = f"1990-2020_hrly_winddir_m{month:02d}_d{day:02d}.h5"
-        else: 
-            # december is actualy an 1989-2019 climatology
-            sfilename = f"1989-2019_hrly_windspeed_m{month:02d}_d{day:02d}.h5"
-            dfilename = f"1989-2019_hrly_winddir_m{month:02d}_d{day:02d}.h5"
-
-        if os.path.exists(os.path.join(save_dir, sfilename)) and os.path.exists(os.path.join(save_dir, dfilename)):
-            print(f"{sfilename} and {dfilename} already exists. Skipping...")
-        else:
-            print(f"Generating the hrly wind files ...")
-            print(f"Current file: {file}")
-
-            ds = xr.open_dataset(f"{data_dir}{file}", engine="netcdf4")
-
-            # wind speed
-            ws_da = ds[casr_vars["CaSR_Variables"]["wind_speed"]] 
-            ws_da = ws_da * 1.852  # convert to km/h from kts
-
-            # wind direction
-            wd_da = ds[casr_vars["CaSR_Variables"]["wind_direction"]]
-
-            # trim both files to exclude data too far south of canada
-            trim_lat = 40 # southern most point in canada is 41.41
-
-            ws_da = ws_da.where(ws_da['lat'] >= trim_lat, drop=True)
-            wd_da = wd_da.where(ws_da['lat'] >= trim_lat, drop=True)
-
-            if count == 0:
-                # first date
-                ws_all = ws_da
-                wd_all = wd_da
-            else:
-                # concatenate the data arrays
-                ws_all = xr.concat([ws_all, ws_da], dim="time")
-                wd_all = xr.concat([wd_all, wd_da], dim="time")
+    if files is None:
+        all_files = os.listdir(data_dir)
 
-                print(ws_all.values.shape)
+        # loop through each day in a year to get a daily file
+        # endswith so partial downloads (.nc.part) are never picked up
+        day_files = [file for file in all_files if file.endswith(f"{month:02d}{day:02d}12.nc")]
+    else:
+        day_files = files
 
-        count += 1
+    # get the date info from the file name
+    # december is actualy a year earlier (1989-2019 for the 1990-2020 normal)
+    label = period_label(period, month)
+    sfilename = f"{label}_hrly_windspeed_m{month:02d}_d{day:02d}.h5"
+    dfilename = f"{label}_hrly_winddir_m{month:02d}_d{day:02d}.h5"
 
-    # save the files
-    # encoding comes from recommended xarray compressions for netcdf files
     if os.path.exists(os.path.join(save_dir, sfilename)) and os.path.exists(os.path.join(save_dir, dfilename)):
-        print(f"Done here...")
-    else: 
-        ws_all.to_netcdf(f"{save_dir}/{sfilename}", 
-                 encoding={casr_vars["CaSR_Variables"]["wind_speed"]: {
-                     'dtype': 'int16', 'scale_factor': 0.1, '_FillValue': -9999}})
-        wd_all.to_netcdf(f"{save_dir}/{dfilename}", 
-                 encoding={casr_vars["CaSR_Variables"]["wind_direction"]: {
-                     'dtype': 'int16', 'scale_factor': 0.1, '_FillValue': -9999}})
+        print(f"{sfilename} and {dfilename} already exists. Skipping...")
+        return
+
+    if not day_files:
+        print(f"No raw files for m{month:02d} d{day:02d} in {data_dir}")
+        return
+
+    ws_name = casr_vars["CaSR_Variables"]["wind_speed"]
+    wd_name = casr_vars["CaSR_Variables"]["wind_direction"]
+
+    print(f"Generating the hrly wind files ...")
+    start_time = time.perf_counter()
+
+    day_files = sorted(day_files)  # yyyymmdd names so this is year order
+    paths = [f"{data_dir}{file}" for file in day_files]
+    cube = DailyCubeSink(f"{save_dir}/{sfilename}", f"{save_dir}/{dfilename}", n_files=len(paths),
+                         profile=profile)
+    run_ingest(paths, [cube] + list(sinks), ws_name, wd_name, workers=workers, finish=False)
+    cube.finish()
+
+    elapsed = time.perf_counter() - start_time
+    peak = peak_memory_mb()
+    peak = f"{peak:.0f} MB" if peak is not None else "n/a"
+    print(f"m{month:02d} d{day:02d}: {len(day_files)} files in {elapsed:.1f} s, peak memory {peak}")
 
     print("Complete")
 
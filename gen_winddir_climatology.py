@@ -1,11 +1,12 @@
 """
 
-    Generate 30 year mean, median, and std, of wind direction, 
+    Generate 30 year circular stats of wind direction (vector mean, resultant length,
+    circular std, speed weighted direction and 16 sector frequencies, see circular_stats.py)
     for each month and meteorological season (DJF, MAM, JJA, SON).
 
     Input: nil
-    Ouput: 1990-2020 monthly and seasonal mean files (in .h5 files)
-           of wind direction.
+    Ouput: monthly and seasonal mean files (in .h5 files)
+           of wind direction for the normal period (e.g. 1990-2020).
 
     Liam.Buchart@nrcan-rncan.gc.ca
     September 12, 2025
@@ -15,9 +16,14 @@
 import os
 import json
 
-import xarray as xr
+from circular_stats import DirectionAccumulator, accumulate_direction_files
+from utils import NORMAL_PERIOD, period_label
+from wind_hist import merge_partials, missing_partials, partial_path
+from writer import write_dataset
 
 data_dir = "./climatology/daily/"
+period = NORMAL_PERIOD  # (first, last) year of the normal
+profile = "int16_zlib1"  # output encoding, see writer.PROFILES (fractions stay float32)
 
 months = range(1, 12+1)
 seasons = {
@@ -34,79 +40,47 @@ save_dir = "./climatology/monthly/"
 with open("./utils/variables.json", 'r') as f:
     casr_vars = json.load(f)
 
-# combine with time dim
-def combine_da(count, da1):
-    # combine the DataArrays
-    if count == 0:
-        da_all = da1
-    else:
-        da_all = xr.concat([da_all, da1], dim="time")
-    return da_all
-
-def all_stats(da):
-    # get all the stats for a DataArray
-    da_mean = da.mean(dim="time")
-    da_median = da.median(dim="time")
-    da_mode = da.mode(dim="time")
-    da_std = da.std(dim="time")
-
-    # combine into a dataset
-    ds = xr.Dataset({
-        "mean": da_mean,
-        "median": da_median,
-        "mode": da_mode,
-        "std": da_std,
-    })
-
-    return ds
-
 for mm in months:
     # get all the files for the month in the hrly directory
-    all_files = os.listdir(data_dir)
-    month_files = [file for file in all_files if f"m{mm:02d}" in file]
-
-    count = 0
-    for file in month_files:
-        # concatenate all the files for the month
-        print(f"Processing file: {file}")
-        ds = xr.open_dataset(f"{data_dir}{file}", engine="h5netcdf")
-        wd = ds[casr_vars["CaSR_Variables"]["wind_direction"]]
-
-        wd_all = combine_da(count, wd)
-
-        count += 1
-
-    # now get the stats
+    all_files = [file for file in os.listdir(data_dir) if file.startswith(period_label(period, mm))]
+    month_files = [file for file in all_files if f"m{mm:02d}" in file and "winddir" in file]
+
+    # stream the files (and their speeds for the weighted direction), nothing is concatenated
+    print(f"Processing {len(month_files)} files for month: {mm:02d} ...")
+    acc, template = accumulate_direction_files([f"{data_dir}{file}" for file in month_files],
+                                               casr_vars["CaSR_Variables"]["wind_direction"],
+                                               casr_vars["CaSR_Variables"]["wind_speed"])
+    if acc is None:
+        print(f"No winddir files found for month: {mm:02d}")
+        continue
+
+    # now get the stats (vector mean, resultant length, circular std, sectors)
     print(f"Calculating stats for month: {mm:02d} ...")
-    wd_stats = all_stats(wd_all)
+    wd_stats = acc.to_dataset(template)
 
-    # save the files
-    wd_stats.to_netcdf(f"{save_dir}/1990-2020_monthly_winddir_m{mm:02d}.h5")
+    # save the files, plus the partial the seasons are merged from
+    out_file = f"{save_dir}/{period_label(period)}_monthly_winddir_m{mm:02d}.h5"
+    write_dataset(wd_stats, out_file, profile)
+    acc.save(partial_path(out_file), template, months=[mm])
 
 # now do the seasonal means and stats
+# from the monthly partials, the hourly files are not read again
+month_dir = save_dir
 save_dir = "./climatology/seasonal/"
 
 for season, months in seasons.items():
-    # get all the files for the season in the hrly directory
-    all_files = os.listdir(data_dir)
-    season_files = []
-    for mm in months:
-        season_files.extend([file for file in all_files if f"m{mm:02d}" in file])
-
-    count = 0
-    for file in season_files:
-        # concatenate all the files for the month
-        print(f"Processing file: {file}")
-        ds = xr.open_dataset(f"{data_dir}{file}", engine="h5netcdf")
-        wd = ds[casr_vars["CaSR_Variables"]["wind_direction"]]
-
-        wd_all = combine_da(count, wd)
-
-        count += 1
+    partials = [partial_path(f"{month_dir}/{period_label(period)}_monthly_winddir_m{mm:02d}.h5") for mm in months]
+    # only whole seasons, a season missing a month is skipped rather than merged short
+    missing = missing_partials(partials)
+    if missing:
+        print(f"Skipping {season}, monthly partials not found: {missing}")
+        continue
+    acc, template = merge_partials(partials, cls=DirectionAccumulator)
 
     # now get the stats
     print(f"Calculating stats for season: {season} ...")
-    wd_stats = all_stats(wd_all)
+    wd_stats = acc.to_dataset(template)
+    wd_stats.attrs["months"] = months
 
     # save the files
-    wd_stats.to_netcdf(f"{save_dir}/1990-2020_seasonal_winddir_{season}.h5")
\ No newline at end of file
+    write_dataset(wd_stats, f"{save_dir}/{period_label(period)}_seasonal_winddir_{season}.h5", profile)
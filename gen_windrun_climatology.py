@@ -2,6 +2,7 @@
 
     Similar to gen_climatology.py but getting windrun which requires so 
     additional processing since stats come from month total rather than hourly values.
+    The per year totals are accumulated by windrun.py while streaming the daily files.
     Calculate mean, mdian, std, 10th, 25th, 75th, 90th, 95th percentiles
     for each month and meteorological season (DJF, MAM, JJA, SON).
 
@@ -12,12 +13,17 @@
 #%%
 import os
 import json
+import calendar
 
-import xarray as xr
+from utils import NORMAL_PERIOD, period_label
+from windrun import WindRunTotals, accumulate_windrun, windrun_stats
+from writer import write_dataset
 
 data_dir = "./climatology/daily/"
+period = NORMAL_PERIOD  # (first, last) year of the normal
+# output encoding, see writer.PROFILES - the totals (km) are too big for the int16 profiles
+profile = "float32"
 
-months = range(1, 12+1)
 seasons = {
     "DJF": [12, 1, 2],
     "MAM": [3, 4, 5],
@@ -25,97 +31,60 @@ seasons = {
     "SON": [9, 10, 11]
 }
 
-# do the monthly means and stats first
-save_dir = "./climatology/monthly/"
-years = range(1990, 2020+1)
-dec_years = range(1989, 2019+1)
+month_dir = "./climatology/monthly/"
+season_dir = "./climatology/seasonal/"
 
 # get the variable names
 with open("./utils/variables.json", 'r') as f:
     casr_vars = json.load(f)
 
-# combine with time dim
-def combine_da(count, da1):
-    # combine the DataArrays
-    if count == 0:
-        da_all = da1
-    else:
-        da_all = xr.concat([da_all, da1], dim="time")
-    return da_all
-
-def all_stats(da):
-    # get all the stats for a DataArray
-    da_mean = da.mean(dim="time")
-    da_median = da.median(dim="time")
-    da_std = da.std(dim="time")
-    da_p10 = da.quantile(0.1, dim="time")
-    da_p25 = da.quantile(0.25, dim="time")
-    da_p75 = da.quantile(0.75, dim="time")
-    da_p90 = da.quantile(0.9, dim="time")
-    da_p95 = da.quantile(0.95, dim="time")
-
-    # combine into a dataset
-    ds = xr.Dataset({
-        "mean": da_mean,
-        "median": da_median,
-        "std": da_std,
-        "p10": da_p10,
-        "p25": da_p25,
-        "p75": da_p75,
-        "p90": da_p90,
-        "p95": da_p95
-    })
-
-    return ds
-
-for mm in months:
-    # get all the files for the month in the hrly directory
-    all_files = os.listdir(data_dir)
-    month_files = [file for file in all_files if f"m{mm:02d}" in file]
-
-    count = 0
-    for file in month_files:
-        # concatenate all the files for the month
-        print(f"Processing file: {file}")
-        ds = xr.open_dataset(f"{data_dir}{file}", engine="h5netcdf")
-        ws = ds[casr_vars["CaSR_Variables"]["wind_speed"]]
-
-        # for year in years??
-
-        count += 1
-
-    # now get the stats
-    print(f"Calculating stats for month: {mm:02d} ...")
-    ws_stats = all_stats(ws_all)
-
-    # save the files
-    ws_stats.to_netcdf(f"{save_dir}/1990-2020_monthly_windspeed_m{mm:02d}.h5")
-
-# now do the seasonal means and stats
-save_dir = "./climatology/seasonal/"
-
+# each month is streamed once: its per year totals give the monthly stats and are
+# then added into the season's totals, only two sets of totals are held at a time
 for season, months in seasons.items():
-    # get all the files for the season in the hrly directory
-    all_files = os.listdir(data_dir)
-    season_files = []
+    season_totals = None
+    whole_season = True
     for mm in months:
-        season_files.extend([file for file in all_files if f"m{mm:02d}" in file])
-
-    count = 0
-    for file in season_files:
-        # concatenate all the files for the month
-        print(f"Processing file: {file}")
-        ds = xr.open_dataset(f"{data_dir}{file}", engine="h5netcdf")
-        ws = ds[casr_vars["CaSR_Variables"]["wind_speed"]]
-
-        ws_all = combine_da(count, ws)
-
-        count += 1
+        # get all the files for the month in the hrly directory
+        all_files = [file for file in os.listdir(data_dir) if file.startswith(period_label(period, mm))]
+        speed_files = [file for file in all_files if f"m{mm:02d}" in file and "windspeed" in file]
+
+        # wind run is a sum, a missing day would make the totals low: only whole months
+        # (the daily cubes are on a no leap calendar, feb has 28)
+        ndays = calendar.monthrange(2001, mm)[1]
+        missing = [dd for dd in range(1, ndays + 1)
+                   if not any(f"m{mm:02d}_d{dd:02d}" in file for file in speed_files)]
+        if len(missing) == ndays:
+            print(f"No windspeed files found for month: {mm:02d}")
+        elif missing:
+            print(f"Skipping month {mm:02d}, no windspeed files for days {missing}")
+        if missing:
+            whole_season = False
+            continue
+
+        print(f"Processing {len(speed_files)} files for month: {mm:02d} ...")
+        totals, template = accumulate_windrun([f"{data_dir}{file}" for file in speed_files],
+                                              casr_vars["CaSR_Variables"]["wind_speed"])
+
+        # now get the stats over the yearly totals
+        print(f"Calculating stats for month: {mm:02d} ...")
+        wr_stats = windrun_stats(totals, template)
+
+        # save the files
+        write_dataset(wr_stats, f"{month_dir}/{period_label(period)}_monthly_windrun_m{mm:02d}.h5", profile)
+
+        # december (a year earlier, 1989-2019 for 1990-2020) belongs to the following year's DJF
+        if season_totals is None:
+            season_totals = WindRunTotals(totals.shape)
+        season_totals.merge(totals, year_shift=1 if mm == 12 else 0)
+
+    # the season's totals only with all three months in them
+    if not whole_season:
+        print(f"Skipping {season}, not all of its months could be accumulated")
+        continue
 
     # now get the stats
     print(f"Calculating stats for season: {season} ...")
-    ws_stats = all_stats(ws_all)
-
+    wr_stats = windrun_stats(season_totals, template)
 
     # save the files
-    ws_stats.to_netcdf(f"{save_dir}/1990-2020_seasonal_windspeed_{season}.h5")
+    write_dataset(wr_stats, f"{season_dir}/{period_label(period)}_seasonal_windrun_{season}.h5", profile)
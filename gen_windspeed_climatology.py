@@ -6,8 +6,8 @@
     season (DJF, MAM, JJA, SON).
 
     Input: nil
-    Ouput: 1990-2020 monthly and seasonal mean files (in .nc files)
-           of wind speed, direction, and run.
+    Ouput: monthly and seasonal mean files (in .nc files)
+           of wind speed, direction, and run for the normal period (e.g. 1990-2020).
 
     Liam.Buchart@nrcan-rncan.gc.ca
     September 12, 2025
@@ -17,9 +17,12 @@
 import os
 import json
 
-import xarray as xr
+from tiled_stats import merge_tiled, run_tiled_stats
+from utils import NORMAL_PERIOD, period_label
+from wind_hist import missing_partials, partial_path
 
 data_dir = "./climatology/daily/"
+period = NORMAL_PERIOD  # (first, last) year of the normal
 
 months = [3, 4]  #range(1, 12+1)
 seasons = {
@@ -32,92 +35,57 @@ seasons = {
 # do the monthly means and stats first
 save_dir = "./climatology/monthly/"
 
-# get the variable names
-with open("./utils/variables.json", 'r') as f:
-    casr_vars = json.load(f)
-
-# combine with time dim
-def all_stats(da):
-    # Empty dataset
-    ds = xr.Dataset()
-
-    ds["mean"] = da.mean(dim="time")
-    ds["median"] = da.median(dim="time")
-    ds["std"] = da.std(dim="time")
+# memory ceiling (MB) for the tiles being worked on, and processes working on them (None = serial)
+memory_mb = 4000
+workers = None
 
-    print(ds["median"].shape, ds["std"].shape)
+# output encoding, see writer.PROFILES (int16 packed stats, zlib level 1, 100x100 chunks)
+profile = "int16_zlib1"
 
-    # Quantiles
-    for q, name in zip([0.1, 0.25, 0.75, 0.9, 0.95], ["p10", "p25", "p75", "p90", "p95"]):
-        print(ds.keys(), q, name)
-        quant = da.quantile(q, dim="time")
-        ds[name] = quant
+# exceedance fraction and run lengths above these speeds (km/h), None to skip
+thresholds = [20, 40, 60]
 
-    return ds
-
-#%%
-for mm in months:
-    # get all the files for the month in the hrly directory
-    all_files = os.listdir(data_dir)
-    month_files = [file for file in all_files if f"m{mm:02d}" in file]
-    speed_files = [file for file in month_files if "windspeed" in file]
-
-    # Use Dask to open datasets lazily and concatenate
-    ws_list = []
-    for file in speed_files:
-        print(f"Processing file: {file}")
-        ds = xr.open_dataset(f"{data_dir}{file}", engine="netcdf4", chunks={})
-        ws = ds[casr_vars["CaSR_Variables"]["wind_speed"]]
-        ws_list.append(ws)
-
-    if ws_list:
-        ws_all = xr.concat(ws_list, dim="time")
-        print(f"Calculating stats for month: {mm:02d} ...")
-        ws_stats = all_stats(ws_all)
-
-        # Compute and save to file
-        # Remove all non-dimension coordinates
-        data_cleaned = ws_stats.drop_vars([var for var in ws_stats.coords if var not in ws_stats.dims])
-        print(ws_stats.coords)
-
-        encoding = {var: {"chunksizes": (100, 100), 'dtype': 'int16', 'scale_factor': 0.1, '_FillValue': -9999} 
-                    for var in ws_stats.data_vars}  # "zlib": True, "complevel": 1, 
-        ws_stats.to_netcdf(f"{save_dir}/1990-2020_monthly_windspeed_m{mm:02d}.nc", 
-                           engine="h5netcdf", encoding=encoding)
-        print(f"Finished with m{mm:02d}...")
-
-    else:
-        print(f"No windspeed files found for month: {mm:02d}")
-
-# now do the seasonal means and stats
-save_dir = "./climatology/seasonal/"
+# get the variable names
+with open("./utils/variables.json", 'r') as f:
+    casr_vars = json.load(f)
 
 #%%
-for season, months in seasons.items():
-    # get all the files for the season in the hrly directory
-    all_files = os.listdir(data_dir)
-    season_files = []
+# guarded since the tile workers are spawned and re-import this script
+if __name__ == "__main__":
     for mm in months:
-        season_files.extend([file for file in all_files if f"m{mm:02d}" in file])
-
-    # Use Dask to open datasets lazily and concatenate
-    ws_list = []
-    for file in season_files:
-        print(f"Processing file: {file}")
-        ds = xr.open_dataset(f"{data_dir}{file}", engine="h5netcdf", chunks={})
-        ws = ds[casr_vars["CaSR_Variables"]["wind_speed"]]
-        ws_list.append(ws)
-
-    if ws_list:
-        ws_all = xr.concat(ws_list, dim="time")
+        # get all the files for the month in the hrly directory
+        all_files = [file for file in os.listdir(data_dir) if file.startswith(period_label(period, mm))]
+        month_files = [file for file in all_files if f"m{mm:02d}" in file]
+        speed_files = [file for file in month_files if "windspeed" in file]
+
+        if speed_files:
+            print(f"Calculating stats for month: {mm:02d} ...")
+            out_file = f"{save_dir}/{period_label(period)}_monthly_windspeed_m{mm:02d}.nc"
+            # tile by tile under the memory budget, the seasons below are merged from the partial
+            run_tiled_stats([f"{data_dir}{file}" for file in speed_files],
+                            casr_vars["CaSR_Variables"]["wind_speed"], out_file,
+                            memory_mb=memory_mb, encoding=profile, partial_file=partial_path(out_file),
+                            workers=workers, thresholds=thresholds)
+            print(f"Finished with m{mm:02d}...")
+
+        else:
+            print(f"No windspeed files found for month: {mm:02d}")
+
+    # now do the seasonal means and stats
+    # from the monthly partials, the hourly files are not read again
+    month_dir = save_dir
+    save_dir = "./climatology/seasonal/"
+
+    for season, months in seasons.items():
+        partials = [partial_path(f"{month_dir}/{period_label(period)}_monthly_windspeed_m{mm:02d}.nc")
+                    for mm in months]
+        # only whole seasons, e.g. with months = [3, 4] MAM still needs m05
+        missing = missing_partials(partials)
+        if missing:
+            print(f"Skipping {season}, monthly partials not found: {missing}")
+            continue
         print(f"Calculating stats for season: {season} ...")
-        ws_stats = all_stats(ws_all)
-
-        # Compute and save to file
-        encoding = {var: {"zlib": True, "complevel": 1, "chunksizes": (100, 100)} for var in ws_stats.data_vars}
-        ws_stats.to_netcdf(f"{save_dir}/1990-2020_seasonal_windspeed_m{season:02d}.nc", 
-                           engine="h5netcdf", encoding=encoding)
-        print(f"Finished with {season:02d}...")
-    else:
-        print(f"No windspeed files found for season: {season}")
+        merge_tiled(partials, f"{save_dir}/{period_label(period)}_seasonal_windspeed_{season}.nc",
+                    memory_mb=memory_mb, encoding=profile, months=months)
+        print(f"Finished with {season}...")
 # %%
@@ -0,0 +1,137 @@
+"""
+
+    Grid geometry for the CaSR rotated pole grid
+    lat/lon are 2-D (rlat, rlon), so cropping with where(..., drop=True) builds
+    a full boolean mask and NaN fills every single file.
+    Instead work out the rectangular rlat/rlon index window once per grid and isel it,
+    which netCDF can read straight off disk.
+
+    crop(da, lat_min=40)                     # raw files, trim south of canada
+    crop(da, lon_min=216, lon_max=309)       # daily files, trim west/east of canada
+    crop(da, lat_min=40, mask=True)          # also NaN out cells outside canada
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# canada regions (lon in -180-180) used for the optional mask
+REGIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "operational", "regions_bbox_canada.json")
+
+# cropping used through the processing chain
+TRIM_LAT = 40  # southern most point in canada is 41.41
+TRIM_LON_WEST = 216  # (-144W) western in Canada
+TRIM_LON_EAST = 309  # (-51W) eastern in Canada
+
+# computed windows/masks keyed by grid hash (+ bounds), one entry per grid
+_windows = {}
+_masks = {}
+
+
+def grid_key(lat, lon):
+    """
+    Hash of the lat/lon arrays, identifies a grid (or a cropped piece of one)
+    """
+    h = hashlib.sha1()
+    for a in (lat, lon):
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()[:16]
+
+
+def _latlon(da):
+    lat = da["lat"]
+    lon = da["lon"]
+    if lat.ndim != 2 or lat.dims != lon.dims:
+        raise ValueError("Expected 2-D lat/lon coordinates on the same (rlat, rlon) dims")
+    return lat, lon
+
+
+def index_window(lat, lon, lat_min=None, lat_max=None, lon_min=None, lon_max=None):
+    """
+    Input: 2-D lat/lon numpy arrays, bounds (lon in 0-360 like the CaSR files)
+    Output: (row slice, column slice) of the smallest rectangle holding every cell inside the bounds
+            - the same extent where(cond, drop=True) keeps
+    """
+    inside = np.ones(lat.shape, dtype=bool)
+    if lat_min is not None:
+        inside &= lat >= lat_min
+    if lat_max is not None:
+        inside &= lat <= lat_max
+    if lon_min is not None:
+        inside &= lon >= lon_min
+    if lon_max is not None:
+        inside &= lon <= lon_max
+
+    rows = np.flatnonzero(inside.any(axis=1))
+    cols = np.flatnonzero(inside.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        raise ValueError("No grid cells inside the requested bounds")
+    return slice(int(rows[0]), int(rows[-1]) + 1), slice(int(cols[0]), int(cols[-1]) + 1)
+
+
+def get_window(da, lat_min=None, lat_max=None, lon_min=None, lon_max=None):
+    """
+    Input: DataArray/Dataset with 2-D lat/lon coords
+    Output: dict for da.isel(), e.g. {"rlat": slice(12, 640), "rlon": slice(0, 1120)}
+    Only computed the first time a grid is seen
+    """
+    lat, lon = _latlon(da)
+    lat_vals = np.asarray(lat.values)
+    lon_vals = np.asarray(lon.values)
+    key = (grid_key(lat_vals, lon_vals), lat_min, lat_max, lon_min, lon_max)
+
+    if key not in _windows:
+        rows, cols = index_window(lat_vals, lon_vals, lat_min, lat_max, lon_min, lon_max)
+        _windows[key] = {lat.dims[0]: rows, lat.dims[1]: cols}
+    return dict(_windows[key])
+
+
+def canada_mask(lat, lon, regions_file=REGIONS_FILE):
+    """
+    Boolean 2-D mask of cells falling in any of the canada region boxes
+    (regions_bbox_canada.json, the same boxes the operational comparisons use)
+    """
+    with open(regions_file, "r") as f:
+        regions = json.load(f)["regions"]
+
+    lon180 = np.where(lon > 180, lon - 360, lon)
+    mask = np.zeros(lat.shape, dtype=bool)
+    for region in regions:
+        bbox = region["bbox"]
+        mask |= ((lat >= bbox["south"]) & (lat <= bbox["north"]) &
+                 (lon180 >= bbox["west"]) & (lon180 <= bbox["east"]))
+    return mask
+
+
+def get_mask(da):
+    """
+    Canada mask for the (already cropped) grid of da, as a DataArray on its rlat/rlon dims
+    """
+    lat, lon = _latlon(da)
+    lat_vals = np.asarray(lat.values)
+    lon_vals = np.asarray(lon.values)
+    key = grid_key(lat_vals, lon_vals)
+
+    if key not in _masks:
+        _masks[key] = canada_mask(lat_vals, lon_vals)
+    return lat.copy(data=_masks[key]).drop_vars(["lat", "lon"], errors="ignore")
+
+
+def crop(da, lat_min=None, lat_max=None, lon_min=None, lon_max=None, mask=False):
+    """
+    Crop a DataArray/Dataset to the index window of the bounds (lazy, nothing is read)
+    mask=True also sets cells outside canada to NaN
+    """
+    window = get_window(da, lat_min, lat_max, lon_min, lon_max)
+    da = da.isel(window)
+    if mask:
+        da = da.where(get_mask(da))
+    return da
@@ -0,0 +1,126 @@
+"""
+
+    Nearest grid cell index for the CaSR grid
+    The cells go in a KD-tree on 3-D unit sphere coordinates, so distances are true chord
+    lengths (no degree inflation of the longitudes up north, no 0-360 vs -180-180 issue).
+    The tree is built once per grid and saved beside the data under the grid's lat/lon
+    hash (grid_geometry.grid_key), later runs load it instead of rebuilding:
+
+    index = grid_index(ds["lat"].values, ds["lon"].values)
+    dist_km, ii, jj = index.query(station_lats, station_lons, k=4)   # (nstations, k) each
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import pickle
+
+import numpy as np
+
+from scipy.spatial import cKDTree
+
+from grid_geometry import grid_key
+
+INDEX_DIR = "./climatology/grid_index/"
+EARTH_RADIUS_KM = 6371.0
+
+# loaded indexes by grid hash, one per grid per process
+_indexes = {}
+
+
+def to_xyz(lat, lon):
+    """
+    Degrees (any lon convention) to (n, 3) unit sphere coordinates
+    """
+    lat = np.deg2rad(np.asarray(lat, dtype=np.float64).ravel())
+    lon = np.deg2rad(np.asarray(lon, dtype=np.float64).ravel())
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord):
+    # straight line between two points on the unit sphere -> great circle distance
+    return 2 * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1)) * EARTH_RADIUS_KM
+
+
+class GridIndex:
+    """
+    KD-tree over the cells of a 2-D lat/lon grid, with the grid's lat/lon (-180-180)
+    memory-mapped when loaded from disk
+    """
+    def __init__(self, tree, latlon, shape, key):
+        self.tree = tree
+        self.latlon = latlon
+        self.shape = tuple(shape)
+        self.key = key
+
+    @classmethod
+    def build(cls, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if lat.ndim != 2 or lat.shape != lon.shape:
+            raise ValueError("Expected 2-D lat/lon arrays of the same shape")
+        latlon = np.column_stack((lat.ravel(), (lon.ravel() + 180) % 360 - 180))
+        return cls(cKDTree(to_xyz(lat, lon)), latlon, lat.shape, grid_key(lat, lon))
+
+    @staticmethod
+    def paths(key, index_dir=INDEX_DIR):
+        return (os.path.join(index_dir, f"grid_{key}.tree"), os.path.join(index_dir, f"grid_{key}_latlon.npy"))
+
+    def save(self, index_dir=INDEX_DIR):
+        tree_path, latlon_path = self.paths(self.key, index_dir)
+        os.makedirs(index_dir, exist_ok=True)
+        with open(tree_path, "wb") as f:
+            pickle.dump({"tree": self.tree, "shape": self.shape}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        np.save(latlon_path, self.latlon)
+        return tree_path
+
+    @classmethod
+    def load(cls, key, index_dir=INDEX_DIR):
+        tree_path, latlon_path = cls.paths(key, index_dir)
+        with open(tree_path, "rb") as f:
+            saved = pickle.load(f)
+        return cls(saved["tree"], np.load(latlon_path, mmap_mode="r"), saved["shape"], key)
+
+    def query(self, lats, lons, k=4):
+        """
+        Batch k nearest cells
+        Input: station lat/lon arrays (degrees, any lon convention), k neighbours
+        Output: (distance km, row index, col index) each (npoints, k), nearest first
+        """
+        chord, idx = self.tree.query(to_xyz(lats, lons), k=k)
+        chord = np.asarray(chord).reshape(-1, k)
+        idx = np.asarray(idx).reshape(-1, k)
+        ii, jj = np.unravel_index(idx, self.shape)
+        return chord_to_km(chord), ii, jj
+
+    def cell_latlon(self, ii, jj):
+        """
+        lat, lon (-180-180) of grid cells
+        """
+        flat = np.ravel_multi_index((np.asarray(ii), np.asarray(jj)), self.shape)
+        return self.latlon[flat, 0], self.latlon[flat, 1]
+
+
+def grid_index(lat, lon, index_dir=INDEX_DIR):
+    """
+    The index of a grid: from this process' cache, from disk, or built (and saved)
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    key = grid_key(lat, lon)
+    if key in _indexes:
+        return _indexes[key]
+
+    if os.path.exists(GridIndex.paths(key, index_dir)[0]):
+        index = GridIndex.load(key, index_dir)
+    else:
+        print(f"Building the grid index for {key} ...")
+        index = GridIndex.build(lat, lon)
+        try:
+            index.save(index_dir)
+        except OSError as e:
+            print(f"Could not save the grid index ({e}), it will be rebuilt next time")
+    _indexes[key] = index
+    return index
@@ -0,0 +1,398 @@
+"""
+
+    Single pass ingest of the raw CaSR files (YYYYMMDD12.nc)
+    Each raw file is opened, cropped and decoded exactly once and the packed
+    speed (km/h) / direction arrays are handed to every registered sink:
+
+    DailyCubeSink        - the hourly 31 year cube for one calendar day (gen_hrly_winds)
+    MonthlyAggregateSink - per year monthly mean speed, wind run and mean direction (gen_means)
+    StationSeriesSink    - hourly speed/direction at the nearest grid cell to each station (wind_roses)
+
+    run_ingest(paths, [DailyCubeSink(...), MonthlyAggregateSink(...)], workers=8)
+
+    Sinks receive the arrays packed as int16 (0.1 units, -9999 fill) - exactly how the daily
+    files store them - and use unpack() when they need floats.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import json
+import calendar
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from grid_geometry import crop, TRIM_LAT
+from shared_arrays import create_shared, attach_shared, release_shared
+from writer import write_dataset
+
+# packing used for the daily files
+SCALE_FACTOR = 0.1
+FILL_VALUE = -9999
+
+
+def pack_int16(values):
+    """
+    Pack float values the same way xarray would encode them with
+    dtype int16, scale_factor 0.1 and _FillValue -9999 (NaN -> fill)
+    """
+    values = np.asarray(values)
+    packed = np.around(values / SCALE_FACTOR)  # in the data's own float dtype, as xarray does
+    packed[np.isnan(packed)] = FILL_VALUE
+    return packed.astype(np.int16)
+
+
+def unpack(packed):
+    """
+    int16 packed values back to float32 (fill -> NaN)
+    """
+    values = packed.astype(np.float32) * np.float32(SCALE_FACTOR)
+    values[packed == FILL_VALUE] = np.nan
+    return values
+
+
+def to_packed_da(packed, times, template):
+    """
+    Wrap an already packed (time, rlat, rlon) int16 array in a DataArray like template
+    The scale_factor/_FillValue attributes are written as-is so readers decode it as usual
+    """
+    attrs = dict(template.attrs)
+    attrs.update({"scale_factor": SCALE_FACTOR, "_FillValue": np.int16(FILL_VALUE)})
+    da = xr.DataArray(packed, dims=("time",) + template.dims, name=template.name, attrs=attrs)
+    da = da.assign_coords({"time": times})
+    return da.assign_coords(template.coords)
+
+
+def casr_var_names(variables_file="./utils/variables.json"):
+    # get the stinky variable names that casr uses - dont need to type them out here
+    with open(variables_file, 'r') as f:
+        casr_vars = json.load(f)
+    return casr_vars["CaSR_Variables"]["wind_speed"], casr_vars["CaSR_Variables"]["wind_direction"]
+
+
+def file_date(path):
+    # the raw files are named YYYYMMDD12.nc
+    return datetime.strptime(os.path.basename(path)[:8], "%Y%m%d").date()
+
+
+def read_templates(path, ws_name, wd_name):
+    """
+    Hours per file and coordinate templates (cropped grid, no time) for the speed and direction arrays
+    """
+    with xr.open_dataset(path, engine="netcdf4") as ds:
+        ds = crop(ds, lat_min=TRIM_LAT)
+        nt = ds.sizes["time"]
+        ws_template = ds[ws_name].isel(time=0, drop=True).load()
+        wd_template = ds[wd_name].isel(time=0, drop=True).load()
+    # the speed attrs are dropped, as they are by the km/h conversion
+    ws_template.attrs = {}
+    return nt, ws_template, wd_template
+
+
+def decode_raw_file(path, ws_name, wd_name, nt):
+    """
+    Open one raw CaSR file, crop it and return packed int16 speed (km/h) and direction + the times
+    Used by both the serial and the process pool paths so the output is bit-identical
+    """
+    with xr.open_dataset(path, engine="netcdf4") as ds:
+        # trim both variables to exclude data too far south of canada
+        # index window is worked out once for the grid, only that slab is read
+        ds = crop(ds, lat_min=TRIM_LAT)
+        if ds.sizes["time"] != nt:
+            raise ValueError(f"{path} has {ds.sizes['time']} hours, expected {nt}")
+
+        # wind speed
+        ws_da = ds[ws_name]
+        ws_da = ws_da * 1.852  # convert to km/h from kts
+
+        # wind direction
+        wd_da = ds[wd_name]
+
+        return pack_int16(ws_da.values), pack_int16(wd_da.values), ds["time"].values
+
+
+def _decode_into_shared(path, ws_name, wd_name, pos, shm_names, shape, nt):
+    # worker side: decode one file and write it into its slot of the shared cubes
+    ws_packed, wd_packed, file_times = decode_raw_file(path, ws_name, wd_name, nt)
+    for name, packed in zip(shm_names, (ws_packed, wd_packed)):
+        shm, cube = attach_shared(name, shape, np.int16)
+        cube[pos:pos + nt] = packed
+        del cube
+        release_shared(shm, unlink=False)
+    return pos, file_times
+
+
+_pool = None
+_pool_workers = None
+
+
+def _get_pool(workers):
+    # one pool for the whole run, spawning fresh processes for every day is slow
+    # spawn rather than fork, main.py has a download thread running
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+#%%
+class Sink:
+    """
+    A product built from the raw files. run_ingest calls
+    start(ws_template, wd_template) at the start of every run (a sink can live across several),
+    add(date, times, ws, wd) for every raw file (ws/wd packed int16 (time, rlat, rlon),
+    only valid during the call - copy what you keep) and finish() once the product is complete
+    """
+    def start(self, ws_template, wd_template):
+        pass
+
+    def add(self, date, times, ws, wd):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class DailyCubeSink(Sink):
+    """
+    Hourly speed/direction cube for one calendar day across all years, written to
+    the .h5 daily files in climatology/daily/ (same layout gen_hrly_winds always wrote)
+    """
+    def __init__(self, spath, dpath, n_files, profile="int16"):
+        self.spath = spath
+        self.dpath = dpath
+        self.n_files = n_files
+        # writer.py profile, the cube is already packed so only its compression/chunks apply
+        self.profile = profile
+
+    def start(self, ws_template, wd_template):
+        self.ws_template = ws_template
+        self.wd_template = wd_template
+        self.ws_all = None
+        self.times = []
+
+    def add(self, date, times, ws, wd):
+        if self.ws_all is None:
+            # the cube for all years is allocated once (packed int16, as it is stored on disk)
+            # and each year is copied into its own slot - no growing concat
+            self.nt = ws.shape[0]
+            shape = (self.nt * self.n_files,) + ws.shape[1:]
+            self.ws_all = np.full(shape, FILL_VALUE, dtype=np.int16)
+            self.wd_all = np.full(shape, FILL_VALUE, dtype=np.int16)
+
+        pos = len(self.times) * self.nt
+        self.ws_all[pos:pos + self.nt] = ws
+        self.wd_all[pos:pos + self.nt] = wd
+        self.times.append(times)
+
+    def finish(self):
+        n = len(self.times) * self.nt
+        times = np.concatenate(self.times)
+        ws_all = to_packed_da(self.ws_all[:n], times, self.ws_template)
+        wd_all = to_packed_da(self.wd_all[:n], times, self.wd_template)
+
+        # the data is already packed to int16 with scale_factor 0.1 and _FillValue -9999
+        write_dataset(ws_all, self.spath, self.profile)
+        write_dataset(wd_all, self.dpath, self.profile)
+        self.ws_all = self.wd_all = None
+
+
+class _MonthlySink(Sink):
+    """
+    Helper for products made per (year, month) of the raw file dates
+    A month is written once all of its days have been added. Months still incomplete at
+    finish() are skipped (a resumed run only sees some days and would overwrite the complete
+    files of an earlier one), write_incomplete=True writes them with their day count
+    """
+    def __init__(self, write_incomplete=False):
+        self.months = {}
+        self.days_seen = {}
+        self.write_incomplete = write_incomplete
+
+    def start(self, ws_template, wd_template):
+        self.template = ws_template
+
+    def add(self, date, times, ws, wd):
+        key = (date.year, date.month)
+        if key not in self.months:
+            self.months[key] = self.new_month(key)
+            self.days_seen[key] = set()
+        self.add_month(self.months[key], times, ws, wd)
+        self.days_seen[key].add(date.day)
+
+        if len(self.days_seen[key]) == calendar.monthrange(*key)[1]:
+            self.write_month(key, self.months.pop(key))
+            del self.days_seen[key]
+
+    def finish(self):
+        for key in sorted(self.months):
+            acc = self.months.pop(key)
+            days = len(self.days_seen[key])
+            if self.write_incomplete:
+                print(f"Writing {key[0]}-{key[1]:02d} with {days} days only")
+                self.write_month(key, acc, days=days)
+            else:
+                print(f"Skipping {key[0]}-{key[1]:02d}, only {days} of {calendar.monthrange(*key)[1]} days "
+                      f"were added (write_incomplete=True to write it)")
+        self.days_seen = {}
+
+    def new_month(self, key):
+        raise NotImplementedError
+
+    def add_month(self, acc, times, ws, wd):
+        raise NotImplementedError
+
+    def write_month(self, key, acc, days=None):
+        """
+        days - number of days in an incomplete month (None when complete), kept in the output
+        """
+        raise NotImplementedError
+
+
+class MonthlyAggregateSink(_MonthlySink):
+    """
+    Per year monthly mean wind speed, wind run (monthly total km) and mean wind direction,
+    the products of gen_means.py, from running sums - nothing is concatenated
+    The direction mean is the vector mean of unit vectors (350 and 10 average to 0, not 180)
+    """
+    def __init__(self, save_dir="./climatology", profile="float32", write_incomplete=False):
+        super().__init__(write_incomplete)
+        self.save_dir = save_dir
+        self.profile = profile
+
+    def new_month(self, key):
+        shape = self.template.shape
+        return {"ws_sum": np.zeros(shape), "ws_n": np.zeros(shape, dtype=np.int64),
+                "sin_sum": np.zeros(shape), "cos_sum": np.zeros(shape)}
+
+    def add_month(self, acc, times, ws, wd):
+        ws = unpack(ws)
+        valid = ~np.isnan(ws)
+        acc["ws_sum"] += np.where(valid, ws, 0).sum(axis=0)
+        acc["ws_n"] += valid.sum(axis=0)
+
+        rad = np.deg2rad(unpack(wd))
+        acc["sin_sum"] += np.nansum(np.sin(rad), axis=0)
+        acc["cos_sum"] += np.nansum(np.cos(rad), axis=0)
+
+    def write_month(self, key, acc, days=None):
+        year, mm = key
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_ws = acc["ws_sum"] / acc["ws_n"]
+        # can do this because of hourly data (km/h is just kms each hour, then sum)
+        mean_wr = acc["ws_sum"]
+        mean_wd = np.rad2deg(np.arctan2(acc["sin_sum"], acc["cos_sum"])) % 360
+
+        for name, values in [("wind_speed", mean_ws), ("wind_run", mean_wr), ("wind_direction", mean_wd)]:
+            da = self.template.copy(data=values.astype(np.float32)).rename(name)
+            if days is not None:
+                da.attrs.update({"days": days, "days_in_month": calendar.monthrange(year, mm)[1]})
+            write_dataset(da, f"{self.save_dir}/{name}_monthly_{year}-{mm:02d}.h5", self.profile)
+        print(f"Saved monthly means for {year}-{mm:02d}")
+
+
+class StationSeriesSink(_MonthlySink):
+    """
+    Hourly wind speed/direction at the grid cell nearest each station, written per year and month
+    to two .csv files with stations as columns and times as rows (wind_roses.py)
+    """
+    def __init__(self, station_ids, lats, lons, save_dir="./climatology", write_incomplete=False):
+        super().__init__(write_incomplete)
+        self.station_ids = list(station_ids)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.save_dir = save_dir
+
+    def start(self, ws_template, wd_template):
+        from grid_index import grid_index
+
+        super().start(ws_template, wd_template)
+        if hasattr(self, "ii"):
+            return
+        # saved grid kd-tree on the unit sphere, the 0-360 vs -180-180 longitudes don't matter
+        index = grid_index(ws_template["lat"].values, ws_template["lon"].values)
+        _, ii, jj = index.query(self.lats, self.lons, k=1)
+        self.ii, self.jj = ii[:, 0], jj[:, 0]
+
+    def new_month(self, key):
+        return {"times": [], "speed": [], "direction": []}
+
+    def add_month(self, acc, times, ws, wd):
+        # one fancy-indexed pick per file for all the stations
+        acc["times"].append(times)
+        acc["speed"].append(unpack(ws[:, self.ii, self.jj]))
+        acc["direction"].append(unpack(wd[:, self.ii, self.jj]))
+
+    def write_month(self, key, acc, days=None):
+        year, mm = key
+        index = pd.DatetimeIndex(np.concatenate(acc["times"]), name="time")
+        # a csv has no attrs, an incomplete month says its day count in the name
+        suffix = "" if days is None else f"_{days}days"
+        for name in ["speed", "direction"]:
+            df = pd.DataFrame(np.concatenate(acc[name]), index=index, columns=self.station_ids).sort_index()
+            df.to_csv(f"{self.save_dir}/{year}_{mm:02d}_station_wind_{name}{suffix}.csv")
+        print(f"Saved station series for {year}-{mm:02d}")
+
+
+#%%
+def run_ingest(paths, sinks, ws_name=None, wd_name=None, workers=None, finish=True):
+    """
+    Input: paths - raw YYYYMMDD12.nc files, handed to the sinks in this order
+           sinks - list of Sink objects
+           workers - decode on this many processes (None/1 = serial, same output)
+           finish - call finish() on the sinks at the end, False for sinks that
+                    keep collecting over several runs (e.g. main.py, one run per day)
+    Output: nil, the sinks write their own products
+    """
+    if ws_name is None or wd_name is None:
+        ws_name, wd_name = casr_var_names()
+
+    nt, ws_template, wd_template = read_templates(paths[0], ws_name, wd_name)
+    for sink in sinks:
+        sink.start(ws_template, wd_template)
+
+    if workers is not None and workers > 1:
+        # decode in worker processes, each writes its file straight into shared memory
+        # every file has the same number of hours on the same grid
+        shape = (nt * len(paths),) + ws_template.shape
+        ws_shm, ws_all = create_shared(shape, np.int16, fill=FILL_VALUE)
+        wd_shm, wd_all = create_shared(shape, np.int16, fill=FILL_VALUE)
+        try:
+            pool = _get_pool(workers)
+            futures = [pool.submit(_decode_into_shared, path, ws_name, wd_name, ii * nt,
+                                   (ws_shm.name, wd_shm.name), shape, nt) for ii, path in enumerate(paths)]
+            times = [None] * len(paths)
+            for future in as_completed(futures):
+                pos, file_times = future.result()
+                times[pos // nt] = file_times
+            print(f"Decoded {len(paths)} files on {workers} processes")
+
+            for ii, path in enumerate(paths):
+                for sink in sinks:
+                    sink.add(file_date(path), times[ii], ws_all[ii * nt:(ii + 1) * nt],
+                             wd_all[ii * nt:(ii + 1) * nt])
+        finally:
+            # drop the views before freeing the shared blocks
+            del ws_all, wd_all
+            release_shared(ws_shm)
+            release_shared(wd_shm)
+    else:
+        for path in paths:
+            print(f"Current file: {os.path.basename(path)}")
+            ws_packed, wd_packed, file_times = decode_raw_file(path, ws_name, wd_name, nt)
+            for sink in sinks:
+                sink.add(file_date(path), file_times, ws_packed, wd_packed)
+
+    if finish:
+        for sink in sinks:
+            sink.finish()
@@ -1,74 +1,88 @@
 """
 
     Main data processing automation script:
-    Call the download script, then process, 
+    Call the download script, then process,
     Then clean the temp directory once each iteration is done
 
+    Downloading and processing overlap: the next day's files download
+    while the current day is being extracted (see pipeline.py)
+
 """
 #%%
 import os
 import numpy as np
 
 from gen_hrly_winds import gen_hrly_files
-from get_daily_CaSR import download_data, run_parallel
-from utils import get_date_from_years, get_days_in_month
+from ingest import MonthlyAggregateSink
+from pipeline import run_pipeline
+from utils import NORMAL_PERIOD, get_date_from_years, get_days_in_month, period_label, period_years
 
 link = "https://hpfx.collab.science.gc.ca/~scar700/rcas-casr/data/CaSRv3.1/netcdf/"
-# Set date range
-
-yearS = 1989
-yearE = 2019
-months = np.arange(12, 12+1)  # exclude december since it will need a slightly diffrent start year
+# Set the normal period, december is downloaded a year earlier (see utils.period_years)
+period = NORMAL_PERIOD
+months = np.arange(12, 12+1)
 save_dir = "./climatology/daily/"
 
 # Path to temp folder
 temp_dir = './temp/'
-for month in months:
-    days = get_days_in_month(2019, int(month)) # just didnt want a leap year
-    for day in days:
-        dates = get_date_from_years(yearS, yearE, int(month), int(day))
-
-        # get the date info from the file name
-        if int(month) < 12:
-            sfilename = f"1990-2020_hrly_windspeed_m{month:02d}_d{day:02d}.h5"
-            dfilename = f"1990-2020_hrly_winddir_m{month:02d}_d{day:02d}.h5"
-        else: 
-            # december is actualy an 1989-2019 climatology
-            sfilename = f"1989-2019_hrly_windspeed_m{month:02d}_d{day:02d}.h5"
-            dfilename = f"1989-2019_hrly_winddir_m{month:02d}_d{day:02d}.h5"
-
-        if os.path.exists(os.path.join(save_dir, sfilename)) and os.path.exists(os.path.join(save_dir, dfilename)):
-            print(f"{sfilename} and {dfilename} already exists. Skipping...")
-
-        else:
-            print(f"Beginning to process for {month}, {day}...")
-            run_parallel(dates, link)
-
-            print("Now processing netcdf files to extract winds...")
-            gen_hrly_files(month, day)
-
-        # Clean .nc files from temp folder
-        print("Cleaning temp directory...")
-        for fname in os.listdir(temp_dir):
-            if fname.endswith('.nc'):
-                # Attempt to remove the .nc file. On Windows this can fail with
-                # PermissionError if another process still has the file open
-                # (common with netCDF/h5 files if a dataset wasn't closed).
-                file_path = os.path.join(temp_dir, fname)
-                try:
-                    os.remove(file_path)  # unlink
-                except PermissionError as e:
-                    # Informative message and skip – the file is in use.
-                    print(f"Could not remove '{file_path}' (in use): {e}. Skipping.")
-                except FileNotFoundError:
-                    # Already removed by another thread/process; ignore
-                    pass
-                except Exception as e:
-                    # Unexpected error – report and continue
-                    print(f"Error removing '{file_path}': {e}")
-        print(f"Cleaned (or tried) .nc files from {temp_dir}")
-
-    print(f"All dates in {month:02d} are processed.")
-
-print("All dates processed.")
+
+# limit on the raw files sitting in temp (each is ~1 GB), None for no limit
+# two days worth lets one day download while the other is extracted
+max_temp_files = 2 * (period[1] - period[0] + 1)
+max_temp_bytes = None
+
+# encoding of the daily files, see writer.PROFILES (packed int16, no compression)
+daily_profile = "int16"
+
+# processes used to decode the raw files of a day (None = serial)
+decode_workers = 8
+
+# other products made from the same read of the raw files (see ingest.py)
+# e.g. the per year monthly means of gen_means.py. Only days that still need a daily
+# file are downloaded, so these are only made when no day of the months is skipped
+extra_sinks = [MonthlyAggregateSink(save_dir="./climatology")]
+
+#%%
+def process_day(key, files):
+    month, day = key
+    print(f"Now processing netcdf files to extract winds for {month}, {day}...")
+    gen_hrly_files(month, day, files=files, workers=decode_workers, sinks=extra_sinks, period=period,
+                   profile=daily_profile)
+
+
+# guarded since the decode workers are spawned and re-import this script
+if __name__ == "__main__":
+    jobs = []
+    skipped = 0
+    for month in months:
+        days = get_days_in_month(2019, int(month)) # just didnt want a leap year
+        for day in days:
+            dates = get_date_from_years(*period_years(period, month), int(month), int(day))
+
+            # get the date info from the file name (december is actualy a year earlier)
+            label = period_label(period, month)
+            sfilename = f"{label}_hrly_windspeed_m{month:02d}_d{day:02d}.h5"
+            dfilename = f"{label}_hrly_winddir_m{month:02d}_d{day:02d}.h5"
+
+            if os.path.exists(os.path.join(save_dir, sfilename)) and os.path.exists(os.path.join(save_dir, dfilename)):
+                print(f"{sfilename} and {dfilename} already exists. Skipping...")
+                skipped += 1
+            else:
+                jobs.append(((int(month), int(day)), dates))
+
+    if skipped and extra_sinks:
+        # the sinks would only see some days of the months, their files stay as they are
+        print(f"{skipped} days already have daily files, not making the extra products this run")
+        extra_sinks = []
+
+    failed = run_pipeline(jobs, link, process_day, temp_dir=temp_dir,
+                          max_files=max_temp_files, max_bytes=max_temp_bytes)
+
+    for sink in extra_sinks:
+        sink.finish()
+
+    if failed:
+        print(f"{len(failed)} days still to do, run again to retry them.")
+    else:
+        print("All dates processed.")
 # %%
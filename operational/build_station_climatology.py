@@ -0,0 +1,240 @@
+"""
+
+    Station climatology tables, built once offline
+    The 1990-2020 hourly series at every station (IDW of its 4 nearest grid cells) are pulled
+    out of the store/daily cubes in batches of stations, and for each station and calendar day
+    the hours within +-half_window days over all the years go into histograms (like
+    doy_climatology.py, the window slides a day at a time). Per station it keeps:
+
+    mean, p10, p25, ...             - (dayofyear, hour) wind speed tables
+    daily_mean, daily_p10, ...      - (dayofyear) over all the hours of the window
+    speed_counts                    - (dayofyear, speed_bin) 1 km/h histogram of the window
+    sector_counts                   - (dayofyear, sector) 16 compass sector counts of the window
+
+    in one netcdf with a chunk per station, so a comparison is a lookup not a recompute:
+
+    with StationClimatology() as clim:
+        bands = clim.lookup(wmo, "2025-06-01", "2025-06-30")   # same columns as spd_interp_df
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# repo root modules, run from operational/
+sys.path.append(os.path.abspath(".."))
+from etl_station_data import (casr_grid_index, day_runs, get_casr_batch, idw_interp, msc_stations, store_dir,
+                              daily_dir)
+from circular_stats import SECTORS, sector_index
+from doy_climatology import DOY_PERCENTILES, _doy_stats, sliding_window
+from tiled_stats import HIST_BINS, hour_index
+from utils import NORMAL_PERIOD, period_label
+from wind_hist import FILL_VALUE, SCALE_FACTOR, HistogramAccumulator
+from writer import dataset_encoding
+
+STATION_DIR = "../climatology/stations/"
+HIST_STEP = 1  # km/h per speed_counts bin
+HIST_MAX = 150  # km/h, the last bin takes everything above
+
+
+def station_clim_path(period=NORMAL_PERIOD, station_dir=STATION_DIR):
+    # e.g. climatology/stations/1990-2020_station_windspeed_doy_hour.nc
+    return os.path.join(station_dir, f"{period_label(period)}_station_windspeed_doy_hour.nc")
+
+
+def _station_batch(stn_df, half_window, percentiles, k, period, store_dir, data_dir, index):
+    """
+    Tables of one batch of stations
+    Output: dict of name -> array (station first), the day labels and the first hour of the days
+    """
+    # a no leap year gives every daily cube once
+    casr = get_casr_batch("2021-01-01", "2021-12-31", stn_df['wmo'].values, stn_df['lat'].values,
+                          stn_df['lon'].values, k=k, store_dir=store_dir, data_dir=data_dir, period=period,
+                          index=index)
+    interp = idw_interp(casr)
+    del casr
+    labels, starts, counts = day_runs(interp["day"].values)
+    times = interp["time"].values
+    speed = interp["speed"].values
+    direction = interp["direction"].values
+    packed = np.where(np.isnan(speed), FILL_VALUE, np.round(speed / SCALE_FACTOR)).astype(np.int16)
+    sectors = np.where(np.isnan(direction), -1, sector_index(np.nan_to_num(direction)))
+    nst, ndays = len(stn_df), len(labels)
+
+    def day(i):
+        # the day's hours by hour of day (columns 0-23) and all together (column 24)
+        s, n = starts[i % ndays], counts[i % ndays]
+        vals = packed[:, s:s + n]
+        idx = hour_index(times[s:s + n])
+        cube = np.full((n, nst, 25), FILL_VALUE, dtype=np.int16)
+        cube[:len(idx), :, :24] = np.where(idx >= 0, vals[:, idx], FILL_VALUE).transpose(1, 0, 2)
+        cube[:, :, 24] = vals.T
+        acc = HistogramAccumulator((nst, 25), nbins=HIST_BINS, dtype=np.uint16)
+        acc.add(cube)
+        return acc
+
+    # speed_counts bins: packed value -> 1 km/h bin, the top one open ended
+    step = round(HIST_STEP / SCALE_FACTOR)
+    nhist = HIST_MAX // HIST_STEP
+    window_hours = (2 * half_window + 1) * counts.max()
+    count_dtype = np.uint16 if window_hours <= np.iinfo(np.uint16).max else np.uint32
+
+    names = ["mean"] + [f"p{p:d}" for p in percentiles]
+    out = {name: np.empty((nst, ndays, 24), dtype=np.float32) for name in names}
+    out.update({f"daily_{name}": np.empty((nst, ndays), dtype=np.float32) for name in names})
+    out["speed_counts"] = np.empty((nst, ndays, nhist), dtype=count_dtype)
+
+    acc = HistogramAccumulator((nst, 25), nbins=HIST_BINS)
+    for i, acc in sliding_window(day, ndays, half_window, acc):
+        for name, arr in _doy_stats(acc, percentiles).items():
+            out[name][:, i] = arr[:, :24]
+            out[f"daily_{name}"][:, i] = arr[:, 24]
+        window = acc.counts.reshape(nst, 25, -1)[:, 24, :acc.nbins].astype(np.int64)
+        to_bin = np.minimum(np.arange(acc.nbins) // step, nhist - 1)
+        out["speed_counts"][:, i] = window @ (to_bin[:, None] == np.arange(nhist))
+
+    # sector counts per day, then the same +-half_window (wrapping) sum
+    day_sectors = np.stack([(sectors[:, s:s + n, None] == np.arange(len(SECTORS))).sum(axis=1)
+                            for s, n in zip(starts, counts)], axis=1)
+    out["sector_counts"] = sum(np.roll(day_sectors, -o, axis=1)
+                               for o in range(-half_window, half_window + 1)).astype(count_dtype)
+    start_hour = int(times[0].astype("datetime64[h]").astype(np.int64) % 24)
+    return out, labels, start_hour
+
+
+def build_station_climatology(stn_df, output_file, half_window=15, percentiles=DOY_PERCENTILES, k=4,
+                              memory_mb=4000, period=NORMAL_PERIOD, store_dir=store_dir, data_dir=daily_dir):
+    """
+    Input: stations (DataFrame of wmo, name, lat, lon, e.g. msc_stations(agencies=None)), output netcdf
+           half_window - days either side of each day in its window
+           k - neighbours in the IDW
+           memory_mb - ceiling for a batch of stations (their hourly series and histogram ring)
+    Output: number of stations written
+    """
+    stn_df = stn_df.dropna(subset=['wmo']).drop_duplicates(subset=['wmo']).reset_index(drop=True)
+    stn_df['wmo'] = stn_df['wmo'].astype(np.int64)
+
+    # per station: the neighbour series and the IDW temporaries, the ring of day histograms
+    nt = (period[1] - period[0] + 1) * 365 * 24
+    per_station = nt * k * 50 + (3 * half_window + 2) * 25 * (HIST_BINS + 1) * 2
+    batch = max(memory_mb * 2**20 // per_station, 1)
+    print(f"{len(stn_df)} stations, {batch} per batch")
+
+    # the grid index once for all the batches
+    index = casr_grid_index(store_dir, data_dir, period)
+    parts = []
+    start_time = time.time()
+    for b0 in range(0, len(stn_df), batch):
+        part = stn_df.iloc[b0:b0 + batch]
+        out, labels, start_hour = _station_batch(part, half_window, percentiles, k, period, store_dir, data_dir,
+                                                 index)
+        parts.append(out)
+        print(f"stations {b0}-{b0 + len(part)} of {len(stn_df)} done ({time.time() - start_time:.1f} s)")
+
+    data = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+    dims = {3: ("station", "dayofyear", "hour"), 2: ("station", "dayofyear")}
+    data_vars = {name: (dims[arr.ndim], arr) for name, arr in data.items()}
+    data_vars["speed_counts"] = (("station", "dayofyear", "speed_bin"), data["speed_counts"])
+    data_vars["sector_counts"] = (("station", "dayofyear", "sector"), data["sector_counts"])
+    coords = {
+        "station": stn_df['wmo'].values, "name": ("station", stn_df['name'].values.astype(str)),
+        "lat": ("station", stn_df['lat'].values), "lon": ("station", stn_df['lon'].values),
+        "dayofyear": np.arange(1, len(labels) + 1), "date": ("dayofyear", labels.astype(str)),
+        "hour": np.arange(24), "speed_bin": np.arange(0, HIST_MAX, HIST_STEP), "sector": SECTORS,
+    }
+    attrs = {"period": period_label(period), "half_window": half_window, "neighbours": k,
+             "start_hour": start_hour}
+    ds = xr.Dataset(data_vars, coords=coords, attrs=attrs)
+
+    # one station per chunk, a lookup reads one chunk of each table
+    encoding = dataset_encoding(ds, "int16_zlib1", pack=[n for n in ds.data_vars if not n.endswith("counts")])
+    for name, da in ds.data_vars.items():
+        encoding[name]["chunksizes"] = (1,) + da.shape[1:]
+        if name.endswith("counts"):
+            encoding[name]["dtype"] = da.dtype
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    ds.to_netcdf(output_file, encoding=encoding)
+    return len(stn_df)
+
+
+#%%
+class StationClimatology:
+    """
+    Percentile lookups by WMO id in the tables build_station_climatology() writes
+    """
+    def __init__(self, path=None, period=NORMAL_PERIOD):
+        self.path = path or station_clim_path(period)
+        self.ds = xr.open_dataset(self.path)
+        self.stations = {int(wmo): k for k, wmo in enumerate(self.ds["station"].values)}
+        self.days = {label: k for k, label in enumerate(self.ds["date"].values)}
+        self.start_hour = int(self.ds.attrs["start_hour"])
+        self.percentiles = [name for name in self.ds.data_vars if name[0] == "p" and name[1:].isdigit()]
+
+    def __contains__(self, wmo):
+        return int(wmo) in self.stations
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.ds.close()
+
+    def lookup(self, wmo, start, end, hourly=False):
+        """
+        Percentile bands of a station over a date range (any year)
+        Input: WMO id, start, end - YYYY-MM-DD strings or dates
+               hourly - one row per hour from the (dayofyear, hour) tables, else one per day
+        Output: DataFrame of date (first hour of each daily cube, or each hour) and pXX,
+                the columns of spd_interp_df in wind_comparison.ipynb
+        """
+        if wmo not in self:
+            raise KeyError(f"Station {wmo} is not in {self.path}")
+        k = self.stations[int(wmo)]
+        dates = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+        # no feb 29 cube, it takes feb 28
+        labels = [d.strftime("%m-%d").replace("02-29", "02-28") for d in dates]
+        missing = sorted(set(labels) - set(self.days))
+        if missing:
+            raise KeyError(f"No {missing} in {self.path}")
+        days = [self.days[label] for label in labels]
+
+        # a daily cube's hours start at start_hour (13Z) and run into the next day
+        if hourly:
+            offsets = self.start_hour + np.arange(24)
+            stamps = (dates.values[:, None] + offsets.astype("timedelta64[h]")).ravel()
+            out = {"date": stamps}
+            for name in self.percentiles:
+                table = self.ds[name][k].values
+                out[name] = table[days][:, offsets % 24].ravel()
+        else:
+            out = {"date": dates.values + np.timedelta64(self.start_hour, "h")}
+            for name in self.percentiles:
+                out[name] = self.ds[f"daily_{name}"][k].values[days]
+        df = pd.DataFrame(out)
+        df["date"] = df["date"].dt.strftime('%Y-%m-%dT%H:%M:%S')
+        return df
+
+
+#%%
+if __name__ == "__main__":
+    period = NORMAL_PERIOD
+    output_file = station_clim_path(period)
+    half_window = 15  # days either side
+
+    # every station in allstn2025.csv with a wmo id
+    stn_df = msc_stations(agencies=None)
+    n = build_station_climatology(stn_df, output_file, half_window=half_window, memory_mb=4000,
+                                  period=period)
+    print(f"Saved {n} station tables to {output_file}")
+# %%
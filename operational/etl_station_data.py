@@ -18,9 +18,20 @@ import csv
 import sshtunnel
 import calendar
 import os
+import sys
+import atexit
+
+from psycopg2 import pool as pg_pool
 
 from datetime import datetime, timedelta
 
+# repo root modules (grid_index.py, climatology_store.py), run from operational/
+sys.path.append(os.path.abspath(".."))
+from grid_index import EARTH_RADIUS_KM, grid_index
+
+# the saved grid kd-trees sit beside the data
+index_dir = "../climatology/grid_index/"
+
 def last_day_of_month(year, month):
     return calendar.monthrange(year, month)[1]
 
@@ -67,67 +78,151 @@ def set_areal_query(mstart, mend, year, bbox):
 
 
 #%%
-def db_query(query, csv_output='query_output.csv'):
+class DBSession:
     """
-    Call the database to get wind data
-    Inut: cursor object (defined below)
-          start and end [dates YYYY-MM-DD - string]
-    Output: pandas dataframe
-    """
-    # open the .keys json file
-    with open('../utils/.keys.json', 'r') as f:
-        keys = json.load(f)
-
-    # dagan info
-    hostname = keys["dagan"]["full_name"]
-    user = keys["dagan"]["user"]
-    pw = keys["dagan"]["pw"]
-
-    # database info
-    d_hostname = keys["database"]["hostname"]
-    d_username = keys["database"]["user"]
-    db_name = keys["database"]["name"]
-    d_pw = keys["database"]["pw"]
-
-    portnum = 22  # just lookedup in my putty session
-
-    # connect to remote database
-    with sshtunnel.open_tunnel(
-        (hostname, portnum),
-        ssh_username=user,
-        ssh_password=pw,
-        remote_bind_address=(d_hostname, 5432)
-    ) as tunnel:
-        try:
-            print("SSH tunnel established")
-            print(f"{d_hostname, tunnel.local_bind_port}")
-            print(f"Connecting to database {db_name} as user {d_username}")
-            conn = psycopg2.connect(
-                host=d_hostname,
-                port=5432,
-                database=db_name,
-                user=d_username,
-                password=d_pw
-            )  
-
-            cur = conn.cursor()
-            # start by setting the search path
-            cur.execute("set search_path to bt;")
-            cur.execute(query)
-            rows = cur.fetchall()  
-
-            colnames = [desc[0] for desc in cur.description]
+    One ssh tunnel and a pool of database connections kept open over many queries
+
+    with DBSession() as db:
+        for query in queries:
+            obs = db.query(query)
+
+    The tunnel and connections are opened again when the tunnel drops or a connection is
+    lost. use_tunnel=False connects straight to the database, with database= overriding
+    the .keys.json entry (e.g. a local postgres to test against)
+    """
+    def __init__(self, keys_file='../utils/.keys.json', use_tunnel=True, database=None, minconn=1,
+                 maxconn=4, search_path="bt", retries=2):
+        self.keys_file = keys_file
+        self.use_tunnel = use_tunnel
+        self.database = database
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.search_path = search_path
+        self.retries = retries
+        self.tunnel = None
+        self.pool = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _keys(self):
+        keys = {}
+        if self.use_tunnel or self.database is None:
+            with open(self.keys_file, 'r') as f:
+                keys = json.load(f)
+        db = dict(keys.get("database", {}))
+        db.update(self.database or {})
+        return keys, db
+
+    def open(self):
+        keys, db = self._keys()
+        host, port = db["hostname"], int(db.get("port", 5432))
+        if self.use_tunnel:
+            # dagan, port 22 (just lookedup in my putty session)
+            self.tunnel = sshtunnel.SSHTunnelForwarder(
+                (keys["dagan"]["full_name"], 22),
+                ssh_username=keys["dagan"]["user"],
+                ssh_password=keys["dagan"]["pw"],
+                remote_bind_address=(host, port)
+            )
+            self.tunnel.start()
+            # the database is reached through the local end of the tunnel
+            host, port = "127.0.0.1", self.tunnel.local_bind_port
+            print(f"SSH tunnel established on port {port}")
+
+        print(f"Connecting to database {db['name']} as user {db['user']}")
+        options = f"-c search_path={self.search_path}" if self.search_path else None
+        self.pool = pg_pool.ThreadedConnectionPool(self.minconn, self.maxconn, host=host, port=port,
+                                                   database=db["name"], user=db["user"],
+                                                   password=db["pw"], options=options)
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+        if self.tunnel is not None:
+            self.tunnel.stop()
+            self.tunnel = None
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def _check(self):
+        if self.pool is None:
+            self.open()
+        elif self.tunnel is not None and not self.tunnel.is_active:
+            print("SSH tunnel dropped, reconnecting...")
+            self.reconnect()
+
+    def query(self, query, params=None, csv_output=None):
+        """
+        Input: SQL query string (and its params), optional .csv to save the rows to
+        Output: pandas dataframe of the rows
+        """
+        for attempt in range(self.retries + 1):
+            self._check()
+            conn = self.pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    rows = cur.fetchall() if cur.description else []
+                    colnames = [desc[0] for desc in cur.description or []]
+                conn.commit()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # connection (or the tunnel under it) is gone, start over
+                self.pool.putconn(conn, close=True)
+                if attempt == self.retries:
+                    raise
+                print(f"Lost the database connection ({e}), reconnecting...")
+                self.reconnect()
+                continue
+            except Exception:
+                conn.rollback()
+                self.pool.putconn(conn)
+                raise
+            self.pool.putconn(conn)
+            break
+
+        if csv_output is not None:
             with open(csv_output, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 writer.writerow(colnames)
                 writer.writerows(rows)
-            cur.close()
-            conn.close()
-
             print(f"Query results saved to {csv_output}")
+        return pd.DataFrame(rows, columns=colnames)
+
+
+# the session db_query uses, opened on the first query and kept for the rest of the run
+_session = None
+
+
+def get_session(**kwargs):
+    """
+    The shared DBSession (kwargs as DBSession, only used when it is first opened)
+    """
+    global _session
+    if _session is None:
+        _session = DBSession(**kwargs).open()
+        atexit.register(_session.close)
+    return _session
+
 
-        except Exception as e:
-            print("Error:", e) 
+def db_query(query, csv_output='query_output.csv', session=None):
+    """
+    Call the database to get wind data
+    Input: SQL query string (set_query/set_areal_query), .csv to save the rows to
+           session - DBSession to use, the shared one by default
+    Output: pandas dataframe (None if the query failed)
+    """
+    try:
+        return (session or get_session()).query(query, csv_output=csv_output)
+    except Exception as e:
+        print("Error:", e)
 
 
 #%%
@@ -182,10 +277,12 @@ def pct_from_vals(vals):
     return {f'p{q}': float(v) for q,v in zip(qs, pv)}
 
 
-def nearest_points(lat_coord, lon_coord, target_lat, target_lon, k=4):
+def nearest_points(lat_coord, lon_coord, target_lat, target_lon, k=4, index=None):
     """
     Find k nearest grid points to (target_lat, target_lon).
-    Returns list of dicts with lat/lon, flat_index, ij, distance_deg.
+    The grid's kd-tree (grid_index.py) is built once and loaded after, distances are great circle.
+    index - the grid's GridIndex (e.g. casr_grid_index()) for many calls, skips hashing the grid each time
+    Returns list of dicts with lat/lon, flat_index, ij, distance_km, distance_deg (nearest first).
     """
     def to_numpy(a):
         try:
@@ -202,149 +299,329 @@ def nearest_points(lat_coord, lon_coord, target_lat, target_lon, k=4):
     if lat.ndim == 1 and lon.ndim == 1:
         lon2d, lat2d = np.meshgrid(lon, lat)
     elif lat.ndim == 2 and lon.ndim == 2:
-        lat2d = lat
-        lon2d = lon-360  # sits in a 0-360 format want -180-180
+        lat2d, lon2d = lat, lon
     else:
         raise ValueError("lat/lon must be both 1D or both 2D arrays")
 
-    points = np.column_stack((lat2d.ravel(), lon2d.ravel()))
-    try:
-        from scipy.spatial import cKDTree
-        tree = cKDTree(points)
-        dists, idxs = tree.query((target_lat, target_lon), k=k)
-        if k == 1:
-            dists = np.atleast_1d(dists); idxs = np.atleast_1d(idxs)
-    except Exception:
-        diffs = points - np.asarray([target_lat, target_lon])
-        d2 = (diffs**2).sum(axis=1)
-        idxs = np.argpartition(d2, range(k))[:k]
-        idxs = idxs[np.argsort(d2[idxs])]
-        dists = np.sqrt(d2[idxs])
-
-    nlat, nlon = lat2d.shape
+    if index is None:
+        index = grid_index(lat2d, lon2d, index_dir)
+    dists, ii, jj = index.query([target_lat], [target_lon], k=k)
+
+    nlon = lat2d.shape[1]
     out = []
-    for idx, dist in zip(idxs, dists):
-        i, j = divmod(int(idx), nlon)
+    for dist, i, j in zip(dists[0], ii[0], jj[0]):
         out.append({
             "lat": float(lat2d[i, j]),
-            "lon": float(lon2d[i, j]),
-            "flat_index": int(idx),
+            "lon": float((lon2d[i, j] + 180) % 360 - 180),  # sits in a 0-360 format want -180-180
+            "flat_index": int(i * nlon + j),
             "ij": (int(i), int(j)),
-            "distance_deg": float(dist)
+            "distance_km": float(dist),
+            "distance_deg": float(np.rad2deg(dist / EARTH_RADIUS_KM))
         })
-    out = sorted(out, key=lambda x: x["distance_deg"])
     return out
 
 
 # %%
 from etl_station_data import mm_dd_pairs, pct_from_vals
 import numpy as np
-import pandas as _pd
 from scipy.interpolate import griddata
-from pathlib import Path
 import xarray as xr
 
-def get_casr_data(start, end, lat, lon):
+# the consolidated point/map store (climatology_store.py in the repo root)
+from circular_stats import _bearing
+from climatology_store import ClimatologyStore
+from doy_climatology import daily_files
+from utils import NORMAL_PERIOD
+from wind_stats import stats_arrays
+
+store_dir = "../climatology/store/"
+daily_dir = "../climatology/daily/"
+
+
+def open_stores(store_dir=store_dir, period=NORMAL_PERIOD):
     """
-    Input: lat, lon - floats
-           start, end - strings YYYY-MM-DD
-    Output: list of neighbour dicts each containing timeseries ('times','values') across the date range.
+    Speed and direction stores, None if either hasn't been built (build_store)
     """
-    
-    dates = mm_dd_pairs(start, end, date_format='%Y-%m-%d', as_int=False)
+    try:
+        spd_store = ClimatologyStore("windspeed", period, store_dir)
+    except FileNotFoundError as e:
+        print(e)
+        return None
+    try:
+        dir_store = ClimatologyStore("winddir", period, store_dir)
+    except FileNotFoundError as e:
+        print(e)
+        spd_store.close()
+        return None
+    return spd_store, dir_store
+
+
+def casr_grid_index(store_dir=store_dir, data_dir=daily_dir, period=NORMAL_PERIOD):
+    """
+    GridIndex of the store's grid (the daily files' without a store), get it once and pass
+    it as index= to nearest_points/get_casr_batch when calling them many times
+    """
+    stores = open_stores(store_dir, period)
+    if stores is not None:
+        with stores[0], stores[1]:
+            lat2d, lon2d = np.asarray(stores[0].lat), np.asarray(stores[0].lon)
+    else:
+        files = daily_files(data_dir, "windspeed", period)
+        if not files:
+            raise FileNotFoundError(f"No store in {store_dir} and no daily files in {data_dir}")
+        with xr.open_dataset(files[0][1]) as ds:
+            lat2d, lon2d = ds["lat"].values, ds["lon"].values
+    return grid_index(lat2d, lon2d, index_dir)
+
+
+#%%
+# every station of a list in one job: all neighbours resolved at once, each grid cell read once
+
+def msc_stations(stn_file="../utils/allstn2025.csv", agencies=('MSC', 'ParksC')):
+    """
+    MSC and Parks Canada stations from the station master (the list wind_roses.py uses)
+    agencies - None for every station in the file
+    Output: DataFrame of wmo, name, lat, lon
+    """
+    stations = pd.read_csv(stn_file)
+    stations['name'] = stations['name'].astype(str).str.strip()
+    stations['lat'] = pd.to_numeric(stations['lat'], errors='coerce')
+    stations['lon'] = pd.to_numeric(stations['lon'], errors='coerce')
+    stn_df = stations
+    if agencies is not None:
+        # the agency names are space padded in the file ('MSC   ')
+        stn_df = stations[stations['agency'].astype(str).str.strip().isin(agencies)]
+    stn_df = stn_df.dropna(subset=['lat', 'lon'])
+    return stn_df[['wmo', 'name', 'lat', 'lon']].reset_index(drop=True)
+
+
+def cells_from_daily(path, var_name, ii, jj):
+    """
+    Hourly series of grid cells from one daily file, one read per grid row that has cells
+    Output: times, (time, cell) float32 array (NaN where missing)
+    """
+    ii = np.asarray(ii)
+    jj = np.asarray(jj)
+    with xr.open_dataset(path) as ds:
+        da = ds[var_name]
+        out = np.empty((da.sizes[da.dims[0]], len(ii)), dtype=np.float32)
+        for i in np.unique(ii):
+            ks = np.flatnonzero(ii == i)
+            cols, inverse = np.unique(jj[ks], return_inverse=True)
+            out[:, ks] = da.isel({da.dims[1]: int(i), da.dims[2]: cols}).values[:, inverse]
+        return ds["time"].values, out
+
+
+def get_casr_batch(start, end, station_ids, lats, lons, k=4, store_dir=store_dir, data_dir=daily_dir,
+                   period=NORMAL_PERIOD, index=None):
+    """
+    Hourly CaSR wind at the k nearest grid cells of many stations at once
+    Input: start, end - strings YYYY-MM-DD
+           station_ids, lats, lons - one per station (e.g. the columns of msc_stations())
+           index - the grid's GridIndex (casr_grid_index()) when called batch after batch
+    Output: xr.Dataset of speed, direction (station, neighbour, time) with the lat/lon, ij and
+            distance of each neighbour and the calendar day (MM-DD) of each time
+    """
+    days = [f"{mon}-{day}" for mon, day in mm_dd_pairs(start, end, date_format='%Y-%m-%d')]
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+
     with open("../utils/variables.json", 'r') as f:
         casr_vars = json.load(f)
-    data_dir = Path("../climatology/daily").resolve(strict=False)
-    all_files = os.listdir(str(data_dir))
-    speed_files = [file for file in all_files if "windspeed" in file]
-    direc_files = [file for file in all_files if "winddir" in file]
-
-    # create a dataframe to store this output in
-    results = pd.DataFrame(columns=["idx", "lat", "lon", "ij", "distance", "t0", "dates", "speed", "direction"])
-
-    # We'll accumulate time/value lists per neighbor using flat_index as key
-    neighbor_series = {}
-    neighbor_order = []  # to preserve ordering from first file
-    for ii in range(len(dates)):
-        mon, day = dates[ii]
-        mon_str = f"_m{mon}"
-        day_str = f"_d{day}"
-
-        spd_file = [file for file in speed_files if mon_str in file and day_str in file]
-        dir_file = [file for file in direc_files if mon_str in file and day_str in file]
-
-        if not spd_file or not dir_file:
-            print(f"Missing files for {mon_str}{day_str}")
+    spd_var = casr_vars["CaSR_Variables"]["wind_speed"]
+    dir_var = casr_vars["CaSR_Variables"]["wind_direction"]
+
+    # the store when it has been built, the daily files otherwise
+    stores = open_stores(store_dir, period)
+    if stores is not None:
+        lat2d, lon2d = np.asarray(stores[0].lat), np.asarray(stores[0].lon)
+    else:
+        spd_files = dict(daily_files(data_dir, "windspeed", period))
+        dir_files = dict(daily_files(data_dir, "winddir", period))
+        if not spd_files:
+            raise FileNotFoundError(f"No store in {store_dir} and no daily files in {data_dir}")
+        with xr.open_dataset(next(iter(spd_files.values()))) as ds:
+            lat2d, lon2d = ds["lat"].values, ds["lon"].values
+
+    # every station's neighbours in one query, stations sharing cells read them once
+    if index is None:
+        index = grid_index(lat2d, lon2d, index_dir)
+    dist, ii, jj = index.query(lats, lons, k=k)
+    flat = np.ravel_multi_index((ii, jj), index.shape)
+    cells, inverse = np.unique(flat.ravel(), return_inverse=True)
+    ci, cj = np.unravel_index(cells, index.shape)
+    print(f"{len(lats)} stations, {len(cells)} grid cells, {len(days)} days")
+
+    if stores is not None:
+        spd_store, dir_store = stores
+        with spd_store, dir_store:
+            ij = list(zip(ci, cj))
+            spd = spd_store.read_points(ij, days=days)
+            direc = dir_store.read_points(ij, days=days)
+        print(f"Read from the {spd.attrs['layout']} copy of the store")
+        times, day_coord = spd["time"].values, spd["day"].values
+        spd_vals, dir_vals = spd.values, direc.values
+    else:
+        times, day_coord, spd_vals, dir_vals = [], [], [], []
+        for label in days:
+            key = (int(label[:2]), int(label[3:]))
+            if key not in spd_files or key not in dir_files:
+                print(f"Missing files for {label}")
+                continue
+            t, s_vals = cells_from_daily(spd_files[key], spd_var, ci, cj)
+            _, d_vals = cells_from_daily(dir_files[key], dir_var, ci, cj)
+            times.append(t)
+            day_coord.append(np.full(len(t), label, dtype=object))
+            spd_vals.append(s_vals)
+            dir_vals.append(d_vals)
+        if not times:
+            raise FileNotFoundError(f"No daily files for {start} to {end} in {data_dir}")
+        times, day_coord = np.concatenate(times), np.concatenate(day_coord)
+        spd_vals, dir_vals = np.concatenate(spd_vals), np.concatenate(dir_vals)
+
+    # (time, cell) -> (station, neighbour, time)
+    shape = (len(times),) + ii.shape
+    speed = spd_vals[:, inverse].reshape(shape).transpose(1, 2, 0)
+    direction = dir_vals[:, inverse].reshape(shape).transpose(1, 2, 0)
+    cell_lat, cell_lon = index.cell_latlon(ii, jj)
+    coords = {
+        "station": np.asarray(station_ids), "neighbour": np.arange(k), "time": times,
+        "day": ("time", day_coord),
+        "station_lat": ("station", lats), "station_lon": ("station", lons),
+        "lat": (("station", "neighbour"), np.asarray(cell_lat)),
+        "lon": (("station", "neighbour"), np.asarray(cell_lon)),
+        "i": (("station", "neighbour"), ii), "j": (("station", "neighbour"), jj),
+        "distance_km": (("station", "neighbour"), dist),
+    }
+    dims = ("station", "neighbour", "time")
+    return xr.Dataset({"speed": (dims, speed, {"units": "km/h"}),
+                       "direction": (dims, direction, {"units": "degrees"})}, coords=coords)
+
+
+def get_casr_data(start, end, lat, lon, k=4, index=None):
+    """
+    Input: lat, lon - floats
+           start, end - strings YYYY-MM-DD
+           index - the grid's GridIndex, see casr_grid_index()
+    Output: xr.Dataset of speed, direction (neighbour, time) at the k nearest grid cells, NaN
+            where missing, with the lat/lon, ij and distance of each neighbour (see get_casr_batch)
+    """
+    return get_casr_batch(start, end, [0], [lat], [lon], k=k, index=index).isel(station=0, drop=True)
+
+
+def casr_to_parquet(casr, path):
+    """
+    Long table of a get_casr_data/get_casr_batch result, one row per (station,) neighbour and
+    time, built column by column from the arrays (needs pyarrow)
+    Output: path
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (conda install pyarrow)")
+
+    dims = casr["speed"].dims
+    columns = {}
+    for name in list(casr.coords) + list(casr.data_vars):
+        da = casr[name]
+        if not da.dims:
             continue
+        values = da.broadcast_like(casr["speed"]).transpose(*dims).values.ravel()
+        columns[name] = values.astype(str) if values.dtype == object else values
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pq.write_table(pa.table(columns), path, compression="zstd")
+    return path
 
-        spd_path = os.path.join(str(data_dir), spd_file[0])
-        dir_path = os.path.join(str(data_dir), dir_file[0])
-        print("Files to open: ", spd_path, dir_path)
-
-        dir_ds = xr.open_dataset(dir_path, chunks={})
-        dir_var = casr_vars["CaSR_Variables"]["wind_direction"]
-        dir_da = dir_ds[dir_var]
-
-        spd_ds = xr.open_dataset(spd_path, chunks={})
-        spd_var = casr_vars["CaSR_Variables"]["wind_speed"]
-        spd_da = spd_ds[spd_var]
-
-        # find neighbours on first file (assume grid is consistent across files)
-        if ii == 0:
-            neighbours = nearest_points(spd_da['lat'], spd_da['lon'], lat, lon, k=4)
-            # initialize neighbor_series entries
-            for n in neighbours:
-                neighbor_series[n['flat_index']] = {
-                    'idx': n['flat_index'], 'lat': n['lat'], 'lon': n['lon'], 'ij': n['ij'], 'distance': n['distance_deg'],
-                    't0': [], 'dates': [], 'speed': [], "direction": []
-                }
-                neighbor_order = [n['flat_index'] for n in neighbours]
-
-        # For each neighbour, extract the timeseries from spd_da at the ij position
-        for flat_idx in neighbor_order:
-            entry = neighbor_series[flat_idx] 
-            i, j = entry['ij']
-            # select by position; handle different dim names 
 
-            try:
-                s_sel = spd_da.isel(lat=int(i), lon=int(j))
-                d_sel = dir_da.isel(lat=int(i), lon=int(j))
+#%%
+# station values from the neighbours and their daily percentiles, whole arrays at a time
 
-            except Exception:
-                try:
-                    s_sel = spd_da.isel({ 'lat': int(i), 'lon': int(j) })
-                    d_sel = dir_da.isel({ 'lat': int(i), 'lon': int(j) })
-                except Exception:
-                    s_sel = spd_da.isel({list(spd_da.dims)[-2]: int(i), list(spd_da.dims)[-1]: int(j) })
-                    d_sel = dir_da.isel({list(dir_da.dims)[-2]: int(i), list(dir_da.dims)[-1]: int(j) })
-
-            # compute small selection if Dask-backed
-            if hasattr(s_sel.data, 'compute'):
-                s_sel = s_sel.compute()
-                d_sel = d_sel.compute()
-            
-            # pull times
-            s_vals = []
-            d_vals = []
-            times_np = s_sel['time'].values
-            # convert numpy datetime64 to python ISO strings using pandas
-            times_str = _pd.to_datetime(times_np).strftime('%Y-%m-%dT%H:%M:%S').tolist()
-            s_vals = s_sel.values.ravel().tolist()
-            d_vals = d_sel.values.ravel().tolist()
-
-            # append to cumulative lists
-            entry['dates'] = list(times_str)
-            entry['t0'] = list(times_str)[0]
-            entry['speed'] = ([ (float(v) if (v is not None and not np.isnan(v)) else None) for v in s_vals ])
-            entry['direction'] = ([ (float(v) if (v is not None and not np.isnan(v)) else None) for v in d_vals ])
-
-            # add everything to dataframe
-            results.loc[len(results)] = entry
-
-        # close dataset to free up some resources
-        try:
-            spd_ds.close()
-        except Exception:
-            pass
+def idw_interp(casr, power=1):
+    """
+    Inverse distance weighted wind at the stations from their neighbours
+    Speeds are weighted as they are, directions through the u/v components of the wind
+    (350 and 10 average to 0 not 180). A station sitting on a grid cell takes that cell.
+    Input: get_casr_data/get_casr_batch result, power of the distances (1 = 1/d)
+    Output: xr.Dataset of speed, direction ((station,) time), NaN where no neighbour has data
+    """
+    casr = casr.transpose(..., "neighbour", "time")
+    dist = casr["distance_km"].values
+    speed = casr["speed"].values
+    rad = np.deg2rad(casr["direction"].values)
+    axis = -2  # neighbour
+
+    on_cell = dist < 1e-3
+    with np.errstate(divide="ignore"):
+        wt = np.where(on_cell.any(axis=-1, keepdims=True), on_cell, 1 / dist ** power)
+    wt = np.expand_dims(wt, -1)  # over time
+
+    ok = ~np.isnan(speed)
+    ok_dir = ok & ~np.isnan(rad)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        spd = (wt * np.where(ok, speed, 0)).sum(axis=axis) / (wt * ok).sum(axis=axis)
+        u = (wt * np.where(ok_dir, speed * np.sin(rad), 0)).sum(axis=axis)
+        v = (wt * np.where(ok_dir, speed * np.cos(rad), 0)).sum(axis=axis)
+    direction = np.where(ok_dir.any(axis=axis), _bearing(u, v), np.nan)
+
+    template = casr["speed"].drop_vars([c for c in casr.coords if "neighbour" in casr[c].dims])
+    template = template.isel(neighbour=0)
+    return xr.Dataset({"speed": template.copy(data=spd.astype(np.float32)),
+                       "direction": template.copy(data=direction.astype(np.float32)).assign_attrs(units="degrees")})
+
+
+def day_runs(labels):
+    """
+    Each calendar day is one contiguous run of the time axis
+    Input: the "day" (MM-DD) labels along time
+    Output: labels, starts, counts of the runs in time order
+    """
+    labels = np.asarray(labels)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    counts = np.diff(np.r_[starts, len(labels)])
+    return labels[starts], starts, counts
 
-    return results
+
+def daily_percentiles(da, percentiles=(10, 25, 50, 75, 90, 95), half_window=0):
+    """
+    Percentiles of each calendar day's hours (every year together), all stations and days in
+    one call to the stats kernel (wind_stats.py)
+    Input: DataArray (..., time) with the "day" coord, e.g. idw_interp(casr)["speed"]
+           half_window - also take the hours of the days either side, like the station tables
+                         (build_station_climatology.py), only the days in da (no wrap at the ends)
+    Output: xr.Dataset of pXX (..., day) with the first time of each day as "date"
+    """
+    da = da.transpose(..., "time")
+    labels = da["day"].values
+    _, starts, counts = day_runs(labels)
+    day_idx = np.repeat(np.arange(len(starts)), counts)
+    hour_idx = np.arange(len(labels)) - starts[day_idx]
+
+    # (..., day, hour) padded with NaN where a day has fewer hours
+    padded = np.full(da.shape[:-1] + (len(starts), counts.max()), np.nan, dtype=np.float32)
+    padded[..., day_idx, hour_idx] = da.values
+    if half_window:
+        # each day's hours next to those of its neighbours, NaN past the first/last day
+        edges = [(0, 0)] * (padded.ndim - 2) + [(half_window, half_window), (0, 0)]
+        wide = np.pad(padded, edges, constant_values=np.nan)
+        padded = np.concatenate([wide[..., o:o + len(starts), :] for o in range(2 * half_window + 1)],
+                                axis=-1)
+    stats = stats_arrays(padded, percentiles, axis=-1)
+
+    dims = da.dims[:-1] + ("day",)
+    coords = {name: c for name, c in da.coords.items() if "time" not in c.dims}
+    coords.update({"day": labels[starts], "date": ("day", da["time"].values[starts])})
+    return xr.Dataset({f"p{round(p):d}": (dims, stats[f"p{round(p):d}"]) for p in percentiles}, coords=coords)
+
+
+#%%
+if __name__ == "__main__":
+    from writer import write_dataset
+
+    # every msc station over a date range, one file out
+    start, end = "2025-06-01", "2025-06-30"
+    stn_df = msc_stations()
+    casr = get_casr_batch(start, end, stn_df['wmo'].values, stn_df['lat'].values, stn_df['lon'].values)
+    casr = casr.assign_coords(name=("station", stn_df['name'].values.astype(str)))
+    out_file = write_dataset(casr, f"./output/msc_casr_{start}_{end}.nc", pack=["speed", "direction"])
+    print(f"Saved {out_file}")
@@ -13,25 +13,19 @@
 """
 #%%
 import os
-import xarray as xr
-import requests
-import shutil
-import numpy as np
+import sys
 import pandas as pd
-import json
 
-from scipy.spatial import cKDTree
-from concurrent.futures import ThreadPoolExecutor, as_completed
+# run from the repo root like the other processing scripts
+sys.path.append(os.path.abspath("."))
+from ingest import run_ingest, StationSeriesSink
 
 # set the month and year to take the average of
 month = [1, 2]  # np.arange(1, 12+1)
 year = 1990
 
 data_dir = "./temp/"
-
-# get the stinky variable names that casr uses - dont need to type them out here
-with open("./utils/variables.json", 'r') as f:
-    casr_vars = json.load(f)
+save_dir = "./climatology"
 
 # open the allstn2025 file to get stations names and locations
 stations = pd.read_csv("./utils/allstn2025.csv")
@@ -46,91 +40,27 @@ stations = stations.drop(["instr", "tz_correct", "h_bul", "s_bul", "hly", "syn",
 stn_df = stations[(stations['agency'] == 'MSC   ') | (stations['agency'] == 'ParksC')]
 print(stn_df.head())
 
-#%%
-# now initialize two different empty dataarrays to store values in
-# these will be large (~1000 columns for each station and then hourly output)
-direction_df = pd.DataFrame(columns=list(stn_df['wmo'].values))
-speed_df = pd.DataFrame(columns=list(stn_df['wmo'].values))
-
-for ii in range(0, len(stn_df)):
-    # add attributes containing station location and other info
-    st = stn_df.iloc[ii]
-    text = f"{st["name"]}_prov_{st["prov"]}_id_{st["id"]}_elev_{st["elev"]}".replace(" ", "")
-
-    direction_df[st['wmo']].attrs['description'] = text
-    direction_df[st['wmo']].attrs['lat'] = st['lat']
-    direction_df[st['wmo']].attrs['lon'] = st['lon']
-
-    speed_df[st['wmo']].attrs['description'] = text
-    speed_df[st['wmo']].attrs['lat'] = st['lat']
-    speed_df[st['wmo']].attrs['lon'] = st['lon']
-
-#%%
-print(speed_df.head())
-#%%
-def wind_dir_interp(da, var_name, point):
-    # input:
-    # wd_da ==> DataArray of wind directions
-    # var_name ==> String for either variable (read from vraibles.json in utils)
-    # point ==> Tuple of the point to interpolate to
-
-    # get the data tha we need
-    times = list(da['time'].values)
-
-    # now have to interpolate at each time in the dataarray
-    array = wd_da[var_name].values.flatten()
-
-    lats = da.coords["lat"].values.flatten()
-    lons = da.coords["lon"].values.flatten()
-
-    coords = np.column_stack( (lats, lons) )
-
-    # KDTree interpolation
-    tree = cKDTree(coords)
-    dist, idx = tree.query( (point[0], point[1]) )
-
-    return array[idx]
-
-
 #%%
 # loop through each month in a year to collect all wind speeds and directions at msc stations   
+# nearest grid cell for every station, one fancy-indexed read per raw file (see ingest.StationSeriesSink)
 for mm in month:
-    file_name = f"{year}_{mm:02d}_station_wind_direction.nc"
+    file_name = f"{year}_{mm:02d}_station_wind_direction.csv"
 
     all_files = os.listdir(data_dir)
 
     # check if it exists
-    full_file_path = os.path.join("./climatology", file_name)
+    full_file_path = os.path.join(save_dir, file_name)
 
     if os.path.exists(full_file_path):
         print(f"{full_file_path} already exists. Skipping...")
     else:
         # get just the daily files for our data and month
         print("Getting the month files together...")
-        month_files = [file for file in all_files if f"{year}{mm:02d}" in file]
-
-        day = 1  # dummy variable for the day
-        # now loop through these files to create an array of wind speed, dir, and wind run
-        for mf in month_files:
-            time = f"{year}-{mm:02d}-{day:02d}"  
-
-            # note that xarray requires a pandas timestamp
-            timestamp = pd.Timestamp(time)
-            print("Current time: ", time)
-
-            ds = xr.open_dataset(f"{data_dir}{mf}", engine="netcdf4")
-
-            # wind speed
-            ws_da = ds[casr_vars["CaSR_Variables"]["wind_speed"]] 
-            ws_da_km = ws_da * 1.852  # convert to km/h from kts
-
-            # wind direction
-            wd_da = ds[casr_vars["CaSR_Variables"]["wind_direction"]]
-
-            # interpolate both DataArrays - parallize due to the number of stations
-            # parallization cause this thang is slooow
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [executor.submit(wind_dir_interp, wd_da, f"{date}12.nc") for date in dates]
-                for future in as_completed(futures):
-                    result = future.result()  # handle result or exceptions if needed  
-    
+        month_files = sorted(file for file in all_files if file.startswith(f"{year}{mm:02d}") and file.endswith("12.nc"))
+
+        if month_files:
+            sink = StationSeriesSink(stn_df['wmo'].values, stn_df['lat'].values, stn_df['lon'].values,
+                                     save_dir=save_dir)
+            run_ingest([f"{data_dir}{mf}" for mf in month_files], [sink])
+        else:
+            print(f"No raw files for {year}-{mm:02d} in {data_dir}")
@@ -0,0 +1,173 @@
+"""
+
+    Overlapped download -> extract pipeline for main.py
+    A producer thread downloads day N+1 (all 31 years) while the main thread extracts day N,
+    with a cap on the raw files/bytes sitting in ./temp so the disk doesn't fill up
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import queue
+import threading
+import time
+
+from downloader import run_parallel, make_session, MAX_WORKERS
+
+
+class TempBudget:
+    """
+    Counts the raw files/bytes held in the temp directory
+    acquire() blocks the producer (backpressure) until the consumer has released enough
+    A day is always let through when nothing is held, so one oversized day can't deadlock
+    """
+    def __init__(self, max_files=None, max_bytes=None):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.files = 0
+        self.bytes = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, n_files):
+        if self.files == 0:
+            return True
+        if self.max_files is not None and self.files + n_files > self.max_files:
+            return False
+        if self.max_bytes is not None and self.bytes >= self.max_bytes:
+            return False
+        return True
+
+    def acquire(self, n_files, stop=None):
+        with self._cond:
+            waited = time.perf_counter()
+            while not self._fits(n_files) and not (stop is not None and stop.is_set()):
+                self._cond.wait(timeout=1.0)
+            self.files += n_files
+            return time.perf_counter() - waited
+
+    def add_bytes(self, n_bytes):
+        with self._cond:
+            self.bytes += n_bytes
+
+    def release(self, n_files, n_bytes):
+        with self._cond:
+            self.files -= n_files
+            self.bytes -= n_bytes
+            self._cond.notify_all()
+
+
+def clean_temp(temp_dir, files):
+    """
+    Remove the given raw .nc files from temp_dir
+    """
+    for fname in files:
+        # Attempt to remove the .nc file. On Windows this can fail with
+        # PermissionError if another process still has the file open
+        # (common with netCDF/h5 files if a dataset wasn't closed).
+        file_path = os.path.join(temp_dir, fname)
+        try:
+            os.remove(file_path)  # unlink
+        except PermissionError as e:
+            # Informative message and skip – the file is in use.
+            print(f"Could not remove '{file_path}' (in use): {e}. Skipping.")
+        except FileNotFoundError:
+            # Already removed by another thread/process; ignore
+            pass
+        except Exception as e:
+            # Unexpected error – report and continue
+            print(f"Error removing '{file_path}': {e}")
+
+
+def run_pipeline(jobs, link, process, temp_dir="./temp/", max_files=None, max_bytes=None,
+                 prefetch=1, max_workers=MAX_WORKERS):
+    """
+    Input: jobs - list of (key, dates) pairs, dates are yyyymmdd strings (one job = one calendar day)
+           link - base url for the downloader
+           process - callable(key, files) run on the main thread once a job's files are in temp_dir
+           max_files, max_bytes - budget for raw files held in temp_dir (None = unlimited)
+           prefetch - how many downloaded days may wait for the consumer
+    Output: list of (key, dates that failed) of the days not processed, prints a per-day timing
+            line and a summary at the end
+
+    Each job's files are removed from temp_dir once process() returns. If it raises, the files
+    are left in place so a re-run picks them up without downloading again. A day with files that
+    failed to download (after the downloader's retries) is not processed at all, a daily file
+    missing years would never be redone, its files stay in temp_dir for the next run.
+    """
+    budget = TempBudget(max_files=max_files, max_bytes=max_bytes)
+    ready = queue.Queue(maxsize=max(1, prefetch))
+    session = make_session(pool_size=max_workers)
+    stop = threading.Event()
+    stats = {"download": 0.0, "stalled": 0.0, "process": 0.0}
+    failed = []
+
+    def producer():
+        try:
+            for key, dates in jobs:
+                files = [f"{date}12.nc" for date in dates]
+                stats["stalled"] += budget.acquire(len(files), stop=stop)
+                if stop.is_set():
+                    budget.release(len(files), 0)
+                    break
+
+                t0 = time.perf_counter()
+                run_parallel(dates, link, dst_dir=temp_dir, max_workers=max_workers, session=session)
+                stats["download"] += time.perf_counter() - t0
+
+                missing = [date for date, f in zip(dates, files) if not os.path.exists(os.path.join(temp_dir, f))]
+                if missing:
+                    # not handed on, the next run downloads what is missing and does the day
+                    budget.release(len(files), 0)
+                    failed.append((key, missing))
+                    print(f"{key}: {len(missing)} of {len(dates)} files failed to download, "
+                          f"leaving the day for the next run")
+                    continue
+                n_bytes = sum(os.path.getsize(os.path.join(temp_dir, f)) for f in files)
+                budget.add_bytes(n_bytes)
+
+                ready.put((key, files, n_bytes))
+        except Exception as e:
+            ready.put(e)
+            return
+        ready.put(None)
+
+    start_time = time.perf_counter()
+    thread = threading.Thread(target=producer, name="casr-download", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            key, files, n_bytes = item
+            t0 = time.perf_counter()
+            process(key, files)
+            clean_temp(temp_dir, files)
+            budget.release(len(files), n_bytes)
+            stats["process"] += time.perf_counter() - t0
+            print(f"{key} done in {time.perf_counter() - t0:.1f} s "
+                  f"(temp holds {budget.files} files, {budget.bytes / 1e9:.2f} GB)")
+    finally:
+        stop.set()
+        # unblock the producer if it is waiting on a full queue
+        # (downloaded but unprocessed files are left in temp_dir, the next run skips them)
+        while thread.is_alive():
+            try:
+                ready.get_nowait()
+            except queue.Empty:
+                pass
+            thread.join(timeout=0.1)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Pipeline finished in {elapsed / 60:.1f} minutes: download {stats['download'] / 60:.1f}, "
+          f"extract {stats['process'] / 60:.1f}, download stalled on temp budget {stats['stalled'] / 60:.1f}")
+    if failed:
+        print(f"{len(failed)} days failed to download and were not processed, run again to retry them: "
+              f"{[key for key, _ in failed]}")
+    return failed
@@ -12,10 +12,13 @@ import cartopy.feature as cfeature
 
 import json
 
+from utils import NORMAL_PERIOD, period_label
+
 ##### USER INPUT #####
 data_dir = "./climatology/monthly"
 year = 1990
 month = 2
+period = NORMAL_PERIOD
 
 variable = "winddirection"
 ##### END USER INPUT #####
@@ -24,7 +27,7 @@ with open("./utils/variables.json", 'r') as f:
     casr_vars = json.load(f)
 var = casr_vars["Climate_Variables"][variable]
 
-file = f"{data_dir}/1990-2020_monthly_{variable}_stats_m{month:02d}.nc"
+file = f"{data_dir}/{period_label(period)}_monthly_{variable}_stats_m{month:02d}.nc"
 
 
 ds = xr.open_dataset(file, engine="netcdf4")
@@ -0,0 +1,259 @@
+"""
+
+    Rolling the normal period forward a year at a time
+    The monthly stats are kept as subtractable per year aggregates: every (year, month) has a
+    partial in climatology/yearly/ (histogram counts, n, sum, sum of squares - the layout of
+    the monthly partials tiled_stats.py writes). Moving 1990-2020 to 1991-2021 is then the
+    old monthly partial + the new year's - the dropped year's, nothing is downloaded again
+    and the daily cubes are not rebuilt.
+
+    # once, from the daily cubes of the current normal
+    run_yearly_partials(month_files, ws_name, "windspeed", month)
+    # when a new year of CaSR arrives, straight from its raw files (ingest.py)
+    run_ingest(new_year_paths, [YearlyPartialSink(lon_min=TRIM_LON_WEST, lon_max=TRIM_LON_EAST)])
+    # then per month, and wind_season_stats.py with the new period for the seasons
+    roll_month(month, "windspeed", (1990, 2020), (1991, 2021))
+
+    The yearly partials have to be on the grid of the monthly ones: both default to the
+    TRIM_LON_WEST/TRIM_LON_EAST window wind_month_stats.py uses, and roll_partial refuses
+    partials whose grid differs from the normal's. The max comes back from the counts after
+    a year is taken out. The exceedance/run length
+    and hour of day parts of the monthly partials are not rolled (runs are not kept per year),
+    rerun wind_month_stats.py for those. Only wind speed is rolled, the direction normals are
+    circular sums (circular_stats.py), rerun wind_month_stats.py with wind_direction for them.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import time
+
+import numpy as np
+import xarray as xr
+
+from grid_geometry import TRIM_LON_EAST, TRIM_LON_WEST, get_window
+from ingest import _MonthlySink
+from tiled_stats import (HIST_BINS, _create_partial, _file_times, _read_tile, _write_partial_tile,
+                         grid_info, hist_bins, merge_tiled, tile_windows)
+from utils import period_label, period_years
+from wind_hist import HistogramAccumulator, SCALE_FACTOR, FILL_VALUE, check_partial, partial_path
+from windrun import file_years
+
+YEARLY_DIR = "./climatology/yearly/"
+MONTHLY_DIR = "./climatology/monthly/"
+
+
+def _check_speed(file_var):
+    # the yearly partials are histograms, only speed is rolled
+    if file_var != "windspeed":
+        raise ValueError(f"Only windspeed normals are rolled, not {file_var} "
+                         "(rerun wind_month_stats.py with wind_direction for the direction normals)")
+
+
+def yearly_partial_path(year, month, file_var="windspeed", yearly_dir=YEARLY_DIR):
+    """
+    e.g. climatology/yearly/2021_monthly_windspeed_m04.partial.nc, december is under the
+    year of its data (Dec 2020 goes in the 1991-2021 DJF)
+    """
+    return os.path.join(yearly_dir, f"{year}_monthly_{file_var}_m{month:02d}.partial.nc")
+
+
+def monthly_output(period, month, file_var="windspeed", month_dir=MONTHLY_DIR):
+    # same names as wind_month_stats.py
+    return os.path.join(month_dir, f"{period_label(period)}_monthly_{file_var}_stats_m{month:02d}.nc")
+
+
+def run_yearly_partials(paths, var_name, file_var, month, yearly_dir=YEARLY_DIR, memory_mb=4000,
+                        lon_min=TRIM_LON_WEST, lon_max=TRIM_LON_EAST):
+    """
+    Split a month of daily cubes into one partial per year, one tiled pass over the files
+    Input: the month's windspeed daily files, the variable, "windspeed" for the names
+    Output: list of the years written
+    """
+    _check_speed(file_var)
+    paths = sorted(paths)
+    if not paths:
+        raise ValueError("No files to process")
+    template, window, scale_factor, fill_value = grid_info(paths[0], var_name, lon_min, lon_max)
+    years = [file_years(_file_times(p)) for p in paths]
+    all_years = sorted(set(np.concatenate(years).tolist()))
+
+    # a uint16 histogram per year (744 hours at most in a month) + one file's temporaries
+    nbins = hist_bins(paths[0])
+    per_cell = len(all_years) * (nbins + 1) * 2 + max(len(y) for y in years) * (2 + 8 + 8 + 1)
+    tiles = tile_windows(template.shape, memory_mb * 2**20 // per_cell)
+    print(f"{len(paths)} files, {len(all_years)} years, grid {template.shape} -> {len(tiles)} tiles")
+
+    os.makedirs(yearly_dir, exist_ok=True)
+    ncs = {}
+    try:
+        for year in all_years:
+            ncs[year] = _create_partial(yearly_partial_path(year, month, file_var, yearly_dir),
+                                        template, scale_factor, fill_value)
+            ncs[year].setncatts({"year": year, "month": month})
+        start_time = time.time()
+        for t, (rows, cols) in enumerate(tiles):
+            shape = (rows.stop - rows.start, cols.stop - cols.start)
+            accs = {year: HistogramAccumulator(shape, nbins=nbins, scale_factor=scale_factor,
+                                               fill_value=fill_value, dtype=np.uint16)
+                    for year in all_years}
+            for path, file_yrs in zip(paths, years):
+                packed = _read_tile(path, var_name, window, rows, cols)
+                for year in np.unique(file_yrs):
+                    accs[int(year)].add(packed[file_yrs == year])
+            for year, acc in accs.items():
+                _write_partial_tile(ncs[year], acc, rows, cols)
+            print(f"tile {t + 1}/{len(tiles)} done ({time.time() - start_time:.1f} s)")
+    finally:
+        for nc in ncs.values():
+            nc.close()
+    return all_years
+
+
+class YearlyPartialSink(_MonthlySink):
+    """
+    The (year, month) partials straight from the raw files of a new year, see ingest.py
+    A month's counts are held for the whole grid until it is written (uint16, about
+    2 GB for 700k cells), cropped to the same lon window as the daily cube stats
+    (lon_min/lon_max None for the whole grid), wind speed only
+    """
+    def __init__(self, yearly_dir=YEARLY_DIR, file_var="windspeed", lon_min=TRIM_LON_WEST,
+                 lon_max=TRIM_LON_EAST, write_incomplete=False):
+        _check_speed(file_var)
+        super().__init__(write_incomplete)
+        self.yearly_dir = yearly_dir
+        self.file_var = file_var
+        self.lon_min = lon_min
+        self.lon_max = lon_max
+
+    def start(self, ws_template, wd_template):
+        template = ws_template
+        self.window = None
+        if self.lon_min is not None or self.lon_max is not None:
+            self.window = get_window(template, lon_min=self.lon_min, lon_max=self.lon_max)
+            template = template.isel(self.window)
+        self.template = template
+
+    def new_month(self, key):
+        return HistogramAccumulator(self.template.shape, nbins=HIST_BINS, scale_factor=SCALE_FACTOR,
+                                    fill_value=FILL_VALUE, dtype=np.uint16)
+
+    def add_month(self, acc, times, ws, wd):
+        packed = ws
+        if self.window is not None:
+            dims = self.template.dims
+            packed = packed[:, self.window[dims[0]], self.window[dims[1]]]
+        acc.add(packed)
+
+    def write_month(self, key, acc, days=None):
+        year, mm = key
+        path = yearly_partial_path(year, mm, self.file_var, self.yearly_dir)
+        attrs = {} if days is None else {"days": days}
+        acc.save(path, self.template, year=year, month=mm, **attrs)
+        print(f"Saved {path}")
+
+
+def _same_grid(ds, template):
+    # same cells: the shape of n and the lat/lon of every cell
+    if ds["n"].shape != template.shape:
+        return False
+    if not all(name in ds.coords and name in template.coords for name in ("lat", "lon")):
+        return False
+    return all(np.array_equal(ds[name].values, template[name].values) for name in ("lat", "lon"))
+
+
+def roll_partial(normal_partial, add_partials, drop_partials, output_partial, memory_mb=4000):
+    """
+    normal + the added years - the dropped ones, tile by tile into a new partial
+    Output: number of tiles
+    """
+    with xr.open_dataset(normal_partial, mask_and_scale=False) as ds:
+        check_partial(ds, normal_partial)
+        template = ds["n"].load()
+        scale_factor, fill_value = ds.attrs["scale_factor"], ds.attrs["fill_value"]
+        if "hour" in template.dims:
+            raise ValueError("Hour of day partials are not rolled")
+    nbins = 0
+    for p in [normal_partial] + list(add_partials) + list(drop_partials):
+        with xr.open_dataset(p, mask_and_scale=False) as ds:
+            check_partial(ds, p)
+            if not _same_grid(ds, template):
+                raise ValueError(f"{p} is not on the grid of {normal_partial} (shape/lat/lon differ), "
+                                 "were they cropped to the same lon window?")
+            nbins = max(nbins, ds.sizes["bin"])
+    # the rolled counts + the one being read and their int64 sums
+    per_cell = (nbins + 1) * (4 + 4) + 8 * 8
+    tiles = tile_windows(template.shape, memory_mb * 2**20 // per_cell)
+    print(f"+{len(add_partials)} -{len(drop_partials)} years, grid {template.shape} -> {len(tiles)} tiles")
+
+    nc = _create_partial(output_partial, template, scale_factor, fill_value)
+    try:
+        for rows, cols in tiles:
+            piece = {template.dims[0]: rows, template.dims[1]: cols}
+            acc = HistogramAccumulator.load(normal_partial, window=piece)
+            for p in add_partials:
+                acc.merge(HistogramAccumulator.load(p, window=piece))
+            for p in drop_partials:
+                acc.subtract(HistogramAccumulator.load(p, window=piece))
+            if (acc.n < 0).any():
+                raise ValueError(f"Dropping {drop_partials} took out hours the normal never had")
+            _write_partial_tile(nc, acc, rows, cols)
+    finally:
+        nc.close()
+    return len(tiles)
+
+
+def roll_month(month, file_var, old_period, new_period, month_dir=MONTHLY_DIR, yearly_dir=YEARLY_DIR,
+               memory_mb=4000, percentiles=(10, 25, 75, 90, 95), profile="int16_zlib1"):
+    """
+    Monthly stats and partial of new_period from those of old_period and the yearly partials
+    Input: month, "windspeed" (direction is not rolled), (first, last) years of both normals
+           profile - writer.py encoding profile of the stats
+    Output: the new monthly stats file
+    """
+    _check_speed(file_var)
+    old_years = set(range(period_years(old_period, month)[0], period_years(old_period, month)[1] + 1))
+    new_years = set(range(period_years(new_period, month)[0], period_years(new_period, month)[1] + 1))
+    add = [yearly_partial_path(y, month, file_var, yearly_dir) for y in sorted(new_years - old_years)]
+    drop = [yearly_partial_path(y, month, file_var, yearly_dir) for y in sorted(old_years - new_years)]
+    for p in add + drop:
+        if not os.path.exists(p):
+            raise FileNotFoundError(f"{p} is needed to roll m{month:02d}, run run_yearly_partials/YearlyPartialSink")
+
+    old_partial = partial_path(monthly_output(old_period, month, file_var, month_dir))
+    output_file = monthly_output(new_period, month, file_var, month_dir)
+    roll_partial(old_partial, add, drop, partial_path(output_file), memory_mb=memory_mb)
+    merge_tiled([partial_path(output_file)], output_file, memory_mb=memory_mb, percentiles=percentiles,
+                encoding=profile, months=[month])
+    return output_file
+
+
+#%%
+if __name__ == "__main__":
+    import json
+
+    data_dir = "./climatology/daily/"
+    old_period = (1990, 2020)
+    new_period = (1991, 2021)
+    months = range(1, 12+1)
+    # wind speed only, rerun wind_month_stats.py for the direction normals
+    # split the daily cubes of old_period into yearly partials first (only needed once)
+    build_yearly = False
+
+    with open("./utils/variables.json", 'r') as f:
+        casr_vars = json.load(f)
+
+    for mm in months:
+        start_time = time.time()
+        if build_yearly:
+            label = period_label(old_period, mm)
+            files = [os.path.join(data_dir, file) for file in os.listdir(data_dir)
+                     if file.startswith(label) and f"m{mm:02d}" in file and "windspeed" in file]
+            run_yearly_partials(files, casr_vars["CaSR_Variables"]["wind_speed"], "windspeed", mm,
+                                lon_min=TRIM_LON_WEST, lon_max=TRIM_LON_EAST)
+        output_file = roll_month(mm, "windspeed", old_period, new_period)
+        print(f"Saved stats to {output_file} ({time.time() - start_time:.1f} s)")
+    print(f"Now run wind_season_stats.py with period = {new_period}")
+# %%
@@ -0,0 +1,46 @@
+"""
+
+    numpy arrays backed by multiprocessing shared memory
+    The parent creates the block, worker processes attach to it by name and write their
+    piece in place, so large results never get pickled back through the pool
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import numpy as np
+
+from multiprocessing import shared_memory
+
+
+def create_shared(shape, dtype, fill=None):
+    """
+    Output: (SharedMemory, ndarray view of it) - keep the SharedMemory object alive
+            and call release_shared() once done with the array
+    """
+    dtype = np.dtype(dtype)
+    nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    if fill is not None:
+        arr[...] = fill
+    return shm, arr
+
+
+def attach_shared(name, shape, dtype):
+    """
+    Attach (in a worker) to a block made with create_shared
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return shm, arr
+
+
+def release_shared(shm, unlink=True):
+    """
+    Close (and by default free) a shared block. Every ndarray view of it must be deleted first.
+    """
+    shm.close()
+    if unlink:
+        shm.unlink()
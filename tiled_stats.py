@@ -0,0 +1,534 @@
+"""
+
+    Out of core stats runner: the grid is split into spatial tiles and each tile is
+    done over the full time range before moving on, with the tile size worked out from
+    a memory budget. Each tile's results are written straight into the output netcdf,
+    so a whole season over all of canada never has to fit in memory at once.
+
+    run_tiled_stats(files, var_name, "stats_m04.nc", memory_mb=4000)
+    merge_tiled(partials, "stats_DJF.nc", memory_mb=4000)    # seasons from monthly partials
+
+    method="hist" - per tile histograms of the packed int16 values (wind_hist.py), exact,
+                    memory per cell does not depend on the number of hours, can write a
+                    partial for the seasonal merges as it goes
+    method="sort" - the tile's full time series is read and partitioned (wind_stats.py)
+
+    diurnal=True also gives hour of day (UTC) mean/p50/p90/p95 on (hour, rlat, rlon) from the
+    same reads, the hours are grouped through an index worked out once from the time axes
+
+    workers=N computes the tiles in N processes (each reads its own hyperslabs), the stats
+    land in a shared memory result grid and a scaling report (tiles/s per core) is printed
+    to help pick N on the big nodes
+
+    thresholds=[20, 40, 60] also gives exceedance fractions and run lengths above each
+    threshold (exceedance.py) from the same reads, they go in the output and the partial
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import multiprocessing as mp
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+from exceedance import RunLengthAccumulator, exceedance_names
+from grid_geometry import get_window
+from shared_arrays import attach_shared, create_shared, release_shared
+from writer import tiled_encoding
+from wind_hist import HistogramAccumulator, SCALE_FACTOR, FILL_VALUE, check_partial, missing_partials
+from wind_stats import PERCENTILES, stats_arrays
+from windrun import file_years
+
+# histogram bins of the packed values (0.1 steps) the tiles are sized for: speed up to
+# 150 km/h (they grow if needed), direction the whole 0-360 degrees
+HIST_BINS = 1500
+DIR_BINS = 3601
+
+# hour of day product
+DIURNAL_PERCENTILES = (50, 90, 95)
+DIURNAL_NAMES = ["mean", "p50", "p90", "p95"]
+
+
+def hist_bins(path):
+    """
+    Bins to size the histograms of a daily file's variable for (winddir files are direction)
+    """
+    return DIR_BINS if "winddir" in os.path.basename(path) else HIST_BINS
+
+
+def diurnal_path(output_file):
+    """
+    The hour of day stats sit beside the output: stats_m04.nc -> stats_m04_diurnal.nc
+    """
+    root, ext = os.path.splitext(output_file)
+    if root.endswith(".partial"):
+        return root[:-len(".partial")] + "_diurnal.partial" + ext
+    return root + "_diurnal" + ext
+
+
+def stat_names(percentiles=PERCENTILES):
+    names = ["mean", "median", "std", "max"] + [f"p{p:d}" for p in percentiles if p != 50]
+    if 50 in percentiles:
+        names.append("p50")
+    return names
+
+
+def tile_windows(shape, max_cells):
+    """
+    Split a 2-D grid into tiles of at most max_cells, full rows first (contiguous reads)
+    Output: list of (row slice, col slice)
+    """
+    nrow, ncol = shape
+    max_cells = max(int(max_cells), 1)
+    if max_cells >= ncol:
+        step_r, step_c = min(max_cells // ncol, nrow), ncol
+    else:
+        step_r, step_c = 1, max_cells
+    return [(slice(r, min(r + step_r, nrow)), slice(c, min(c + step_c, ncol)))
+            for r in range(0, nrow, step_r) for c in range(0, ncol, step_c)]
+
+
+def grid_info(path, var_name, lon_min=None, lon_max=None):
+    """
+    Output: (template DataArray of the cropped grid, isel window on the file grid or None,
+             scale_factor, fill_value)
+    """
+    with xr.open_dataset(path, mask_and_scale=False) as ds:
+        window = None
+        if lon_min is not None or lon_max is not None:
+            window = get_window(ds, lon_min=lon_min, lon_max=lon_max)
+            ds = ds.isel(window)
+        da = ds[var_name]
+        template = da.isel(time=0, drop=True).load()
+        return (template, window, da.attrs.get("scale_factor", SCALE_FACTOR),
+                da.attrs.get("_FillValue", FILL_VALUE))
+
+
+def _read_tile(path, var_name, window, rows, cols):
+    # only the tile's hyperslab comes off disk (lazy isel), raw int16
+    with xr.open_dataset(path, mask_and_scale=False) as ds:
+        if window is not None:
+            ds = ds.isel(window)
+        da = ds[var_name]
+        return da.isel({da.dims[1]: rows, da.dims[2]: cols}).values
+
+
+def _file_times(path):
+    with xr.open_dataset(path) as ds:
+        return ds["time"].values
+
+
+def hour_index(times):
+    """
+    Precomputed hour of day grouping (UTC, the files' time axis)
+    Output: (n, 24) int array, column h holds the positions of the hour h steps, -1 pads
+            when some hours have fewer steps. values[idx] gives (n, 24, ...) hour groups
+    """
+    hours = np.asarray(times).astype("datetime64[h]").astype(np.int64) % 24
+    idx = np.full((max(np.bincount(hours, minlength=24).max(), 1), 24), -1, dtype=np.int64)
+    for h in range(24):
+        pos = np.flatnonzero(hours == h)
+        idx[:len(pos), h] = pos
+    return idx
+
+
+def _by_hour(values, idx, fill):
+    # (time, ...) -> (n, 24, ...) with fill where an hour has fewer steps
+    out = values[np.maximum(idx, 0)]
+    out[idx < 0] = fill
+    return out
+
+
+def create_output(path, template, names, encoding=None, lead=None):
+    """
+    Empty netcdf on the template grid (coords written), one variable per name
+    encoding - optional dict of per variable options (dtype, scale_factor, _FillValue,
+               chunksizes, zlib, complevel) like xarray's to_netcdf, or a writer.py profile name
+    lead - optional (dim name, {coord name: values}) for a dim in front of the grid,
+           e.g. ("dayofyear", {"dayofyear": [1, ..., 365]})
+    Output: open netCDF4.Dataset, tiles are written into it with nc[name][rows, cols] = ...
+            (nc[name][:, rows, cols] with a lead dim)
+    """
+    if isinstance(encoding, str):
+        encoding = tiled_encoding(encoding, template, names,
+                                  lead=None if lead is None else (lead[0], len(list(lead[1].values())[0])))
+    nc = netCDF4.Dataset(path, "w")
+    dims = template.dims
+    if lead is not None:
+        lead_dim, lead_coords = lead
+        values = list(lead_coords.values())
+        nc.createDimension(lead_dim, len(values[0]))
+        for name, vals in lead_coords.items():
+            vals = np.asarray(vals)
+            dtype = str if vals.dtype.kind == "U" else vals.dtype
+            nc.createVariable(name, dtype, (lead_dim,))[:] = vals
+        dims = (lead_dim,) + dims
+    for dim in template.dims:
+        nc.createDimension(dim, template.sizes[dim])
+    for name, coord in template.coords.items():
+        var = nc.createVariable(name, coord.dtype, coord.dims)
+        var.setncatts({k: v for k, v in coord.attrs.items() if k != "_FillValue"})
+        var[:] = coord.values
+    if "lat" in template.coords and "lon" in template.coords:
+        coord_attr = "lat lon"
+    else:
+        coord_attr = None
+
+    for name in names:
+        enc = dict((encoding or {}).get(name, {}))
+        dtype = enc.pop("dtype", "f8")
+        fill = enc.pop("_FillValue", np.nan if np.dtype(dtype).kind == "f" else None)
+        scale = enc.pop("scale_factor", None)
+        var = nc.createVariable(name, dtype, dims, fill_value=fill, **enc)
+        if scale is not None:
+            var.scale_factor = scale
+        if coord_attr:
+            var.coordinates = coord_attr
+    return nc
+
+
+def _write_tile(nc, stats, rows, cols, names=None):
+    # only the names asked for, a lead dim (hour, dayofyear) is written whole
+    for name in names or stats:
+        # NaN -> masked so packed int variables get their fill value
+        nc[name][..., rows, cols] = np.ma.masked_invalid(stats[name])
+
+
+def _create_partial(path, template, scale_factor, fill_value, hourly=False, thresholds=None,
+                    run_years=None):
+    # same layout as HistogramAccumulator.save, the bin dim grows as tiles need more bins
+    # hourly partials have an hour dim in front, their counts always fit uint16
+    # (31 years x 366 days at most per hour and cell)
+    # with thresholds the run length counts go on a threshold dim (RunLengthAccumulator.load)
+    nc = netCDF4.Dataset(path, "w")
+    dims = template.dims
+    if hourly:
+        nc.createDimension("hour", 24)
+        nc.createVariable("hour", "i4", ("hour",))[:] = np.arange(24)
+        dims = ("hour",) + dims
+    for dim in template.dims:
+        nc.createDimension(dim, template.sizes[dim])
+    nc.createDimension("bin", None)
+    for name, coord in template.coords.items():
+        var = nc.createVariable(name, coord.dtype, coord.dims)
+        var[:] = coord.values
+    variables = [nc.createVariable("counts", "u2" if hourly else "u4", dims + ("bin",), fill_value=0,
+                                   zlib=True, complevel=1)]
+    for name in ["n", "sum", "sumsq", "max"]:
+        variables.append(nc.createVariable(name, "i8", dims))
+    if thresholds is not None:
+        nc.createDimension("threshold", len(thresholds))
+        nc.createVariable("threshold", "f8", ("threshold",))[:] = thresholds
+        for name in ["exceed", "run_count", "run_max"]:
+            variables.append(nc.createVariable(name, "i8", ("threshold",) + dims))
+    if "lat" in template.coords and "lon" in template.coords:
+        for var in variables:
+            var.coordinates = "lat lon"
+    nc.setncatts({"scale_factor": scale_factor, "fill_value": fill_value})
+    if run_years is not None:
+        nc.run_years = np.asarray(run_years, dtype=np.int32)
+    return nc
+
+
+def _write_partial_tile(nc, acc, rows, cols, racc=None):
+    nc["counts"][..., rows, cols, :acc.nbins] = acc.counts[:, :acc.nbins].reshape(acc.shape + (acc.nbins,))
+    for name in ["n", "sum", "sumsq", "max"]:
+        nc[name][..., rows, cols] = getattr(acc, name).reshape(acc.shape)
+    if racc is not None:
+        for name in ["exceed", "run_count", "run_max"]:
+            nc[name][:, rows, cols] = getattr(racc, name).reshape((-1,) + racc.shape)
+
+
+def _bytes_per_cell(method, hours, file_hours, nstats, diurnal=False, nthresholds=0, nbins=HIST_BINS):
+    # rough peak bytes per grid cell of a tile, the budget divided by this gives the tile size
+    # (run lengths: counts and an open run per year and threshold, with 31 years in flight at most)
+    runs = nthresholds * (3 + 31) * 8
+    if method == "sort":
+        # int16 buffer + float32 copy (+ its hour grouped copy) + the stats
+        return hours * (2 + 4 + (4 if diurnal else 0)) + nstats * 8 * (25 if diurnal else 1) + runs
+    # counts + block cumsum in stats() + one file's int16/int64 temporaries + the stats
+    per_cell = (nbins + 1) * (4 + 8) + file_hours * (2 + 8 + 8 + 1) + nstats * 8
+    if diurnal:
+        # 24 uint16 hour histograms and their stats
+        per_cell += 24 * (nbins + 1) * 2 + file_hours * 2 + 24 * len(DIURNAL_NAMES) * 8
+    return per_cell + runs
+
+
+def _compute_tile(paths, var_name, window, rows, cols, method, percentiles, file_hours,
+                  scale_factor, fill_value, keep_acc=False, hour_idx=None, thresholds=None,
+                  years=None, nbins=HIST_BINS):
+    """
+    Stats of one tile over all the files
+    hour_idx - hour_index() of the concatenated times ("sort") or one per file ("hist")
+               to also get the hour of day stats
+    thresholds, years - exceedance thresholds and the year of each step per file (file_years)
+    nbins - histogram bins to start with ("hist"), see hist_bins()
+    Output: dict - "stats" (arrays on the tile), "acc" (HistogramAccumulator if keep_acc),
+            "diurnal" ((24, *tile) arrays if hour_idx), "dacc" (hour accumulator if both),
+            "racc" (RunLengthAccumulator if thresholds and keep_acc)
+    """
+    shape = (rows.stop - rows.start, cols.stop - cols.start)
+    out = {"stats": None, "acc": None, "diurnal": None, "dacc": None, "racc": None}
+    racc = None
+    if thresholds is not None:
+        racc = RunLengthAccumulator(shape, thresholds, scale_factor, fill_value)
+
+    if method == "sort":
+        buf = np.empty((sum(file_hours),) + shape, dtype=np.int16)
+        pos = 0
+        for f, (path, nt) in enumerate(zip(paths, file_hours)):
+            buf[pos:pos + nt] = _read_tile(path, var_name, window, rows, cols)
+            if racc is not None:
+                racc.add(buf[pos:pos + nt], years[f])
+            pos += nt
+        values = np.where(buf == fill_value, np.nan, buf * np.float32(scale_factor))
+        del buf
+        out["stats"] = stats_arrays(values, percentiles, axis=0)
+        if hour_idx is not None:
+            out["diurnal"] = stats_arrays(_by_hour(values, hour_idx, np.nan), DIURNAL_PERCENTILES, axis=0)
+        if racc is not None:
+            racc.finish()
+            out["stats"].update(racc.stats())
+        return out
+
+    acc = HistogramAccumulator(shape, nbins=nbins, scale_factor=scale_factor,
+                               fill_value=fill_value)
+    dacc = None
+    if hour_idx is not None:
+        dacc = HistogramAccumulator((24,) + shape, nbins=nbins, scale_factor=scale_factor,
+                                    fill_value=fill_value, dtype=np.uint16)
+    for f, path in enumerate(paths):
+        packed = _read_tile(path, var_name, window, rows, cols)
+        acc.add(packed)
+        # the same read feeds the hour of day histograms
+        if dacc is not None:
+            dacc.add(_by_hour(packed, hour_idx[f], fill_value))
+        if racc is not None:
+            racc.add(packed, years[f])
+    out["stats"] = acc.stats(percentiles)
+    if dacc is not None:
+        out["diurnal"] = dacc.stats(DIURNAL_PERCENTILES)
+    if racc is not None:
+        racc.finish()
+        out["stats"].update(racc.stats())
+    if keep_acc:
+        out["acc"], out["dacc"], out["racc"] = acc, dacc, racc
+    return out
+
+
+def _tile_worker(i, shm_name, out_shape, names, args, kwargs):
+    # worker side: compute a tile and write its stats into the shared result grid
+    start = time.time()
+    result = _compute_tile(*args, **kwargs)
+    rows, cols = args[3], args[4]
+    shm, out = attach_shared(shm_name, out_shape, np.float64)
+    for k, name in enumerate(names):
+        out[k, rows, cols] = result["stats"][name]
+    del out
+    release_shared(shm, unlink=False)
+    # the partial's counts and the (small) hour of day stats go back to the parent,
+    # only it writes to the netcdf files
+    result["stats"] = None
+    if result["diurnal"] is not None:
+        result["diurnal"] = {name: result["diurnal"][name] for name in DIURNAL_NAMES}
+    return i, result, time.time() - start
+
+
+def scaling_report(ntiles, elapsed, busy, workers):
+    """
+    Print tiles/s overall and per core, and how busy the workers were
+    busy - summed compute seconds of all tiles
+    """
+    rate = ntiles / elapsed if elapsed > 0 else float("nan")
+    efficiency = busy / (elapsed * workers) if elapsed > 0 else float("nan")
+    print(f"{ntiles} tiles in {elapsed:.1f} s on {workers} workers: {rate:.2f} tiles/s, "
+          f"{rate / workers:.3f} tiles/s per core, workers busy {100 * efficiency:.0f}% of the time")
+    return {"tiles": ntiles, "seconds": elapsed, "tiles_per_s": rate,
+            "tiles_per_s_per_core": rate / workers, "efficiency": efficiency}
+
+
+def run_tiled_stats(paths, var_name, output_file, memory_mb=4000, percentiles=PERCENTILES,
+                    method="hist", lon_min=None, lon_max=None, partial_file=None, encoding=None,
+                    workers=None, diurnal=False, thresholds=None):
+    """
+    Input: daily files, the variable, output netcdf path
+           memory_mb - ceiling for the working arrays of the tiles in flight (all workers)
+           method - "hist" or "sort" (see top)
+           lon_min/lon_max - optional crop, partial_file - also write a mergeable partial ("hist")
+           workers - processes computing tiles (None = serial in this process)
+           diurnal - also write hour of day stats (mean, p50, p90, p95) to diurnal_path(output_file)
+                     from the same reads (and their partial next to partial_file)
+           thresholds - optional exceedance thresholds (data units) for exceed_T, runs_T,
+                        run_mean_T and run_max_T (exceedance.py)
+    Output: scaling report dict (see scaling_report)
+    """
+    paths = sorted(paths)
+    if not paths:
+        raise ValueError("No files to process")
+    if partial_file is not None and method != "hist":
+        raise ValueError("Partials are only written with method='hist'")
+
+    template, window, scale_factor, fill_value = grid_info(paths[0], var_name, lon_min, lon_max)
+    file_times = [_file_times(p) for p in paths]
+    file_hours = [len(t) for t in file_times]
+    hours = sum(file_hours)
+    names = stat_names(percentiles)
+    nproc = workers or 1
+    nbins = hist_bins(paths[0])
+
+    years, run_years = None, None
+    if thresholds is not None:
+        thresholds = list(thresholds)
+        names += exceedance_names(thresholds)
+        years = [file_years(t) for t in file_times]
+        run_years = sorted(set(np.concatenate(years).tolist()))
+
+    hour_idx = None
+    if diurnal:
+        # grouping worked out once from the time axes, not per tile
+        if method == "sort":
+            hour_idx = hour_index(np.concatenate(file_times))
+        else:
+            hour_idx = [hour_index(t) for t in file_times]
+
+    # the budget is shared by the tiles in flight, and keep a few tiles per worker for balance
+    per_cell = _bytes_per_cell(method, hours, max(file_hours), len(names), diurnal,
+                               len(thresholds or []), nbins)
+    max_cells = memory_mb * 2**20 // (per_cell * nproc)
+    if nproc > 1:
+        max_cells = min(max_cells, -(-template.size // (4 * nproc)))
+    tiles = tile_windows(template.shape, max_cells)
+    print(f"{len(paths)} files, {hours} hours, grid {template.shape} -> {len(tiles)} tiles "
+          f"({per_cell / 1024:.1f} KB per cell, {memory_mb} MB budget, {nproc} workers)")
+
+    nc = create_output(output_file, template, names, encoding)
+    pnc = None
+    if partial_file:
+        pnc = _create_partial(partial_file, template, scale_factor, fill_value,
+                              thresholds=thresholds, run_years=run_years)
+    dnc, dpnc = None, None
+    if diurnal:
+        # same profile as the output when one is named
+        dencoding = encoding if isinstance(encoding, str) else {name: {"dtype": "f4"} for name in DIURNAL_NAMES}
+        dnc = create_output(diurnal_path(output_file), template, DIURNAL_NAMES, dencoding,
+                            lead=("hour", {"hour": np.arange(24)}))
+        if partial_file:
+            dpnc = _create_partial(diurnal_path(partial_file), template, scale_factor, fill_value,
+                                   hourly=True)
+    kwargs = {"keep_acc": pnc is not None, "hour_idx": hour_idx, "thresholds": thresholds,
+              "years": years, "nbins": nbins}
+
+    def write(result, rows, cols):
+        if result["acc"] is not None:
+            _write_partial_tile(pnc, result["acc"], rows, cols, result["racc"])
+        if result["dacc"] is not None and dpnc is not None:
+            _write_partial_tile(dpnc, result["dacc"], rows, cols)
+        if result["diurnal"] is not None:
+            _write_tile(dnc, result["diurnal"], rows, cols, DIURNAL_NAMES)
+
+    start_time = time.time()
+    busy = 0.0
+    try:
+        if workers is None:
+            for i, (rows, cols) in enumerate(tiles):
+                tile_start = time.time()
+                result = _compute_tile(paths, var_name, window, rows, cols, method, percentiles,
+                                       file_hours, scale_factor, fill_value, **kwargs)
+                write(result, rows, cols)
+                _write_tile(nc, result["stats"], rows, cols, names)
+                busy += time.time() - tile_start
+                print(f"tile {i + 1}/{len(tiles)} done ({time.time() - start_time:.1f} s)")
+        else:
+            # results land in one shared (stat, rlat, rlon) grid, written out per finished tile
+            out_shape = (len(names),) + template.shape
+            shm, out = create_shared(out_shape, np.float64, fill=np.nan)
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+                    futures = [pool.submit(_tile_worker, i, shm.name, out_shape, names,
+                                           (paths, var_name, window, rows, cols, method, percentiles,
+                                            file_hours, scale_factor, fill_value), kwargs)
+                               for i, (rows, cols) in enumerate(tiles)]
+                    for done, future in enumerate(as_completed(futures)):
+                        i, result, seconds = future.result()
+                        rows, cols = tiles[i]
+                        write(result, rows, cols)
+                        _write_tile(nc, {name: out[k, rows, cols] for k, name in enumerate(names)},
+                                    rows, cols)
+                        busy += seconds
+                        print(f"tile {done + 1}/{len(tiles)} done ({time.time() - start_time:.1f} s)")
+            finally:
+                del out
+                release_shared(shm)
+    finally:
+        for f in (nc, pnc, dnc, dpnc):
+            if f is not None:
+                f.close()
+    return scaling_report(len(tiles), time.time() - start_time, busy, nproc)
+
+
+def merge_tiled(partial_paths, output_file, memory_mb=4000, percentiles=PERCENTILES, encoding=None,
+                names=None, months=None):
+    """
+    Seasonal/annual stats from monthly partials, tile by tile (see wind_hist.merge_partials
+    for the in memory version). Every partial has to be there, a missing one raises
+    FileNotFoundError (check with wind_hist.missing_partials to skip a season instead).
+    Hour of day partials (hour dim in front) give (hour, rlat, rlon) outputs.
+    Partials with run lengths (thresholds) also give the exceedance stats.
+    names - stats to write (default all of stat_names(percentiles), plus the exceedance ones)
+    months - the months of the partials, stored in the output attrs with the partial names
+    Output: number of tiles
+    """
+    missing = missing_partials(partial_paths)
+    if missing or not partial_paths:
+        raise FileNotFoundError(f"Can't merge {output_file}, partials not found: {missing}")
+    found = list(partial_paths)
+    for p in found:
+        with xr.open_dataset(p) as ds:
+            check_partial(ds, p)
+
+    with xr.open_dataset(found[0], mask_and_scale=False) as ds:
+        template = ds["n"].load()
+        thresholds = ds["threshold"].values.tolist() if "run_count" in ds else None
+    nbins = 0
+    for p in found:
+        with xr.open_dataset(p) as ds:
+            nbins = max(nbins, ds.sizes["bin"])
+    if names is None:
+        names = stat_names(percentiles) + (exceedance_names(thresholds) if thresholds else [])
+    lead, nlead = None, 1
+    if "hour" in template.dims:
+        nlead = template.sizes["hour"]
+        lead = ("hour", {"hour": template["hour"].values})
+        template = template.isel(hour=0, drop=True)
+    # two accumulators (merged + the one being read) and the block cumsum
+    per_cell = nlead * ((nbins + 1) * (4 + 4 + 8) + len(names) * 8) + 2 * 3 * len(thresholds or []) * 8
+    tiles = tile_windows(template.shape, memory_mb * 2**20 // per_cell)
+    print(f"{len(found)} partials, grid {template.shape} -> {len(tiles)} tiles")
+
+    nc = create_output(output_file, template, names, encoding, lead=lead)
+    nc.setncattr("partials", ", ".join(os.path.basename(p) for p in found))
+    if months is not None:
+        nc.setncattr("months", np.asarray(months, dtype=np.int32))
+    try:
+        for rows, cols in tiles:
+            piece = {template.dims[0]: rows, template.dims[1]: cols}
+            acc = HistogramAccumulator.load(found[0], window=piece)
+            for p in found[1:]:
+                acc.merge(HistogramAccumulator.load(p, window=piece))
+            stats = acc.stats(percentiles)
+            if thresholds:
+                racc = RunLengthAccumulator.load(found[0], window=piece)
+                for p in found[1:]:
+                    racc.merge(RunLengthAccumulator.load(p, window=piece))
+                stats.update(racc.stats())
+            _write_tile(nc, stats, rows, cols, names)
+    finally:
+        nc.close()
+    return len(tiles)
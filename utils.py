@@ -6,6 +6,27 @@
 from datetime import date, timedelta
 import calendar
 
+# the climate normal period (first, last year), december is taken a year earlier
+# so the DJF seasons stay whole: 1990-2020 uses Dec 1989 - Dec 2019
+NORMAL_PERIOD = (1990, 2020)
+
+def period_years(period=NORMAL_PERIOD, month=None):
+    """
+    (first, last) year of the data for a month of the normal period, december is a year behind
+    """
+    y0, y1 = period
+    if month is not None and int(month) == 12:
+        return y0 - 1, y1 - 1
+    return y0, y1
+
+def period_label(period=NORMAL_PERIOD, month=None):
+    """
+    Period part of the file names, "1990-2020" (the daily files of december: "1989-2019")
+    month None - the label of the products (monthly/seasonal stats are named by the period)
+    """
+    y0, y1 = period_years(period, month)
+    return f"{y0}-{y1}"
+
 def get_dates_in_year(year):
     start = date(year-1, 12, 1)
     end = date(year, 11, 30)
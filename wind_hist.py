@@ -0,0 +1,306 @@
+"""
+
+    Streaming histogram statistics for the daily files
+    The daily cubes are stored as int16 with scale_factor 0.1, so every value is one of a
+    small set of integers (0.1 km/h or 0.1 degree steps). Counting them per grid cell gives
+    exact mean/std/max/percentiles without ever holding the hours in memory:
+
+    acc = HistogramAccumulator(grid_shape)
+    for file in files:
+        acc.add(raw_int16_cube)   # (time, rlat, rlon), read with mask_and_scale=False
+    stats_ds = acc.to_dataset(template)
+
+    Memory is one counts array of (cells, bins) - e.g. 700k cells x 1500 bins x 4 bytes ~ 4 GB
+    for the whole grid, independent of how many hours go in. Bins grow to the largest value seen.
+
+    Accumulators are mergeable (and subtractable, for sliding windows): counts and the integer
+    power sums (n, sum, sum of squares - exact for the packed ints, so no Welford update is
+    needed) just add up. Direction is circular and has its own accumulator (circular_stats.py),
+    arithmetic on the degrees would be wrong. Monthly runs save() a partial next to their output and the seasonal
+    and annual products merge three or twelve of them without reading the hourly data again:
+
+    acc, template = accumulate_files(month_files, var_name)
+    acc.save(partial_path(output_file), template)
+    ...
+    acc, template = merge_partials([partial_path(f) for f in djf_month_outputs])
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import numpy as np
+import xarray as xr
+
+from wind_stats import PERCENTILES, BLOCK, _lerp
+
+SCALE_FACTOR = 0.1
+FILL_VALUE = -9999
+
+
+def partial_path(output_file):
+    """
+    The partial of a stats output sits beside it: stats_m04.nc -> stats_m04.partial.nc
+    """
+    return os.path.splitext(output_file)[0] + ".partial.nc"
+
+
+def check_partial(ds, path):
+    """
+    Raise unless ds (an open partial) holds histogram counts, direction partials are
+    circular_stats.DirectionAccumulator files (sums and sector counts, no bins)
+    """
+    if "counts" not in ds or "scale_factor" not in ds.attrs:
+        kind = "a direction partial (circular_stats.DirectionAccumulator)" if "sector_counts" in ds else "not a partial"
+        raise ValueError(f"{path} is {kind}, not a histogram partial")
+
+
+class HistogramAccumulator:
+    """
+    Per grid cell counts of packed int16 values, plus exact running sums for the moments
+    """
+    def __init__(self, shape, nbins=1500, scale_factor=SCALE_FACTOR, fill_value=FILL_VALUE,
+                 dtype=np.uint32):
+        self.shape = tuple(shape)
+        self.ncell = int(np.prod(self.shape))
+        self.scale_factor = scale_factor
+        self.fill_value = fill_value
+        # last column collects the fill values so add() needs no masking
+        self.counts = np.zeros((self.ncell, nbins + 1), dtype=dtype)
+        self.n = np.zeros(self.ncell, dtype=np.int64)
+        self.sum = np.zeros(self.ncell, dtype=np.int64)
+        self.sumsq = np.zeros(self.ncell, dtype=np.int64)
+        self.max = np.full(self.ncell, -1, dtype=np.int64)
+        self._cells = np.arange(self.ncell)
+
+    @property
+    def nbins(self):
+        return self.counts.shape[1] - 1
+
+    def _grow(self, top):
+        # make room for values up to top (keeps some headroom so this happens rarely)
+        nbins = max(int(top) + 1, int(self.nbins * 1.25))
+        counts = np.zeros((self.ncell, nbins + 1), dtype=self.counts.dtype)
+        counts[:, :self.nbins] = self.counts[:, :self.nbins]
+        self.counts = counts
+
+    def add(self, packed):
+        """
+        packed - raw int16 values (time, *shape), the fill value marks missing hours
+        """
+        packed = np.asarray(packed).reshape(-1, self.ncell)
+        valid = packed != self.fill_value
+        if (packed[valid] < 0).any():
+            raise ValueError("HistogramAccumulator only takes values >= 0")
+
+        top = packed[valid].max(initial=-1)
+        if top >= self.nbins:
+            self._grow(top)
+
+        junk = self.nbins
+        v = packed.astype(np.int64)
+        v[~valid] = 0
+        self.n += valid.sum(axis=0)
+        self.sum += v.sum(axis=0)
+        self.sumsq += (v * v).sum(axis=0)
+        self.max = np.maximum(self.max, np.where(valid, v, -1).max(axis=0))
+
+        # one hour at a time every cell appears once, so fancy += counts correctly
+        for row, ok in zip(packed, valid):
+            self.counts[self._cells, np.where(ok, row, junk)] += 1
+
+    def _ranked(self, counts, ranks):
+        """
+        Bin holding the rank-th smallest value (0 based) for each cell of a block
+        counts (cells, bins), ranks (k, cells)
+        """
+        cum = np.cumsum(counts, axis=1, dtype=np.int64)
+        return np.stack([(cum <= r[:, None]).sum(axis=1) for r in ranks])
+
+    def stats(self, percentiles=PERCENTILES, block=BLOCK // 4):
+        """
+        Output: dict of arrays on the grid shape - mean, median, std, max, pXX
+                in data units (scale_factor applied), NaN where a cell has no data
+        """
+        qs = np.asarray([50] + [p for p in percentiles if p != 50], dtype=np.float64) / 100
+        n = self.n.astype(np.float64)
+        empty = self.n == 0
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum / n
+            var = np.maximum(self.sumsq / n - mean**2, 0)
+        quants = np.empty((len(qs), self.ncell))
+
+        for start in range(0, self.ncell, block):
+            stop = min(start + block, self.ncell)
+            last = np.maximum(self.n[start:stop] - 1, 0)
+            h = qs[:, None] * last[None, :]
+            lo = np.floor(h).astype(np.int64)
+            hi = np.ceil(h).astype(np.int64)
+            counts = self.counts[start:stop, :self.nbins]
+            quants[:, start:stop] = _lerp(self._ranked(counts, lo).astype(np.float64),
+                                          self._ranked(counts, hi).astype(np.float64), h - lo)
+
+        out = {"mean": mean, "median": quants[0], "std": np.sqrt(var),
+               "max": self.max.astype(np.float64)}
+        for q, row in zip(qs[1:], quants[1:]):
+            out[f"p{round(q * 100):d}"] = row
+        if 50 in percentiles:
+            out["p50"] = quants[0]
+
+        for name, arr in out.items():
+            arr = arr * self.scale_factor
+            arr[empty] = np.nan
+            out[name] = arr.reshape(self.shape)
+        return out
+
+    def mode(self):
+        """
+        Most frequent value per cell (data units, lowest one on ties), NaN where empty
+        """
+        arr = self.counts[:, :self.nbins].argmax(axis=1) * self.scale_factor
+        arr[self.n == 0] = np.nan
+        return arr.reshape(self.shape)
+
+    def to_dataset(self, template, percentiles=PERCENTILES):
+        """
+        template - DataArray on the grid (e.g. one time step of a daily file) for dims/coords
+        """
+        stats = self.stats(percentiles)
+        return xr.Dataset({name: (template.dims, arr) for name, arr in stats.items()},
+                          coords=template.coords)
+
+    def merge(self, other):
+        """
+        Add another accumulator on the same grid into this one (in place), returns self
+        """
+        if other.shape != self.shape or other.scale_factor != self.scale_factor:
+            raise ValueError("Can only merge accumulators on the same grid and packing")
+
+        if other.nbins > self.nbins:
+            self._grow(other.nbins - 1)
+        self.counts[:, :other.nbins] += other.counts[:, :other.nbins]
+        self.n += other.n
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def subtract(self, other):
+        """
+        Take out an accumulator that was merged in before (in place), returns self
+        Used for sliding windows, the max is worked out again from the counts
+        """
+        # other may have more (empty) bins, e.g. partials that grew differently
+        top = min(other.nbins, self.nbins)
+        if other.shape != self.shape or other.counts[:, top:other.nbins].any():
+            raise ValueError("Can only subtract an accumulator that was merged into this one")
+        self.counts[:, :top] -= other.counts[:, :top].astype(self.counts.dtype)
+        self.n -= other.n
+        self.sum -= other.sum
+        self.sumsq -= other.sumsq
+
+        # highest bin still holding a count, -1 where the cell is empty
+        used = self.counts[:, :self.nbins] > 0
+        self.max = np.where(used.any(axis=1), self.nbins - 1 - used[:, ::-1].argmax(axis=1), -1)
+        return self
+
+    def save(self, path, template, **attrs):
+        """
+        Write the partial (counts and sums) to netcdf, template gives the grid dims/coords
+        Extra attrs (e.g. months=[4]) are stored with it
+        """
+        # drop the empty top bins, the counts are written compressed anyway
+        used = np.flatnonzero(self.counts[:, :self.nbins].any(axis=0))
+        nbins = int(used[-1]) + 1 if used.size else 1
+
+        dims = template.dims
+        data = {
+            "counts": (dims + ("bin",), self.counts[:, :nbins].reshape(self.shape + (nbins,))),
+            "n": (dims, self.n.reshape(self.shape)),
+            "sum": (dims, self.sum.reshape(self.shape)),
+            "sumsq": (dims, self.sumsq.reshape(self.shape)),
+            "max": (dims, self.max.reshape(self.shape)),
+        }
+
+        attrs.update({"scale_factor": self.scale_factor, "fill_value": self.fill_value})
+        ds = xr.Dataset(data, coords=template.coords, attrs=attrs)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        encoding = {"counts": {"zlib": True, "complevel": 1}}
+        ds.to_netcdf(path, encoding=encoding)
+
+    @classmethod
+    def load(cls, path, return_template=False, window=None):
+        """
+        Read a partial written by save(), optionally with a grid template for to_dataset()
+        window - isel dict to read only part of the grid, e.g. {"rlat": slice(0, 100)}
+        """
+        # raw values, a fill value on the counts (tiled partials) is 0 anyway
+        with xr.open_dataset(path, mask_and_scale=False) as ds:
+            check_partial(ds, path)
+            if window is not None:
+                ds = ds.isel(window)
+            counts = ds["counts"]
+            shape = counts.shape[:-1]
+            acc = cls(shape, nbins=counts.shape[-1], scale_factor=ds.attrs["scale_factor"],
+                      fill_value=ds.attrs["fill_value"], dtype=counts.dtype)
+            acc.counts[:, :-1] = counts.values.reshape(acc.ncell, -1)
+            for name in ["n", "sum", "sumsq", "max"]:
+                setattr(acc, name, ds[name].values.reshape(-1).astype(np.int64))
+            template = ds["n"].load()
+
+        if return_template:
+            return acc, template
+        return acc
+
+
+def accumulate_files(paths, var_name, lon_min=None, lon_max=None):
+    """
+    Stream daily files (sorted) into one accumulator, optionally cropped to a lon range
+    Output: (HistogramAccumulator, template DataArray of the grid) - (None, None) if no files
+    """
+    from grid_geometry import crop
+
+    acc, template = None, None
+    for path in sorted(paths):
+        # mask_and_scale=False keeps the stored int16 values (0.1 steps, -9999 fill)
+        with xr.open_dataset(path, mask_and_scale=False) as ds:
+            if lon_min is not None or lon_max is not None:
+                ds = crop(ds, lon_min=lon_min, lon_max=lon_max)
+            da = ds[var_name]
+
+            if acc is None:
+                template = da.isel(time=0, drop=True).load()
+                acc = HistogramAccumulator(template.shape,
+                                           scale_factor=da.attrs.get("scale_factor", SCALE_FACTOR),
+                                           fill_value=da.attrs.get("_FillValue", FILL_VALUE))
+            acc.add(da.values)
+    return acc, template
+
+
+def missing_partials(paths):
+    """
+    The partials in paths that aren't there (yet), e.g. months that were not run
+    """
+    return [path for path in paths if not os.path.exists(path)]
+
+
+def merge_partials(paths, cls=HistogramAccumulator):
+    """
+    Load and merge saved partials, a missing one raises FileNotFoundError
+    (check with missing_partials() to skip a season instead)
+    cls - the accumulator class that wrote them (anything with load/merge)
+    Output: (accumulator, template)
+    """
+    missing = missing_partials(paths)
+    if missing or not paths:
+        raise FileNotFoundError(f"Partials not found: {missing}")
+    acc, template = None, None
+    for path in paths:
+        if acc is None:
+            acc, template = cls.load(path, return_template=True)
+        else:
+            acc.merge(cls.load(path))
+    return acc, template
@@ -1,26 +1,49 @@
 #%%
 import os
 import json
-import xarray as xr
 import time
-import numpy as np
+
+from circular_stats import accumulate_direction_files
+from grid_geometry import TRIM_LON_WEST, TRIM_LON_EAST
+from tiled_stats import diurnal_path, run_tiled_stats
+from utils import NORMAL_PERIOD, period_label
+from wind_hist import partial_path
+from writer import write_dataset
 
 
 # Set the month to process (e.g., February)
 month = 4
 month_str = f"m{month:02d}"
 wind_var = "wind_speed"  # ["wind_speed", "wind_direction"]
+period = NORMAL_PERIOD  # (first, last) year of the normal
 
 data_dir = "climatology/daily/"
 output_dir = "climatology/monthly/"
 
-all_files = os.listdir(data_dir)
+# memory ceiling (MB) for the tiles being worked on, and processes working on them (None = serial)
+memory_mb = 4000
+workers = None
+
+# output encoding, see writer.PROFILES
+profile = "int16_zlib1"
+
+# also hour of day (UTC) mean/p50/p90/p95 from the same pass, written to *_diurnal.nc
+diurnal = True
+
+# exceedance fraction and run lengths (hours in a row) above these speeds (km/h), speed only
+thresholds = [20, 40, 60]
+
+# direction is circular (350 and 10 average to 0 not 180), so it gets the vector mean,
+# circular std and sector frequencies of circular_stats.py instead of the histogram stats
+
+# only the daily files of this normal (december's are labelled a year earlier)
+all_files = [file for file in os.listdir(data_dir) if file.startswith(period_label(period, month))]
 
 if wind_var == "wind_speed":
-    output_file = f"{output_dir}/1990-2020_monthly_windspeed_stats_m{month:02d}.nc"
+    output_file = f"{output_dir}/{period_label(period)}_monthly_windspeed_stats_m{month:02d}.nc"
     wind_files = [file for file in all_files if month_str in file and "windspeed" in file]
 elif wind_var == "wind_direction":
-    output_file = f"{output_dir}/1990-2020_monthly_winddirection_stats_m{month:02d}.nc"
+    output_file = f"{output_dir}/{period_label(period)}_monthly_winddirection_stats_m{month:02d}.nc"
     wind_files = [file for file in all_files if month_str in file and "winddir" in file]
 else: 
     print("Error: Not a correct variable selection.")
@@ -29,69 +52,43 @@ else:
 with open("./utils/variables.json", 'r') as f:
     casr_vars = json.load(f)
 
-# Find all windspeed files for the month
-def squeeze_quantile(da):
-    if "quantile" in da.dims and da.sizes["quantile"] == 1:
-        da = da.squeeze("quantile")
-
-    # remove the "quantile" coordinate which comes with the calculations
-    # causes errors when combining datasets
-    if "quantile" in da.coords:
-        da = da.reset_coords("quantile", drop=True)
-    return da
-
 #%%
-ws_list = []
-start_time = time.time()
-for file in wind_files:  
-    ds = xr.open_dataset(os.path.join(data_dir, file), chunks={})
-    #ds[casr_vars["CaSR_Variables"]["wind_speed"]].plot()
-    ws = ds[casr_vars["CaSR_Variables"][wind_var]].compute()
-
-    print(f"Trimming Dataset {file}...")
-    # trim all lons >309 (-51W) to shrink file enough for compression eastern in canada
-    trim_lon = 309
-    ws = ws.where(ws['lon'] <= trim_lon, drop=True)
-    trim_lon = 216  # (-144W) western in Canada
-    ws = ws.where(ws['lon'] >= trim_lon, drop=True)
-
-    ws_list.append(ws)
-
-if ws_list:
-    ws_all = xr.concat(ws_list, dim="time")
-
-    mean = ws_all.mean(dim="time")
-    median = ws_all.median(dim="time")
-    std = ws_all.std(dim="time")
-    max = ws_all.max(dim="time")
-
-    p10 = squeeze_quantile(ws_all.quantile(0.1, dim="time"))
-    p25 = squeeze_quantile(ws_all.quantile(0.25, dim="time"))
-    p75 = squeeze_quantile(ws_all.quantile(0.75, dim="time"))
-    p90 = squeeze_quantile(ws_all.quantile(0.9, dim="time"))
-    p95 = squeeze_quantile(ws_all.quantile(0.95, dim="time"))
-
-    stats_ds = xr.Dataset({
-        "mean": mean,
-        "median": median,
-        "std": std,
-        "p10": p10,
-        "p25": p25,
-        "p75": p75,
-        "p90": p90,
-        "p95": p95,
-        "max": max
-    })
-
-    print("Starting compression...")
-    # Save to NetCDF (fast and widely supported)
-    stats_ds.to_netcdf(output_file, engine="netcdf4")
-    print(f"Saved stats to {output_file}")
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    print(f"Time to save: {int(elapsed_time)/60} minutes")
-else:
-    print("No windspeed files found for this month.")
-
-stats_ds.close()
+# tile by tile over the full month (see tiled_stats.py), each tile is streamed into
+# per cell histograms of the packed int16 values and written as soon as it is done
+# trim all lons >309 (-51W) to shrink file enough for compression eastern in canada
+# and lons <216 (-144W) western in Canada, index window is cached per grid
+# guarded since the tile workers are spawned and re-import this script
+if __name__ == "__main__":
+    if wind_files and wind_var == "wind_direction":
+        start_time = time.time()
+        # streamed one file at a time with the matching speeds (for the speed weighted direction)
+        acc, template = accumulate_direction_files([os.path.join(data_dir, file) for file in wind_files],
+                                                   casr_vars["CaSR_Variables"]["wind_direction"],
+                                                   casr_vars["CaSR_Variables"]["wind_speed"],
+                                                   lon_min=TRIM_LON_WEST, lon_max=TRIM_LON_EAST)
+        write_dataset(acc.to_dataset(template), output_file, profile)
+        acc.save(partial_path(output_file), template, months=[month])
+        print(f"Saved stats to {output_file}")
+        print(f"Saved partial to {partial_path(output_file)}")
+        print(f"Time to save: {int(time.time() - start_time)/60} minutes")
+    elif wind_files:
+        start_time = time.time()
+        # exact mean, median, std, max and the percentiles from the counts
+        # the partial keeps the counts/sums so wind_season_stats.py can merge months instead of re-reading
+        run_tiled_stats([os.path.join(data_dir, file) for file in wind_files],
+                        casr_vars["CaSR_Variables"][wind_var], output_file,
+                        memory_mb=memory_mb, percentiles=[10, 25, 75, 90, 95],
+                        lon_min=TRIM_LON_WEST, lon_max=TRIM_LON_EAST,
+                        partial_file=partial_path(output_file), workers=workers, diurnal=diurnal,
+                        encoding=profile,
+                        thresholds=thresholds)
+        print(f"Saved stats to {output_file}")
+        if diurnal:
+            print(f"Saved hour of day stats to {diurnal_path(output_file)}")
+        print(f"Saved partial to {partial_path(output_file)}")
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+        print(f"Time to save: {int(elapsed_time)/60} minutes")
+    else:
+        print(f"No {wind_var} files found for this month.")
 # %%
@@ -1,6 +1,8 @@
 """
 
-    Get seasonal statistics and save them in the climatology folder
+    Get seasonal (and annual) statistics and save them in the climatology folder
+    Merges the monthly partials written by wind_month_stats.py, so run that for
+    the months first. The hourly daily files are not read again.
 
     November 6, 2025
     Liam.Buchart
@@ -8,100 +10,86 @@
 """
 #%%
 import os
-import json
-import xarray as xr
 import time
 
+from circular_stats import DirectionAccumulator
+from tiled_stats import DIURNAL_NAMES, DIURNAL_PERCENTILES, diurnal_path, merge_tiled
+from utils import NORMAL_PERIOD, period_label
+from wind_hist import merge_partials, missing_partials, partial_path
+from writer import write_dataset
 
-# Set the month to process (e.g., February)
-season = "MAM"  # ["DJF", "MAM", "JJA", "SON"]
-# get the variable names
-with open("./dates.json", 'r') as f:
-    sarray = json.load(f)
 
-season_months = sarray["seasons"][season]["all"]
+seasons = {
+    "DJF": [12, 1, 2],
+    "MAM": [3, 4, 5],
+    "JJA": [6, 7, 8],
+    "SON": [9, 10, 11],
+    "ANN": list(range(1, 12+1)),
+}
 
-wind_var = "wind_direction"  # ["wind_speed", "wind_direction"]
+wind_var = "wind_speed"  # ["wind_speed", "wind_direction"]
+period = NORMAL_PERIOD  # (first, last) year of the normal
+label = period_label(period)
 
-data_dir = "climatology/daily/"
+month_dir = "climatology/monthly/"
 output_dir = "climatology/seasonal/"
 
-all_files = os.listdir(data_dir)
+# memory ceiling (MB) for one tile's working arrays
+memory_mb = 4000
 
-# get the the three months for the chosen season
-season_files = []
-for mm in season_months:
-    sub_files = [file for file in all_files if f"m{mm:02d}" in file]
-    season_files.append(sub_files)
+# output encoding, see writer.PROFILES
+profile = "int16_zlib1"
 
 if wind_var == "wind_speed":
-    output_file = f"{output_dir}/1990-2020_monthly_windspeed_stats_m{season}.nc"
-    wind_files = [file for file in season_files if "windspeed" in file]
+    var_name = "windspeed"
 elif wind_var == "wind_direction":
-    output_file = f"{output_dir}/1990-2020_monthly_winddirection_stats_m{season}.nc"
-    wind_files = [file for file in season_files if "winddir" in file]
-else: 
+    var_name = "winddirection"
+else:
     print("Error: Not a correct variable selection.")
 
-# get the variable names
-with open("./utils/variables.json", 'r') as f:
-    casr_vars = json.load(f)
-
-# Find all windspeed files for the month
-def squeeze_quantile(da):
-    if "quantile" in da.dims and da.sizes["quantile"] == 1:
-        da = da.squeeze("quantile")
-
-    # remove the "quantile" coordinate which comes with the calculations
-    # causes errors when combining datasets
-    if "quantile" in da.coords:
-        da = da.reset_coords("quantile", drop=True)
-    return da
+os.makedirs(output_dir, exist_ok=True)
 
 #%%
-ws_list = []
-for file in wind_files:  # NOTE: not using full list yet
-    ds = xr.open_dataset(os.path.join(data_dir, file), chunks={})
-    #ds[casr_vars["CaSR_Variables"]["wind_speed"]].plot()
-    # Adjust variable name as needed
-    ws = ds[casr_vars["CaSR_Variables"][wind_var]]
-    #ws = ds[list(ds.data_vars)[0]]
-    ws_list.append(ws)
-
-if ws_list:
-    ws_all = xr.concat(ws_list, dim="time")
-
-    mean = ws_all.mean(dim="time")
-    median = ws_all.median(dim="time")
-    std = ws_all.std(dim="time")
-
-    p10 = squeeze_quantile(ws_all.quantile(0.1, dim="time"))
-    p25 = squeeze_quantile(ws_all.quantile(0.25, dim="time"))
-    p75 = squeeze_quantile(ws_all.quantile(0.75, dim="time"))
-    p90 = squeeze_quantile(ws_all.quantile(0.9, dim="time"))
-    p95 = squeeze_quantile(ws_all.quantile(0.95, dim="time"))
-
-    stats_ds = xr.Dataset({
-        "mean": mean,
-        "median": median,
-        "std": std,
-        "p10": p10,
-        "p25": p25,
-        "p75": p75,
-        "p90": p90,
-        "p95": p95
-    })
-
+for season, season_months in seasons.items():
     start_time = time.time()
-    print("Starting compression...")
-    # Save to NetCDF (fast and widely supported)
-    stats_ds.to_netcdf(output_file, engine="netcdf4")
+    # same names as the monthly outputs of wind_month_stats.py
+    partials = [partial_path(f"{month_dir}/{label}_monthly_{var_name}_stats_m{mm:02d}.nc")
+                for mm in season_months]
+    if season == "ANN":
+        output_file = f"{output_dir}/{label}_annual_{var_name}_stats.nc"
+    else:
+        output_file = f"{output_dir}/{label}_seasonal_{var_name}_stats_{season}.nc"
+
+    # only whole seasons, a season missing a month is skipped rather than merged short
+    missing = missing_partials(partials)
+    if missing:
+        print(f"Skipping {season}, monthly partials not found: {missing}")
+        continue
+
+    # direction partials are circular sums and sector counts (see circular_stats.py), small enough
+    # to merge whole
+    if wind_var == "wind_direction":
+        acc, template = merge_partials(partials, cls=DirectionAccumulator)
+        ds = acc.to_dataset(template)
+        ds.attrs["months"] = season_months
+        write_dataset(ds, output_file, profile)
+        print(f"Saved stats to {output_file}")
+        continue
+
+    # tile by tile so the merged counts for all of canada never sit in memory at once
+    # (the exceedance/run length stats come along if the months were run with thresholds)
+    merge_tiled(partials, output_file, memory_mb=memory_mb, percentiles=[10, 25, 75, 90, 95],
+                encoding=profile, months=season_months)
     print(f"Saved stats to {output_file}")
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    print("Time to save: ", elapsed_time)
-else:
-    print("No windspeed files found for this month.")
 
+    # hour of day stats from the hourly partials, if all the months were run with diurnal
+    diurnal_partials = [diurnal_path(p) for p in partials]
+    if not missing_partials(diurnal_partials):
+        merge_tiled(diurnal_partials, diurnal_path(output_file), memory_mb=memory_mb,
+                    percentiles=DIURNAL_PERCENTILES, names=DIURNAL_NAMES, encoding=profile,
+                    months=season_months)
+        print(f"Saved hour of day stats to {diurnal_path(output_file)}")
+    elapsed_time = time.time() - start_time
+    print("Time to merge and save: ", elapsed_time)
 
 # %%
@@ -0,0 +1,112 @@
+"""
+
+    Wind run engine: per year totals of the hourly speeds (km/h x 1 h = km)
+    Wind run stats are taken over the yearly totals of a month or season (31 values per
+    grid cell for a 1990-2020 normal), not over the hours. The daily cubes are streamed one at a time
+    and only the running totals are kept, so memory is one day's cube plus nyears x grid.
+
+    month = accumulate_windrun(month_files, ws_name)
+    season = WindRunTotals(month.shape)
+    season.merge(month, year_shift=1)  # december counts towards the next year's DJF
+    stats_ds = windrun_stats(season, template)
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from wind_stats import PERCENTILES, stats_arrays
+
+
+def file_years(times):
+    """
+    Year of each hour in a daily cube. A cube is 24 hour blocks (13Z to 12Z the next day)
+    one per year, each block takes the year of its first hour so Dec 31 stays in its year
+    """
+    times = pd.DatetimeIndex(times)
+    gaps = np.diff(times.values) > np.timedelta64(1, "D")
+    block = np.concatenate([[0], np.cumsum(gaps)])
+    firsts = times[np.concatenate([[0], np.flatnonzero(gaps) + 1])]
+    return firsts.year.values[block]
+
+
+class WindRunTotals:
+    """
+    Per year running totals on the grid, a year-cell with any missing hour is flagged
+    """
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.totals = {}
+        self.missing = {}
+
+    def _year(self, year):
+        if year not in self.totals:
+            self.totals[year] = np.zeros(self.shape)
+            self.missing[year] = np.zeros(self.shape, dtype=bool)
+        return self.totals[year], self.missing[year]
+
+    def add(self, ws, years):
+        """
+        ws - hourly speeds km/h (time, *shape), NaN for missing
+        years - year of each hour (see file_years)
+        """
+        ws = np.asarray(ws)
+        years = np.asarray(years)
+        for year in np.unique(years):
+            hours = ws[years == year]
+            total, missing = self._year(int(year))
+            nan = np.isnan(hours)
+            total += np.where(nan, 0, hours).sum(axis=0)
+            missing |= nan.any(axis=0)
+
+    def merge(self, other, year_shift=0):
+        """
+        Add another set of totals into this one, other's years moved by year_shift
+        """
+        for year, total in other.totals.items():
+            mine, missing = self._year(year + year_shift)
+            mine += total
+            missing |= other.missing[year]
+        return self
+
+    def years(self):
+        return sorted(self.totals)
+
+    def stack(self):
+        """
+        Output: (years, array (nyears, *shape)) with NaN where a year had missing hours
+        """
+        years = self.years()
+        out = np.stack([np.where(self.missing[y], np.nan, self.totals[y]) for y in years])
+        return years, out
+
+
+def accumulate_windrun(paths, ws_name):
+    """
+    Stream daily windspeed files into per year totals
+    Output: (WindRunTotals, template DataArray of the grid) - (None, None) if no files
+    """
+    totals, template = None, None
+    for path in sorted(paths):
+        with xr.open_dataset(path) as ds:
+            ws = ds[ws_name]
+            if totals is None:
+                template = ws.isel(time=0, drop=True).load()
+                totals = WindRunTotals(template.shape)
+            totals.add(ws.values, file_years(ws["time"].values))
+    return totals, template
+
+
+def windrun_stats(totals, template, percentiles=PERCENTILES):
+    """
+    Output: Dataset of mean, median, std, max and pXX of the yearly totals (km)
+    """
+    years, arr = totals.stack()
+    stats = stats_arrays(arr, percentiles, axis=0)
+    ds = xr.Dataset({name: (template.dims, val) for name, val in stats.items()},
+                    coords=template.coords, attrs={"units": "km", "years": f"{years[0]}-{years[-1]}"})
+    return ds
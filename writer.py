@@ -0,0 +1,240 @@
+"""
+
+    One place for how the climatology files are written
+    Named encoding profiles (packing, compression, chunk shapes) used by every script,
+    both for datasets written in one go and for the tile by tile outputs of tiled_stats.py:
+
+    write_dataset(stats_ds, "stats_m04.nc", profile="int16_zlib1")
+    run_tiled_stats(files, var_name, "stats_m04.nc", encoding="int16_zlib1")
+
+    Packed profiles store the stats in data units (km/h, degrees) as int16 with
+    scale_factor 0.1 and _FillValue -9999 like the daily files. Fractions, counts and
+    anything too big for 0.1 steps in int16 (e.g. wind run totals) stay float32.
+
+    benchmark() writes a sample product under each profile and reports the size, write time
+    and read time for map (a whole field) and point (every value at a few cells) access.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 18, 2026
+
+"""
+#%%
+import os
+import re
+import time
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+SCALE_FACTOR = 0.1
+FILL_VALUE = -9999
+
+# chunk shapes, "lead" for time/hour/dayofyear (None = whole dim), "grid" for rlat/rlon
+CHUNKS = {
+    "tile": {"lead": 1, "grid": (100, 100)},
+    "map": {"lead": 1, "grid": None},
+    "point": {"lead": None, "grid": (16, 16)},
+}
+LEAD_DIMS = ("time", "hour", "dayofyear")
+
+PROFILES = {
+    # xarray defaults: float64, contiguous, no compression
+    "default": {},
+    "float32": {"dtype": "f4", "zlib": True, "complevel": 1, "shuffle": True, "chunks": "tile"},
+    # packed as the daily cubes have always been written (no compression)
+    "int16": {"pack": True},
+    "int16_zlib1": {"pack": True, "zlib": True, "complevel": 1, "shuffle": True, "chunks": "tile"},
+    "int16_zlib4": {"pack": True, "zlib": True, "complevel": 4, "shuffle": True, "chunks": "tile"},
+    "int16_zstd3": {"pack": True, "compression": "zstd", "complevel": 3, "shuffle": True, "chunks": "tile"},
+    "int16_zlib1_map": {"pack": True, "zlib": True, "complevel": 1, "shuffle": True, "chunks": "map"},
+    "int16_zlib1_point": {"pack": True, "zlib": True, "complevel": 1, "shuffle": True, "chunks": "point"},
+}
+
+# stats in data units that fit 0.1 steps
+_PACKABLE = re.compile(r"^(mean|median|std|max|p\d+|circ_mean|circ_std|mean_dir|weighted_dir|modal_sector)$")
+
+
+def profile_available(profile):
+    # zstd needs the netcdf-c plugin
+    if PROFILES[profile].get("compression") == "zstd":
+        return bool(getattr(netCDF4, "__has_zstandard_support__", False))
+    return True
+
+
+def _chunks(spec, dims, sizes, grid_dims):
+    spec = CHUNKS[spec]
+    chunks = []
+    for dim in dims:
+        size = None
+        if dim in grid_dims and spec["grid"] is not None:
+            size = spec["grid"][grid_dims.index(dim)]
+        elif dim in LEAD_DIMS:
+            size = spec["lead"]
+        chunks.append(min(size or sizes[dim], sizes[dim]))
+    return tuple(chunks)
+
+
+def variable_encoding(profile, dims, sizes, pack=True, grid_dims=("rlat", "rlon"), prepacked=False):
+    """
+    Encoding of one variable (xarray to_netcdf / tiled_stats.create_output keys)
+    Input: profile name, the variable's dims and {dim: size}
+           pack - False keeps this variable float32 in a packed profile
+           prepacked - the data is already int16 with its scale_factor/_FillValue attrs,
+                       only the storage options are applied
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile}, one of {list(PROFILES)}")
+    if not profile_available(profile):
+        raise ValueError(f"Profile {profile} needs a compression filter netcdf was not built with")
+    opts = dict(PROFILES[profile])
+    enc = {}
+    if opts.pop("pack", False) and not prepacked:
+        if pack:
+            enc.update({"dtype": "int16", "scale_factor": SCALE_FACTOR, "_FillValue": FILL_VALUE})
+        else:
+            enc["dtype"] = "f4"
+    elif "dtype" in opts and not prepacked:
+        enc["dtype"] = opts["dtype"]
+    opts.pop("dtype", None)
+
+    chunks = opts.pop("chunks", None)
+    enc.update(opts)
+    if chunks is not None and dims:
+        enc["chunksizes"] = _chunks(chunks, dims, sizes, grid_dims)
+    return enc
+
+
+def packable(name, values=None):
+    """
+    Whether a variable can go in 0.1 int16 steps: a stat in data units and, when the
+    values are given, all of them in the int16 range
+    """
+    if not _PACKABLE.match(name):
+        return False
+    if values is not None:
+        top = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 0
+        return top * (1 / SCALE_FACTOR) < np.iinfo(np.int16).max
+    return True
+
+
+def _grid_dims(ds, dims):
+    if "lat" in ds.coords:
+        return ds["lat"].dims
+    return tuple(dims[-2:])
+
+
+def dataset_encoding(ds, profile, pack=None):
+    """
+    Encoding for every data variable of ds
+    pack - names to pack in a packed profile (default: the stats in data units that fit)
+    """
+    enc = {}
+    for name, da in ds.data_vars.items():
+        prepacked = da.dtype == np.int16 and "scale_factor" in da.attrs
+        if pack is None:
+            # daily cubes read back decoded keep their packing in .encoding
+            do_pack = packable(name, da.values) or da.encoding.get("scale_factor") == SCALE_FACTOR
+        else:
+            do_pack = name in pack
+        enc[name] = variable_encoding(profile, da.dims, dict(da.sizes), pack=do_pack,
+                                      grid_dims=_grid_dims(ds, da.dims), prepacked=prepacked)
+    return enc
+
+
+def tiled_encoding(profile, template, names, lead=None, pack=None):
+    """
+    Encoding for tiled_stats.create_output, nothing is in memory so packing goes by name
+    lead - (dim, size) of a dim in front of the grid, e.g. ("hour", 24)
+    """
+    dims = tuple(template.dims)
+    sizes = dict(template.sizes)
+    if lead is not None:
+        dims = (lead[0],) + dims
+        sizes[lead[0]] = lead[1]
+    return {name: variable_encoding(profile, dims, sizes,
+                                    pack=packable(name) if pack is None else name in pack,
+                                    grid_dims=tuple(template.dims))
+            for name in names}
+
+
+def write_dataset(ds, path, profile="int16_zlib1", pack=None):
+    """
+    Write a Dataset (or named DataArray) with a profile's encoding
+    Output: path
+    """
+    if isinstance(ds, xr.DataArray):
+        ds = ds.to_dataset()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    ds.to_netcdf(path, encoding=dataset_encoding(ds, profile, pack))
+    return path
+
+
+def _read_times(path, npoints=20, seed=0):
+    # map: the first field of each variable, point: every value at npoints random cells
+    with netCDF4.Dataset(path) as nc:
+        names = [n for n, v in nc.variables.items() if n not in nc.dimensions and v.ndim >= 2
+                 and n not in ("lat", "lon")]
+        start = time.perf_counter()
+        for name in names:
+            var = nc[name]
+            var[tuple(0 if d in LEAD_DIMS else slice(None) for d in var.dimensions)]
+        map_time = time.perf_counter() - start
+
+        rng = np.random.default_rng(seed)
+        start = time.perf_counter()
+        for name in names:
+            var = nc[name]
+            dims = var.dimensions
+            for _ in range(npoints):
+                index = tuple(int(rng.integers(var.shape[k])) if d in ("rlat", "rlon") else slice(None)
+                              for k, d in enumerate(dims))
+                var[index]
+        point_time = time.perf_counter() - start
+    return map_time, point_time
+
+
+def benchmark(ds, out_dir, profiles=None, pack=None, repeats=3):
+    """
+    Write ds under each profile and time it
+    Input: sample product (Dataset), directory for the test files, profile names (default all)
+    Output: list of dicts - profile, size_mb, write_s, map_read_s, point_read_s (best of repeats)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ds = ds.load()
+    results = []
+    for profile in profiles or list(PROFILES):
+        if not profile_available(profile):
+            print(f"{profile}: not available in this netcdf build. Skipping...")
+            continue
+        path = os.path.join(out_dir, f"benchmark_{profile}.nc")
+        writes, maps, points = [], [], []
+        for _ in range(repeats):
+            if os.path.exists(path):
+                os.remove(path)
+            start = time.perf_counter()
+            write_dataset(ds, path, profile, pack)
+            writes.append(time.perf_counter() - start)
+            map_time, point_time = _read_times(path)
+            maps.append(map_time)
+            points.append(point_time)
+        results.append({"profile": profile, "size_mb": os.path.getsize(path) / 2**20,
+                         "write_s": min(writes), "map_read_s": min(maps), "point_read_s": min(points)})
+        os.remove(path)
+
+    print(f"{'profile':<20}{'size MB':>10}{'write s':>10}{'map s':>10}{'point s':>10}")
+    for r in results:
+        print(f"{r['profile']:<20}{r['size_mb']:>10.2f}{r['write_s']:>10.3f}"
+              f"{r['map_read_s']:>10.4f}{r['point_read_s']:>10.4f}")
+    return results
+
+
+#%%
+if __name__ == "__main__":
+    # sample product to compare the profiles on, a daily cube or a stats file
+    sample_file = "./climatology/daily/1990-2020_hrly_windspeed_m01_d01.h5"
+    out_dir = "./temp/benchmark/"
+
+    with xr.open_dataset(sample_file) as ds:
+        benchmark(ds, out_dir)
+# %%